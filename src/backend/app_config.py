@@ -27,6 +27,101 @@ class AppConfig:
         self.COSMOSDB_ENDPOINT = self._get_optional("COSMOSDB_ENDPOINT")
         self.COSMOSDB_DATABASE = self._get_optional("COSMOSDB_DATABASE")
         self.COSMOSDB_CONTAINER = self._get_optional("COSMOSDB_CONTAINER")
+        # Storage of the memory contexts: "cosmos" or "sqlite" (local database file)
+        self.MEMORY_BACKEND = self._get_optional("MEMORY_BACKEND", "cosmos")
+        self.SQLITE_DATABASE_PATH = self._get_optional("SQLITE_DATABASE_PATH", "memory.db")
+        self.COSMOSDB_WRITE_BEHIND = self._get_bool("COSMOSDB_WRITE_BEHIND")
+        self.COSMOSDB_WRITE_BEHIND_QUEUE_SIZE = int(
+            self._get_optional("COSMOSDB_WRITE_BEHIND_QUEUE_SIZE", "1000")
+        )
+        self.COSMOSDB_WRITE_BEHIND_FLUSH_MS = int(
+            self._get_optional("COSMOSDB_WRITE_BEHIND_FLUSH_MS", "500")
+        )
+        # Reads within the TTL are not revalidated, use 0 with more than one replica
+        self.COSMOSDB_PLAN_CACHE_SIZE = int(
+            self._get_optional("COSMOSDB_PLAN_CACHE_SIZE", "1024")
+        )
+        self.COSMOSDB_PLAN_CACHE_TTL = float(
+            self._get_optional("COSMOSDB_PLAN_CACHE_TTL", "30")
+        )
+        self.COSMOSDB_BULK_DELETE_CONCURRENCY = int(
+            self._get_optional("COSMOSDB_BULK_DELETE_CONCURRENCY", "4")
+        )
+        # Transactional batches or query chunks of one bulk call in flight at once
+        self.COSMOSDB_BATCH_CONCURRENCY = int(
+            self._get_optional("COSMOSDB_BATCH_CONCURRENCY", "4")
+        )
+        # Index behind nearest match searches: "matrix", "ivf" or "flat"
+        self.COSMOSDB_VECTOR_INDEX = self._get_optional("COSMOSDB_VECTOR_INDEX", "matrix")
+        self.COSMOSDB_VECTOR_INDEX_DIR = self._get_optional(
+            "COSMOSDB_VECTOR_INDEX_DIR", ".vector_index"
+        )
+        self.COSMOSDB_VECTOR_INDEX_QUANTIZE = self._get_bool("COSMOSDB_VECTOR_INDEX_QUANTIZE")
+        # Storage format of memory embeddings: "list", "float32" or "float16"
+        self.COSMOSDB_EMBEDDING_FORMAT = self._get_optional("COSMOSDB_EMBEDDING_FORMAT", "list")
+        # Provisioned RU/s all Cosmos DB operations are paced to, 0 disables pacing
+        self.COSMOSDB_RU_PER_SECOND = float(
+            self._get_optional("COSMOSDB_RU_PER_SECOND", "0")
+        )
+        self.COSMOSDB_THROTTLE_MAX_RETRIES = int(
+            self._get_optional("COSMOSDB_THROTTLE_MAX_RETRIES", "9")
+        )
+        self.COSMOSDB_THROTTLE_MAX_WAIT_SECONDS = float(
+            self._get_optional("COSMOSDB_THROTTLE_MAX_WAIT_SECONDS", "30")
+        )
+        # Memory store operations slower than this are logged, 0 disables the slow log
+        self.COSMOSDB_SLOW_QUERY_MS = float(
+            self._get_optional("COSMOSDB_SLOW_QUERY_MS", "500")
+        )
+        # Per-user plan list and latest message views maintained from the change feed
+        self.COSMOSDB_CHANGE_FEED_VIEWS = self._get_bool("COSMOSDB_CHANGE_FEED_VIEWS")
+        self.COSMOSDB_CHANGE_FEED_LEASE_DIR = self._get_optional(
+            "COSMOSDB_CHANGE_FEED_LEASE_DIR", ".leases"
+        )
+        self.COSMOSDB_CHANGE_FEED_POLL_SECONDS = float(
+            self._get_optional("COSMOSDB_CHANGE_FEED_POLL_SECONDS", "1")
+        )
+        self.COSMOSDB_CHANGE_FEED_LEASE_SECONDS = float(
+            self._get_optional("COSMOSDB_CHANGE_FEED_LEASE_SECONDS", "30")
+        )
+        # Plans kept in a user's plan list view, users with more are listed by query
+        self.COSMOSDB_PLAN_LIST_VIEW_MAX_PLANS = int(
+            self._get_optional("COSMOSDB_PLAN_LIST_VIEW_MAX_PLANS", "500")
+        )
+        # Partition key of the memory container: "session" (/session_id) or
+        # "hierarchical" (/user_id, /session_id)
+        self.COSMOSDB_PARTITION_LAYOUT = self._get_optional(
+            "COSMOSDB_PARTITION_LAYOUT", "session"
+        )
+        # Point reads slower than the percentile latency are sent twice, at most budget
+        # extra reads per read
+        self.COSMOSDB_HEDGED_READS = self._get_bool("COSMOSDB_HEDGED_READS")
+        self.COSMOSDB_HEDGE_PERCENTILE = float(
+            self._get_optional("COSMOSDB_HEDGE_PERCENTILE", "95")
+        )
+        self.COSMOSDB_HEDGE_BUDGET = float(
+            self._get_optional("COSMOSDB_HEDGE_BUDGET", "0.05")
+        )
+        # First delay before initialization is retried after a failure, doubled per failure
+        self.COSMOSDB_INIT_RETRY_SECONDS = float(
+            self._get_optional("COSMOSDB_INIT_RETRY_SECONDS", "0.5")
+        )
+        self.COSMOSDB_INIT_RETRY_MAX_SECONDS = float(
+            self._get_optional("COSMOSDB_INIT_RETRY_MAX_SECONDS", "30")
+        )
+        # Text fields of at least the threshold in characters are compressed and stored
+        # once by content hash outside the documents
+        self.COSMOSDB_LARGE_TEXT_OFFLOAD = self._get_bool("COSMOSDB_LARGE_TEXT_OFFLOAD")
+        self.COSMOSDB_LARGE_TEXT_THRESHOLD = int(
+            self._get_optional("COSMOSDB_LARGE_TEXT_THRESHOLD", "16384")
+        )
+        # Shared by every replica, e.g. an Azure Files mount, when there is more than one
+        self.COSMOSDB_LARGE_TEXT_DIR = self._get_optional(
+            "COSMOSDB_LARGE_TEXT_DIR", ".large_text"
+        )
+        self.COSMOSDB_LARGE_TEXT_CACHE_CHARS = int(
+            self._get_optional("COSMOSDB_LARGE_TEXT_CACHE_CHARS", "67108864")
+        )
 
         # Azure OpenAI settings
         self.AZURE_OPENAI_DEPLOYMENT_NAME = self._get_required(
@@ -3,7 +3,8 @@ import asyncio
 import logging
 import os
 import uuid
-from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 # Semantic Kernel imports
 from app_config import config
@@ -14,11 +15,20 @@ import re
 from dateutil import parser
 from azure.monitor.opentelemetry import configure_azure_monitor
 from config_kernel import Config
+from context.bulk_delete import bulk_delete_engine
+from context.change_feed import change_feed_processor
+from context.cosmos_client_registry import cosmos_registry
+from context.memory_backend import get_memory_container
+from context.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, InvalidCursorError
+from context.throttling import throttling_policy
+from context.write_behind import write_behind_queue
 from event_utils import track_event_if_configured
 
 # FastAPI imports
-from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from kernel_agents.agent_factory import AgentFactory
 
 # Local imports
@@ -29,6 +39,7 @@ from models.messages_kernel import (
     HumanClarification,
     HumanFeedback,
     InputTask,
+    Plan,
     PlanWithSteps,
     Step,
     UserLanguage
@@ -66,8 +77,25 @@ logging.getLogger("azure.monitor.opentelemetry.exporter.export._base").setLevel(
     logging.WARNING
 )
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the shared Cosmos DB connection pool at startup, flush and close it at shutdown."""
+    await cosmos_registry.warm_up(
+        config.COSMOSDB_ENDPOINT, config.COSMOSDB_DATABASE, config.COSMOSDB_CONTAINER
+    )
+    if config.COSMOSDB_CHANGE_FEED_VIEWS:
+        change_feed_processor.start(await get_memory_container())
+    yield
+    await change_feed_processor.close()
+    await write_behind_queue.close()
+    await bulk_delete_engine.close()
+    await cosmos_registry.close()
+    logging.info(f"Cosmos DB request charge by operation: {throttling_policy.stats()}")
+
+
 # Initialize the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 frontend_url = Config.FRONTEND_SITE_NAME
 
@@ -78,6 +106,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Configure health check
@@ -85,6 +114,58 @@ app.add_middleware(HealthCheckMiddleware, password="", checks={})
 logging.info("Added health check middleware")
 
 
+async def stream_json_list(models: AsyncIterator[BaseModel]) -> StreamingResponse:
+    """
+    Stream models as a JSON array, sending each element as soon as it is available.
+
+    The first model is read before the response starts, so a failure to initialize the
+    memory store or to run the query is still answered with an error status. A failure
+    later in the stream is logged and ends the array early, so the body stays valid JSON.
+
+    Args:
+        models: Async iterator of the models to serialize
+
+    Returns:
+        A streaming JSON response
+
+    Raises:
+        HTTPException: If the first model could not be read
+    """
+    try:
+        first = await anext(models, None)
+    except Exception as e:
+        logging.exception(f"Failed to start streaming response: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read from the memory store")
+
+    async def body():
+        yield b"["
+        if first is not None:
+            yield first.model_dump_json().encode("utf-8")
+            try:
+                async for model in models:
+                    yield b"," + model.model_dump_json().encode("utf-8")
+            except Exception as e:
+                logging.exception(f"Streaming response ended early: {e}")
+        yield b"]"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+async def list_plan(memory_store, plan: Plan) -> PlanWithSteps:
+    """
+    Build the listing entry of a plan from its step counters.
+
+    Plans stored before the counters existed have their steps counted once, and the
+    counts are stored with the plan.
+    """
+    if plan.counters_version < Plan.COUNTERS_VERSION:
+        plan = await memory_store.recount_plan_steps(plan)
+
+    plan_with_steps = PlanWithSteps(**plan.model_dump())
+    plan_with_steps.update_overall_status()
+    return plan_with_steps
+
+
 def format_dates_in_messages(messages, target_locale="en-US"):
     """
     Format dates in agent messages according to the specified locale.
@@ -628,8 +709,12 @@ async def approve_step_endpoint(
 @app.get("/api/plans")
 async def get_plans(
     request: Request,
+    response: Response,
     session_id: Optional[str] = Query(None),
     plan_id: Optional[str] = Query(None),
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    since_ts: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
 ):
     """
     Retrieve plans for the current user.
@@ -643,9 +728,25 @@ async def get_plans(
         type: string
         required: false
         description: Optional session ID to retrieve plans for a specific session
+      - name: page_size
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of plans to return when listing all plans
+      - name: since_ts
+        in: query
+        type: integer
+        required: false
+        description: Only list plans changed after this timestamp (Cosmos DB _ts)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from the X-Next-Cursor header of the previous page
     responses:
       200:
-        description: List of plans with steps for the user
+        description: List of plans for the user. Steps are only included when filtering
+          by session_id or plan_id, otherwise the step counters are returned.
         schema:
           type: array
           items:
@@ -711,7 +812,9 @@ async def get_plans(
             raise HTTPException(status_code=404, detail="Plan not found")
 
         # Use get_steps_by_plan to match the original implementation
-        steps = await memory_store.get_steps_by_plan(plan_id=plan.id)
+        steps = await memory_store.get_steps_by_plan(
+            plan_id=plan.id, session_id=plan.session_id
+        )
         plan_with_steps = PlanWithSteps(**plan.model_dump(), steps=steps)
         plan_with_steps.update_step_counts()
         return [plan_with_steps]
@@ -725,7 +828,9 @@ async def get_plans(
             raise HTTPException(status_code=404, detail="Plan not found")
 
         # Use get_steps_by_plan to match the original implementation
-        steps = await memory_store.get_steps_by_plan(plan_id=plan.id)
+        steps = await memory_store.get_steps_by_plan(
+            plan_id=plan.id, session_id=plan.session_id
+        )
         messages = await memory_store.get_data_by_type_and_session_id(
             "agent_message", session_id=plan.session_id
         )
@@ -738,19 +843,31 @@ async def get_plans(
 
         return [plan_with_steps, formatted_messages]
 
-    all_plans = await memory_store.get_all_plans()
-    # Fetch steps for all plans concurrently
-    steps_for_all_plans = await asyncio.gather(
-        *[memory_store.get_steps_by_plan(plan_id=plan.id) for plan in all_plans]
-    )
-    # Create list of PlanWithSteps and update step counts
-    list_of_plans_with_steps = []
-    for plan, steps in zip(all_plans, steps_for_all_plans):
-        plan_with_steps = PlanWithSteps(**plan.model_dump(), steps=steps)
-        plan_with_steps.update_step_counts()
-        list_of_plans_with_steps.append(plan_with_steps)
+    # Plans carry their step counters, so the listing is one projection query and
+    # steps are only loaded by the session_id / plan_id lookups above
+    if page_size is None and cursor is None:
+        if config.COSMOSDB_CHANGE_FEED_VIEWS and since_ts is None:
+            # One point read of the user's plan list view instead of a query
+            plans = await memory_store.get_plan_list_view()
+            if plans is not None:
+                return await asyncio.gather(*[list_plan(memory_store, plan) for plan in plans])
 
-    return list_of_plans_with_steps
+        async def stream_plans():
+            async for plan in memory_store.iter_plan_summaries(since_ts=since_ts):
+                yield await list_plan(memory_store, plan)
+
+        return await stream_json_list(stream_plans())
+
+    try:
+        all_plans, next_cursor = await memory_store.get_plan_summaries(
+            page_size=page_size, since_ts=since_ts, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return await asyncio.gather(*[list_plan(memory_store, plan) for plan in all_plans])
 
 
 @app.get("/api/steps/{plan_id}", response_model=List[Step])
@@ -819,7 +936,14 @@ async def get_steps_by_plan(plan_id: str, request: Request) -> List[Step]:
 
 
 @app.get("/api/agent_messages/{session_id}", response_model=List[AgentMessage])
-async def get_agent_messages(session_id: str, request: Request) -> List[AgentMessage]:
+async def get_agent_messages(
+    session_id: str,
+    request: Request,
+    response: Response,
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    since_ts: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+) -> List[AgentMessage]:
     """
     Retrieve agent messages for a specific session.
 
@@ -835,6 +959,21 @@ async def get_agent_messages(session_id: str, request: Request) -> List[AgentMes
         type: string
         required: true
         description: The ID of the session to retrieve agent messages for
+      - name: page_size
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of agent messages to return
+      - name: since_ts
+        in: query
+        type: integer
+        required: false
+        description: Only return agent messages written after this timestamp (Cosmos DB _ts)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from the X-Next-Cursor header of the previous page
     responses:
       200:
         description: List of agent messages associated with the specified session
@@ -882,13 +1021,30 @@ async def get_agent_messages(session_id: str, request: Request) -> List[AgentMes
     kernel, memory_store = await initialize_runtime_and_context(
         session_id or "", user_id
     )
-    agent_messages = await memory_store.get_data_by_type("agent_message")
+    if page_size is None and cursor is None:
+        return await stream_json_list(
+            memory_store.iter_agent_messages(session_id, since_ts=since_ts)
+        )
+
+    try:
+        agent_messages, next_cursor = await memory_store.get_agent_messages_page(
+            session_id, page_size=page_size, since_ts=since_ts, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return agent_messages
 
 
 @app.get("/api/agent_messages_by_plan/{plan_id}", response_model=List[AgentMessage])
 async def get_agent_messages_by_plan(
-    plan_id: str, request: Request
+    plan_id: str,
+    request: Request,
+    response: Response,
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    since_ts: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
 ) -> List[AgentMessage]:
     """
     Retrieve agent messages for a specific session.
@@ -905,6 +1061,21 @@ async def get_agent_messages_by_plan(
         type: string
         required: true
         description: The ID of the session to retrieve agent messages for
+      - name: page_size
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of agent messages to return
+      - name: since_ts
+        in: query
+        type: integer
+        required: false
+        description: Only return agent messages written after this timestamp (Cosmos DB _ts)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from the X-Next-Cursor header of the previous page
     responses:
       200:
         description: List of agent messages associated with the specified session
@@ -950,27 +1121,44 @@ async def get_agent_messages_by_plan(
 
     # Initialize memory context
     kernel, memory_store = await initialize_runtime_and_context("", user_id)
-    agent_messages = await memory_store.get_data_by_type_and_plan_id("agent_message")
+    if page_size is None and cursor is None:
+        return await stream_json_list(
+            memory_store.iter_agent_messages_by_plan(plan_id, since_ts=since_ts)
+        )
+
+    try:
+        agent_messages, next_cursor = await memory_store.get_agent_messages_by_plan(
+            plan_id, page_size=page_size, since_ts=since_ts, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return agent_messages
 
 
-@app.delete("/api/messages")
-async def delete_all_messages(request: Request) -> Dict[str, str]:
+@app.delete("/api/messages", status_code=202)
+async def delete_all_messages(request: Request) -> Dict[str, Any]:
     """
     Delete all messages across sessions.
 
+    The deletion runs in the background, poll the returned job for its progress.
+
     ---
     tags:
       - Messages
     responses:
-      200:
-        description: Confirmation of deletion
+      202:
+        description: Deletion started
         schema:
           type: object
           properties:
             status:
               type: string
-              description: Status message indicating all messages were deleted
+              description: Status message indicating the deletion was started
+            job:
+              type: object
+              description: Handle of the deletion job, see /api/messages/delete_jobs/{job_id}
       400:
         description: Missing or invalid user information
     """
@@ -985,25 +1173,97 @@ async def delete_all_messages(request: Request) -> Dict[str, str]:
     # Initialize memory context
     kernel, memory_store = await initialize_runtime_and_context("", user_id)
 
-    await memory_store.delete_all_items("plan")
-    await memory_store.delete_all_items("session")
-    await memory_store.delete_all_items("step")
-    await memory_store.delete_all_items("agent_message")
+    job = await memory_store.start_bulk_delete(
+        ["plan", "session", "step", "agent_message"]
+    )
 
     # Clear the agent factory cache
     AgentFactory.clear_cache()
 
-    return {"status": "All messages deleted"}
+    return {"status": "Deletion of all messages started", "job": job.to_dict()}
+
+
+@app.get("/api/messages/delete_jobs/{job_id}")
+async def get_delete_job(job_id: str, request: Request) -> Dict[str, Any]:
+    """
+    Get the progress of a deletion started by DELETE /api/messages.
+
+    ---
+    tags:
+      - Messages
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+        description: The job_id returned when the deletion was started
+    responses:
+      200:
+        description: Progress of the deletion job
+        schema:
+          type: object
+          properties:
+            job_id:
+              type: string
+            status:
+              type: string
+              description: pending, running, completed, completed_with_errors, failed or cancelled
+            total_items:
+              type: integer
+            deleted_items:
+              type: integer
+            failed_items:
+              type: integer
+      400:
+        description: Missing or invalid user information
+      404:
+        description: Job not found, or kept by another replica (jobs are tracked in memory by the replica running them)
+    """
+    authenticated_user = get_authenticated_user_details(request_headers=request.headers)
+    user_id = authenticated_user["user_principal_id"]
+    if not user_id:
+        track_event_if_configured(
+            "UserIdNotFound", {"status_code": 400, "detail": "no user"}
+        )
+        raise HTTPException(status_code=400, detail="no user")
+
+    kernel, memory_store = await initialize_runtime_and_context("", user_id)
+    job = memory_store.get_bulk_delete_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 
 @app.get("/api/messages")
-async def get_all_messages(request: Request):
+async def get_all_messages(
+    request: Request,
+    response: Response,
+    page_size: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    since_ts: Optional[int] = Query(None),
+    cursor: Optional[str] = Query(None),
+):
     """
     Retrieve all messages across sessions.
 
     ---
     tags:
       - Messages
+    parameters:
+      - name: page_size
+        in: query
+        type: integer
+        required: false
+        description: Maximum number of messages to return
+      - name: since_ts
+        in: query
+        type: integer
+        required: false
+        description: Only return messages written after this timestamp (Cosmos DB _ts)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: Cursor from the X-Next-Cursor header of the previous page
     responses:
       200:
         description: List of all messages across sessions
@@ -1044,10 +1304,67 @@ async def get_all_messages(request: Request):
 
     # Initialize memory context
     kernel, memory_store = await initialize_runtime_and_context("", user_id)
-    message_list = await memory_store.get_all_items()
+    try:
+        message_list, next_cursor = await memory_store.get_messages_page(
+            page_size=page_size, since_ts=since_ts, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return message_list
 
 
+@app.get("/api/sessions/latest_messages", response_model=Dict[str, AgentMessage])
+async def get_latest_messages(request: Request) -> Dict[str, AgentMessage]:
+    """
+    Retrieve the newest agent message of each session of the current user.
+
+    ---
+    tags:
+      - Messages
+    responses:
+      200:
+        description: The latest agent message keyed by session ID
+        schema:
+          type: object
+          additionalProperties:
+            type: object
+            properties:
+              id:
+                type: string
+                description: Unique ID of the message
+              session_id:
+                type: string
+                description: Session ID associated with the message
+              plan_id:
+                type: string
+                description: Plan ID associated with the message
+              content:
+                type: string
+                description: Content of the message
+              source:
+                type: string
+                description: Source of the message (e.g., agent type)
+              timestamp:
+                type: string
+                format: date-time
+                description: Timestamp of the message
+      400:
+        description: Missing or invalid user information
+    """
+    authenticated_user = get_authenticated_user_details(request_headers=request.headers)
+    user_id = authenticated_user["user_principal_id"]
+    if not user_id:
+        track_event_if_configured(
+            "UserIdNotFound", {"status_code": 400, "detail": "no user"}
+        )
+        raise HTTPException(status_code=400, detail="no user")
+
+    kernel, memory_store = await initialize_runtime_and_context("", user_id)
+    return await memory_store.get_latest_agent_messages()
+
+
 @app.get("/api/agent-tools")
 async def get_agent_tools():
     """
@@ -0,0 +1,95 @@
+# document_decode_benchmark.py
+"""Compare the documents per second of model_validate and the DocumentDecoder.
+
+Run from src/backend:
+
+    python -m benchmarks.document_decode_benchmark --documents 20000 --text-size 4000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "benchmark")
+
+from context.document_codec import DocumentDecoder, encode_document  # noqa: E402
+from models.messages_kernel import AgentMessage, AgentType, Step, StepStatus  # noqa: E402
+
+
+def make_documents(model_class: type, count: int, text_size: int) -> list:
+    """Stored documents as Cosmos DB returns them, system properties included."""
+    text = ("lorem ipsum " * (text_size // 12 + 1))[:text_size]
+    documents = []
+    for i in range(count):
+        if model_class is Step:
+            model = Step(
+                plan_id="plan", session_id="session", user_id="user", action=text,
+                agent=AgentType.HR, status=StepStatus.completed, agent_reply=text,
+            )
+        else:
+            model = AgentMessage(
+                session_id="session", user_id="user", plan_id="plan", content=text, source="agent",
+            )
+        document = encode_document(model)
+        document.update({"_rid": f"rid{i}", "_self": f"dbs/x/docs/{i}", "_etag": '"etag"',
+                         "_attachments": "attachments/", "_ts": 1700000000 + i})
+        documents.append(document)
+    return documents
+
+
+def documents_per_second(decode, documents: list, repeat: int) -> float:
+    """Best throughput of decoding every document, out of several runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(documents)
+        best = min(best, time.perf_counter() - start)
+    return len(documents) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--text-size", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    decoder = DocumentDecoder()
+    print(
+        f"{'model':<16}{'model_validate/s':>18}{'model_construct/s':>19}{'decode/s':>12}"
+        f"{'decode_many/s':>16}{'speedup':>10}"
+    )
+    for model_class in (Step, AgentMessage):
+        documents = make_documents(model_class, args.documents, args.text_size)
+        before = documents_per_second(
+            lambda page: [model_class.model_validate(document) for document in page], documents, args.repeat
+        )
+        # The unvalidated path, for reference: slower than pydantic-core in pydantic 2
+        construct = documents_per_second(
+            lambda page: [model_class.model_construct(**document) for document in page], documents, args.repeat
+        )
+        single = documents_per_second(
+            lambda page: [decoder.decode(document, model_class) for document in page], documents, args.repeat
+        )
+        batched = documents_per_second(
+            lambda page: decoder.decode_many(page, model_class), documents, args.repeat
+        )
+        print(
+            f"{model_class.__name__:<16}{before:>18,.0f}{construct:>19,.0f}{single:>12,.0f}{batched:>16,.0f}"
+            f"{batched / before:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
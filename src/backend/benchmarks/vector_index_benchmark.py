@@ -0,0 +1,93 @@
+# vector_index_benchmark.py
+"""Compare recall and latency of the vector indexes against the exact scan.
+
+Run from src/backend:
+
+    python -m benchmarks.vector_index_benchmark --records 100000 --dim 1536
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "benchmark")
+
+from context.embedding_matrix import EmbeddingMatrix  # noqa: E402
+from context.vector_index import IVFIndex  # noqa: E402
+
+
+def make_embeddings(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered random embeddings, closer to real text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    noise = 0.5 * rng.normal(size=(count, dim))
+    return (centers[rng.integers(clusters, size=count)] + noise).astype(np.float32)
+
+
+def time_queries(search, queries: np.ndarray) -> tuple:
+    """Run every query, returning the results and the median and p99 latency in ms."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, float(np.median(latencies)), float(np.percentile(latencies, 99))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    vectors = make_embeddings(args.records, args.dim, args.clusters, seed=0)
+    queries = make_embeddings(args.queries, args.dim, args.clusters, seed=1)
+    keys = [f"record-{i}" for i in range(args.records)]
+
+    matrix = EmbeddingMatrix([{"id": key} for key in keys], list(vectors))
+    exact, median, p99 = time_queries(
+        lambda q: {keys[row] for row, _ in matrix.search(q, args.limit, -1)}, queries
+    )
+    print(f"{'index':<16}{'build s':>10}{'median ms':>12}{'p99 ms':>10}{'recall':>10}")
+    print(f"{'matrix (exact)':<16}{'-':>10}{median:>12.2f}{p99:>10.2f}{1.0:>10.3f}")
+
+    for name, options in (
+        ("flat", {"nlist": 1}),
+        ("flat int8", {"nlist": 1, "quantize": True}),
+        ("ivf", {"nprobe": args.nprobe}),
+        ("ivf int8", {"nprobe": args.nprobe, "quantize": True}),
+    ):
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            index = IVFIndex(directory, **options)
+            index.add(keys, vectors)
+            build = time.perf_counter() - start
+
+            found, median, p99 = time_queries(
+                lambda q: {key for key, _ in index.search(q, args.limit, -1)}, queries
+            )
+            recall = np.mean([len(f & e) / len(e) for f, e in zip(found, exact)])
+            print(f"{name:<16}{build:>10.2f}{median:>12.2f}{p99:>10.2f}{recall:>10.3f}")
+            index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# bulk_delete.py
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from azure.cosmos.exceptions import (
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+    CosmosResourceNotFoundError,
+)
+
+from app_config import config
+from context.partitioning import PartitionKeyValue, PartitionLayout, partition_layout
+
+
+class BulkDeleteJob:
+    """Progress of one bulk delete, returned to clients as a job handle."""
+
+    def __init__(self, user_id: str) -> None:
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.status = "pending"
+        self.total_items = 0
+        self.deleted_items = 0
+        self.failed_items = 0
+        self.partitions = 0
+        self.request_charge = 0.0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    async def wait(self) -> None:
+        """Wait until the job has finished."""
+        await self._done.wait()
+
+    def _finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self._done.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the job handle as a JSON serializable dict."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total_items": self.total_items,
+            "deleted_items": self.deleted_items,
+            "failed_items": self.failed_items,
+            "partitions": self.partitions,
+            "request_charge": round(self.request_charge, 2),
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BulkDeleteEngine:
+    """Delete large sets of documents in the background.
+
+    The IDs matching a query are grouped by their session_id and each session's
+    partition is deleted with transactional batches of up to ``MAX_BATCH_SIZE``
+    operations. At most ``max_concurrency`` partitions are worked on at once. Batches
+    are paced and throttled (429) batches retried by the throttling policy of the
+    container, like every other operation, rather than by a budget or retry loop of
+    their own; a batch still throttled when the policy gives up counts as failed.
+
+    A batch fails as a whole when one of its documents is already gone, in which
+    case that batch is retried one document at a time.
+
+    Jobs are tracked in the memory of the process that started them. With more than
+    one replica, a job can only be polled on the replica that runs it, and a restart
+    forgets running jobs; the documents they had not deleted yet are left in place
+    and are deleted by starting the deletion again.
+    """
+
+    # Maximum number of operations Cosmos DB accepts in one transactional batch
+    MAX_BATCH_SIZE = 100
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_jobs: int = 100,
+        layout: Optional[PartitionLayout] = None,
+    ) -> None:
+        self._max_concurrency = max_concurrency
+        self._layout = layout or partition_layout
+        self._max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, BulkDeleteJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(
+        self,
+        container: Any,
+        user_id: str,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        on_complete: Optional[Callable[[BulkDeleteJob], None]] = None,
+    ) -> BulkDeleteJob:
+        """Start deleting the documents matched by a query.
+
+        Args:
+            container: The Cosmos container proxy to delete from
+            user_id: The user the job belongs to
+            query: Query selecting at least c.id and c.session_id of the user's documents
+            parameters: The query parameters
+            on_complete: Optional callback run when the job has finished
+
+        Returns:
+            The job handle, updated as the deletion progresses
+        """
+        job = BulkDeleteJob(user_id)
+        self._jobs[job.id] = job
+        self._evict_finished_jobs()
+
+        task = asyncio.create_task(self._run(job, container, query, parameters, on_complete))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    def get_job(self, job_id: str, user_id: str) -> Optional[BulkDeleteJob]:
+        """Get a job handle, only for the user that started it."""
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _evict_finished_jobs(self) -> None:
+        """Forget the oldest finished jobs once more than max_jobs are kept."""
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done]:
+            if len(self._jobs) <= self._max_jobs:
+                break
+            del self._jobs[job_id]
+
+    async def _run(
+        self,
+        job: BulkDeleteJob,
+        container: Any,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        on_complete: Optional[Callable[[BulkDeleteJob], None]],
+    ) -> None:
+        job.status = "running"
+        try:
+            # With hierarchical partition keys only the user's partitions are queried
+            prefix = self._layout.user_prefix(job.user_id)
+            scope = {} if prefix is None else {"partition_key": prefix}
+            partitions: Dict[Optional[str], List[str]] = {}
+            async for item in container.query_items(query=query, parameters=parameters, **scope):
+                partitions.setdefault(item.get("session_id"), []).append(item["id"])
+            job.total_items = sum(len(ids) for ids in partitions.values())
+            job.partitions = len(partitions)
+
+            semaphore = asyncio.Semaphore(self._max_concurrency)
+
+            async def delete_partition(session_id: Optional[str], ids: List[str]) -> None:
+                partition_key = None if session_id is None else self._layout.key(job.user_id, session_id)
+                async with semaphore:
+                    await self._delete_partition(job, container, partition_key, ids)
+
+            await asyncio.gather(
+                *[delete_partition(session_id, ids) for session_id, ids in partitions.items()]
+            )
+            job._finish("completed" if job.failed_items == 0 else "completed_with_errors")
+            logging.info(
+                f"Bulk delete {job.id} removed {job.deleted_items} of {job.total_items} items "
+                f"in {job.partitions} partitions for {job.request_charge:.1f} RU"
+            )
+        except asyncio.CancelledError:
+            job._finish("cancelled")
+            raise
+        except Exception as e:
+            logging.exception(f"Bulk delete {job.id} failed: {e}")
+            job._finish("failed", str(e))
+        finally:
+            if on_complete is not None:
+                on_complete(job)
+
+    async def _delete_partition(
+        self,
+        job: BulkDeleteJob,
+        container: Any,
+        partition_key: Optional[PartitionKeyValue],
+        ids: List[str],
+    ) -> None:
+        """Delete the documents of one partition, one transactional batch at a time."""
+        if partition_key is None:
+            # Documents without a session_id can not be addressed by a batch
+            await self._delete_individually(job, container, partition_key, ids)
+            return
+
+        for start in range(0, len(ids), self.MAX_BATCH_SIZE):
+            chunk = ids[start:start + self.MAX_BATCH_SIZE]
+            try:
+                results = await container.execute_item_batch(
+                    batch_operations=[("delete", (item_id,)) for item_id in chunk],
+                    partition_key=partition_key,
+                )
+            except CosmosBatchOperationError:
+                # Some document is already gone, delete the rest one by one
+                await self._delete_individually(job, container, partition_key, chunk)
+                continue
+            except CosmosHttpResponseError as e:
+                logging.exception(
+                    f"Failed to delete {len(chunk)} items in partition {partition_key}: {e}"
+                )
+                job.failed_items += len(chunk)
+                continue
+            job.request_charge += sum(result.get("requestCharge", 0) for result in results)
+            job.deleted_items += len(chunk)
+
+    async def _delete_individually(
+        self,
+        job: BulkDeleteJob,
+        container: Any,
+        partition_key: Optional[PartitionKeyValue],
+        ids: List[str],
+    ) -> None:
+        """Delete documents one at a time, treating missing ones as deleted."""
+        for item_id in ids:
+            try:
+                await container.delete_item(item=item_id, partition_key=partition_key)
+            except CosmosResourceNotFoundError:
+                pass
+            except Exception as e:
+                logging.exception(f"Failed to delete item {item_id}: {e}")
+                job.failed_items += 1
+                continue
+            job.deleted_items += 1
+
+    async def close(self) -> None:
+        """Cancel running jobs."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+
+# Create a global instance of the engine shared by all memory contexts
+bulk_delete_engine = BulkDeleteEngine(
+    max_concurrency=config.COSMOSDB_BULK_DELETE_CONCURRENCY,
+)
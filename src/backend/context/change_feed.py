@@ -0,0 +1,368 @@
+# change_feed.py
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from app_config import config
+from context.partitioning import PartitionKeyValue, partition_layout
+from models.messages_kernel import StepStatus
+
+# Data types of the materialized view documents
+PLAN_LIST_VIEW = "plan_list_view"
+LATEST_MESSAGES_VIEW = "latest_messages_view"
+VIEW_DATA_TYPES = (PLAN_LIST_VIEW, LATEST_MESSAGES_VIEW)
+
+# Plan fields kept in the plan list view, the same as a plan listing query returns
+PLAN_VIEW_FIELDS = (
+    "id",
+    "data_type",
+    "session_id",
+    "user_id",
+    "initial_goal",
+    "overall_status",
+    "source",
+    "timestamp",
+    "_ts",
+    "total_steps",
+    *(status.value for status in StepStatus),
+    "counters_version",
+)
+
+# View updated by the changes of each data type
+VIEW_OF_DATA_TYPE = {"plan": PLAN_LIST_VIEW, "agent_message": LATEST_MESSAGES_VIEW}
+
+# Document fields left out of the latest messages view
+SYSTEM_FIELDS = ("_rid", "_self", "_etag", "_attachments", "_lsn")
+
+
+def view_id(data_type: str, user_id: str) -> str:
+    """Get the ID, and session_id, of a user's view document."""
+    return f"{data_type}:{user_id}"
+
+
+def view_partition_key(data_type: str, user_id: str) -> PartitionKeyValue:
+    """Get the partition key of a user's view document."""
+    return partition_layout.key(user_id, view_id(data_type, user_id))
+
+
+class FileLeaseStore:
+    """Leases and checkpoints of change feed processors, one JSON file per lease.
+
+    A lease is owned by one processor until it expires, so only one of several app
+    instances sharing the directory processes the feed at a time. Reads and writes of
+    a lease hold an exclusive file lock. Stands in for a Cosmos DB lease container on
+    single node deployments.
+
+    The methods block on the lock and the lease file, async callers run them in a
+    worker thread.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+
+    def _path(self, lease_name: str) -> str:
+        return os.path.join(self._directory, f"{lease_name}.json")
+
+    @contextmanager
+    def _locked(self, lease_name: str) -> Iterator[Dict[str, Any]]:
+        """Lock a lease and yield its state, writing the state back on exit."""
+        os.makedirs(self._directory, exist_ok=True)
+        with open(self._path(lease_name) + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._path(lease_name), "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except FileNotFoundError:
+                    state = {}
+                original = dict(state)
+                yield state
+                if state != original:
+                    tmp_path = self._path(lease_name) + ".tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(state, f)
+                    os.replace(tmp_path, self._path(lease_name))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def acquire(self, lease_name: str, owner: str, duration: float) -> Optional[Dict[str, Any]]:
+        """Take or renew a lease.
+
+        Args:
+            lease_name: The lease to take
+            owner: The processor taking it
+            duration: Seconds the lease is held without renewal
+
+        Returns:
+            The lease state, including its last checkpointed continuation, or None if
+            another owner holds the lease
+        """
+        with self._locked(lease_name) as state:
+            if state.get("owner") not in (None, owner) and state.get("expires_at", 0) > time.time():
+                return None
+            state["owner"] = owner
+            state["expires_at"] = time.time() + duration
+            return dict(state)
+
+    def checkpoint(self, lease_name: str, owner: str, continuation: Optional[str]) -> bool:
+        """Record how far the owner of a lease has processed the feed.
+
+        Returns:
+            False if the lease was lost to another owner, in which case nothing is recorded
+        """
+        with self._locked(lease_name) as state:
+            if state.get("owner") != owner:
+                return False
+            state["continuation"] = continuation
+            state["checkpointed_at"] = time.time()
+            return True
+
+    def release(self, lease_name: str, owner: str) -> None:
+        """Give up a lease so another processor can take it immediately."""
+        with self._locked(lease_name) as state:
+            if state.get("owner") == owner:
+                state["owner"] = None
+                state["expires_at"] = 0
+
+
+class ChangeFeedProcessor:
+    """Maintain per-user materialized views from the change feed of the memory container.
+
+    Two view documents are kept per user, each in its own partition:
+
+    - the plan list view maps plan IDs to the plan listing fields, step counters included
+    - the latest messages view maps session IDs to the newest agent message of the session
+
+    Changes are read from the last checkpoint of the lease, applied to the views a
+    page at a time, and the page is checkpointed once its views are written. A crash
+    replays at most one page, which is harmless as applying a change is idempotent.
+
+    The change feed does not include deletes, so bulk deletes drop the affected views
+    of the user through reset_user_views and the views are rebuilt by later changes.
+    View writes are conditional on the etag the view was read with, so a view deleted
+    while a page is applied stays deleted instead of being written back.
+
+    The view documents share the memory container with the user's documents, so
+    user-scoped listings must leave out VIEW_DATA_TYPES.
+
+    A plan list view keeps the ``max_view_plans`` most recently changed plans of the
+    user, so that it stays far below the Cosmos DB item size limit. A view that had to
+    drop plans is marked truncated and is not used to list the user's plans.
+    """
+
+    LEASE_NAME = "memory-views"
+
+    # Attempts at a conditional view write before the page is given up and replayed
+    CONDITIONAL_WRITE_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        lease_store: FileLeaseStore,
+        poll_interval: float = 1.0,
+        lease_duration: float = 30.0,
+        page_size: int = 100,
+        max_view_plans: int = 500,
+    ) -> None:
+        self._lease_store = lease_store
+        self._poll_interval = poll_interval
+        self._lease_duration = lease_duration
+        self._page_size = page_size
+        self._max_view_plans = max_view_plans
+        self._owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, container: Any) -> None:
+        """Start processing the change feed of a container in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(container))
+
+    async def _run(self, container: Any) -> None:
+        while True:
+            try:
+                await self.process_changes(container)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.exception(f"Change feed processing failed: {e}")
+            await asyncio.sleep(self._poll_interval)
+
+    async def process_changes(self, container: Any) -> int:
+        """Apply every change since the last checkpoint to the views.
+
+        Returns:
+            The number of changed documents applied to views, 0 if another processor holds the lease
+        """
+        lease = await asyncio.to_thread(
+            self._lease_store.acquire, self.LEASE_NAME, self._owner, self._lease_duration
+        )
+        if lease is None:
+            return 0
+
+        continuation = lease.get("continuation")
+        if continuation:
+            feed = container.query_items_change_feed(
+                continuation=continuation, max_item_count=self._page_size
+            )
+        else:
+            feed = container.query_items_change_feed(
+                start_time="Beginning", max_item_count=self._page_size
+            )
+
+        processed = 0
+        pages = feed.by_page()
+        async for page in pages:
+            documents = [document async for document in page]
+            processed += await self._apply(container, documents)
+            if not await asyncio.to_thread(
+                self._lease_store.checkpoint, self.LEASE_NAME, self._owner, pages.continuation_token
+            ):
+                logging.warning("Change feed lease lost, stopping until it can be taken again")
+                break
+        return processed
+
+    async def _apply(self, container: Any, documents: List[Dict[str, Any]]) -> int:
+        """Apply a page of changed documents to the views they affect.
+
+        Returns:
+            The number of documents that affect a view
+        """
+        changes: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for document in documents:
+            user_id = document.get("user_id")
+            data_type = VIEW_OF_DATA_TYPE.get(document.get("data_type"))
+            if user_id and data_type:
+                changes.setdefault((data_type, user_id), []).append(document)
+
+        await asyncio.gather(
+            *[
+                self._update_view(container, data_type, user_id, changed)
+                for (data_type, user_id), changed in changes.items()
+            ]
+        )
+        return sum(len(changed) for changed in changes.values())
+
+    async def _update_view(
+        self, container: Any, data_type: str, user_id: str, documents: List[Dict[str, Any]]
+    ) -> None:
+        """Apply changed documents to one view, conditionally on the etag it was read with.
+
+        A view that did not exist is created, a conflict is retried against the view
+        as it is now, and a view deleted since it was read is left deleted.
+
+        Raises:
+            CosmosAccessConditionFailedError: If the view kept changing, the page is then
+                not checkpointed and is applied again on the next poll
+        """
+        for _ in range(self.CONDITIONAL_WRITE_ATTEMPTS):
+            view = await self._read_view(container, data_type, user_id)
+            etag = view.get("_etag")
+            for document in documents:
+                self._apply_change(view, data_type, document)
+            if data_type == PLAN_LIST_VIEW:
+                self._cap_plans(view)
+            try:
+                if etag is None:
+                    await container.create_item(body=view)
+                else:
+                    await container.replace_item(
+                        item=view["id"],
+                        body=view,
+                        etag=etag,
+                        match_condition=MatchConditions.IfNotModified,
+                    )
+                return
+            except CosmosResourceNotFoundError:
+                logging.info(f"View {view['id']} was deleted while it was updated, leaving it deleted")
+                return
+            except (CosmosAccessConditionFailedError, CosmosResourceExistsError) as e:
+                logging.info(f"View {view['id']} changed while it was updated, retrying")
+                last_error = e
+
+        logging.error(f"Giving up updating view {view_id(data_type, user_id)} after repeated conflicts")
+        raise last_error
+
+    @staticmethod
+    def _apply_change(view: Dict[str, Any], data_type: str, document: Dict[str, Any]) -> None:
+        """Apply one changed document to a view, older changes never replace newer ones."""
+        if data_type == PLAN_LIST_VIEW:
+            current = view["plans"].get(document["id"])
+            if current is None or current.get("_ts", 0) <= document.get("_ts", 0):
+                view["plans"][document["id"]] = {
+                    field: document[field] for field in PLAN_VIEW_FIELDS if field in document
+                }
+        else:
+            current = view["sessions"].get(document["session_id"])
+            if current is None or current.get("_ts", 0) <= document.get("_ts", 0):
+                view["sessions"][document["session_id"]] = {
+                    field: value for field, value in document.items() if field not in SYSTEM_FIELDS
+                }
+
+    def _cap_plans(self, view: Dict[str, Any]) -> None:
+        """Keep the most recently changed plans of a view, marking it truncated if any are dropped."""
+        plans = view["plans"]
+        if len(plans) <= self._max_view_plans:
+            return
+        newest = sorted(plans.items(), key=lambda item: item[1].get("_ts", 0), reverse=True)
+        view["plans"] = dict(newest[:self._max_view_plans])
+        view["truncated"] = True
+
+    @staticmethod
+    async def _read_view(container: Any, data_type: str, user_id: str) -> Dict[str, Any]:
+        key = view_id(data_type, user_id)
+        try:
+            return await container.read_item(
+                item=key, partition_key=view_partition_key(data_type, user_id)
+            )
+        except CosmosResourceNotFoundError:
+            entries = "plans" if data_type == PLAN_LIST_VIEW else "sessions"
+            return {"id": key, "session_id": key, "user_id": user_id, "data_type": data_type, entries: {}}
+
+    async def close(self) -> None:
+        """Stop processing and release the lease."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self._lease_store.release, self.LEASE_NAME, self._owner)
+
+
+async def reset_user_views(container: Any, user_id: str, data_types: List[str]) -> None:
+    """Delete the views of a user built from documents that were deleted.
+
+    Args:
+        container: The memory container
+        user_id: The user whose documents were deleted
+        data_types: The data types of the deleted documents
+    """
+    for data_type in {VIEW_OF_DATA_TYPE[t] for t in data_types if t in VIEW_OF_DATA_TYPE}:
+        key = view_id(data_type, user_id)
+        try:
+            await container.delete_item(
+                item=key, partition_key=view_partition_key(data_type, user_id)
+            )
+        except CosmosResourceNotFoundError:
+            pass
+
+
+# Create a global instance of the processor, started by the app when views are enabled
+change_feed_processor = ChangeFeedProcessor(
+    FileLeaseStore(config.COSMOSDB_CHANGE_FEED_LEASE_DIR),
+    poll_interval=config.COSMOSDB_CHANGE_FEED_POLL_SECONDS,
+    lease_duration=config.COSMOSDB_CHANGE_FEED_LEASE_SECONDS,
+    max_view_plans=config.COSMOSDB_PLAN_LIST_VIEW_MAX_PLANS,
+)
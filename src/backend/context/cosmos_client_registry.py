@@ -0,0 +1,174 @@
+# cosmos_client_registry.py
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from azure.cosmos.aio import CosmosClient, DatabaseProxy
+from azure.cosmos.documents import ConnectionPolicy, RetryOptions
+from azure.cosmos.partition_key import PartitionKey
+from context.indexing_policy import MEMORY_INDEXING_POLICY, compare_indexing_policy
+from context.partitioning import partition_layout
+from context.single_flight import SingleFlight
+from context.throttling import ThrottledContainer, throttling_policy
+from helpers.azure_credential_utils import get_azure_credential_async
+
+
+class CosmosClientRegistry:
+    """Process-wide registry of async Cosmos DB clients and container proxies.
+
+    A single ``CosmosClient`` (and therefore a single HTTP connection pool) is kept
+    per endpoint, and container proxies are cached per (endpoint, database, container).
+    Memory contexts created for each request borrow the shared container instead of
+    creating their own client, credential and control-plane round trip.
+
+    Containers are wrapped in a ThrottledContainer, so throttled operations are
+    retried by the shared ThrottlingPolicy instead of by the SDK.
+
+    Each container is resolved by a SingleFlight: a burst of lookups on a cold worker
+    waits for one control-plane call, and after a failure the lookups fail fast until
+    the retry delay has passed.
+    """
+
+    def __init__(self) -> None:
+        self._clients: Dict[str, CosmosClient] = {}
+        self._credentials: Dict[str, Any] = {}
+        self._containers: Dict[Tuple[str, str, str], ThrottledContainer] = {}
+        self._container_flights: Dict[Tuple[str, str, str], SingleFlight] = {}
+        self._lock = asyncio.Lock()
+
+    async def get_container(
+        self,
+        endpoint: str,
+        database: str,
+        container: str,
+        partition_key: Optional[PartitionKey] = None,
+    ) -> ThrottledContainer:
+        """Get the shared container proxy, creating the client and container on first use.
+
+        Args:
+            endpoint: The Cosmos DB account endpoint
+            database: The database name
+            container: The container name
+            partition_key: Partition key used if the container must be created, the
+                configured partition layout's by default
+
+        Returns:
+            The cached container proxy
+        """
+        key = (endpoint, database, container)
+        cached = self._containers.get(key)
+        if cached is not None:
+            return cached
+
+        flight = self._container_flights.get(key)
+        if flight is None:
+            flight = self._container_flights[key] = SingleFlight(f"Cosmos container {database}/{container}")
+        return await flight.run(lambda: self._create_container(key, partition_key))
+
+    async def _create_container(
+        self, key: Tuple[str, str, str], partition_key: Optional[PartitionKey]
+    ) -> ThrottledContainer:
+        """Create the shared proxy of a container, see get_container."""
+        endpoint, database, container = key
+        async with self._lock:
+            client = await self._get_client(endpoint)
+        database_client = client.get_database_client(database)
+        # The partition key and indexing policy only apply to a new container, see
+        # maintenance.partition_migration and maintenance.indexing_policy for existing ones
+        container_proxy = await database_client.create_container_if_not_exists(
+            id=container,
+            partition_key=partition_key or partition_layout.partition_key(),
+            indexing_policy=MEMORY_INDEXING_POLICY,
+        )
+        self._containers[key] = ThrottledContainer(container_proxy, throttling_policy)
+        logging.info(f"Registered shared Cosmos container {database}/{container}")
+        return self._containers[key]
+
+    async def get_database(self, endpoint: str, database: str) -> DatabaseProxy:
+        """Get a database proxy on the shared client of an endpoint."""
+        async with self._lock:
+            client = await self._get_client(endpoint)
+        return client.get_database_client(database)
+
+    async def _get_client(self, endpoint: str) -> CosmosClient:
+        """Get or create the client for an endpoint. Must be called with the lock held."""
+        client = self._clients.get(endpoint)
+        if client is None:
+            credential = await get_azure_credential_async()
+            # The ThrottlingPolicy owns 429 retries, so the SDK must not retry them as well
+            connection_policy = ConnectionPolicy()
+            connection_policy.RetryOptions = RetryOptions(max_retry_attempt_count=0)
+            client = CosmosClient(
+                endpoint, credential=credential, connection_policy=connection_policy
+            )
+            self._credentials[endpoint] = credential
+            self._clients[endpoint] = client
+        return client
+
+    async def warm_up(
+        self, endpoint: Optional[str], database: Optional[str], container: Optional[str]
+    ) -> bool:
+        """Open the connection pool and resolve the container ahead of the first request.
+
+        Also warns when the indexing policy or the partition key of the container differ
+        from the expected ones.
+
+        Returns:
+            True if the container is ready, False if warm up failed or is not configured
+        """
+        if not (endpoint and database and container):
+            logging.warning("CosmosDB is not configured. Skipping connection warm up")
+            return False
+
+        try:
+            container_proxy = await self.get_container(endpoint, database, container)
+        except Exception as e:
+            logging.error(f"Failed to warm up CosmosDB connection: {e}")
+            return False
+
+        try:
+            properties = await container_proxy.read()
+        except Exception as e:
+            logging.warning(f"Could not verify the indexing policy of {database}/{container}: {e}")
+            return True
+        paths = properties.get("partitionKey", {}).get("paths", [])
+        if paths != partition_layout.paths:
+            logging.error(
+                f"{database}/{container} is partitioned on {paths}, but the {partition_layout.name} "
+                f"partition layout expects {partition_layout.paths}, see `python -m maintenance.partition_migration`"
+            )
+        differences = compare_indexing_policy(properties.get("indexingPolicy", {}))
+        if differences:
+            logging.warning(
+                f"Indexing policy of {database}/{container} is out of date, run "
+                f"`python -m maintenance.indexing_policy migrate`: {'; '.join(differences)}"
+            )
+        return True
+
+    async def close(self) -> None:
+        """Close every client and credential held by the registry."""
+        async with self._lock:
+            for endpoint, client in self._clients.items():
+                try:
+                    await client.close()
+                except Exception as e:
+                    logging.warning(f"Error closing CosmosClient for {endpoint}: {e}")
+
+            for endpoint, credential in self._credentials.items():
+                close = getattr(credential, "close", None)
+                if close is None:
+                    continue
+                try:
+                    await close()
+                except Exception as e:
+                    logging.warning(f"Error closing credential for {endpoint}: {e}")
+
+            self._containers.clear()
+            self._container_flights.clear()
+            self._clients.clear()
+            self._credentials.clear()
+
+
+# Create a global instance of the registry shared by all memory contexts
+cosmos_registry = CosmosClientRegistry()
@@ -5,19 +5,55 @@ import logging
 import uuid
 import json
 import datetime
-from typing import Any, Dict, List, Optional, Type, Tuple
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Type, Tuple
 import numpy as np
 
-from azure.cosmos.partition_key import PartitionKey
-from azure.cosmos.aio import CosmosClient
-from helpers.azure_credential_utils import get_azure_credential
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosResourceNotFoundError,
+)
 from semantic_kernel.memory.memory_record import MemoryRecord
 from semantic_kernel.memory.memory_store_base import MemoryStoreBase
 from semantic_kernel.contents import ChatMessageContent, ChatHistory, AuthorRole
 
 # Import the AppConfig instance
 from app_config import config
-from models.messages_kernel import BaseDataModel, Plan, Session, Step, AgentMessage
+from context.bulk_delete import BulkDeleteJob, bulk_delete_engine
+from context.change_feed import (
+    LATEST_MESSAGES_VIEW,
+    PLAN_LIST_VIEW,
+    VIEW_DATA_TYPES,
+    reset_user_views,
+    view_id,
+    view_partition_key,
+)
+from context.cosmos_client_registry import cosmos_registry
+from context.document_codec import (
+    document_decoder,
+    encode_document,
+    set_operations,
+    strip_system_fields,
+)
+from context.embedding_codec import decode_embedding, encode_embedding
+from context.embedding_matrix import EmbeddingMatrix, embedding_matrix_cache
+from context.hedging import hedge_policy
+from context.large_text import MissingBlobError, large_text_store
+from context.pagination import decode_cursor, encode_cursor, query_scope
+from context.partitioning import PartitionKeyValue, partition_layout
+from context.plan_cache import plan_cache
+from context.single_flight import SingleFlight
+from context.vector_index import VectorIndex, vector_index_registry
+from context.write_behind import write_behind_queue
+from models.messages_kernel import (
+    BaseDataModel,
+    Plan,
+    Session,
+    Step,
+    StepStatus,
+    AgentMessage,
+)
 
 
 # Add custom JSON encoder class for datetime objects
@@ -41,6 +77,36 @@ class CosmosMemoryContext(MemoryStoreBase):
         # Messages are handled separately
     }
 
+    # Maximum number of operations Cosmos DB accepts in one transactional batch
+    TRANSACTIONAL_BATCH_LIMIT = 100
+
+    # Keys looked up by one get_batch query
+    GET_BATCH_QUERY_SIZE = 100
+
+    # Attempts at a conditional plan or step write before giving up on a contended document
+    CONDITIONAL_WRITE_ATTEMPTS = 3
+
+    # Plan fields maintained by step writes rather than by plan updates
+    STEP_COUNT_FIELDS = (
+        "total_steps",
+        *(status.value for status in StepStatus),
+        "counters_version",
+    )
+
+    # Plan fields returned when listing plans, steps and long texts are left out
+    PLAN_SUMMARY_FIELDS = (
+        "id",
+        "data_type",
+        "session_id",
+        "user_id",
+        "initial_goal",
+        "overall_status",
+        "source",
+        "timestamp",
+        "_ts",
+        *STEP_COUNT_FIELDS,
+    )
+
     def __init__(
         self,
         session_id: str,
@@ -50,6 +116,8 @@ class CosmosMemoryContext(MemoryStoreBase):
         cosmos_database: str = None,
         buffer_size: int = 100,
         initial_messages: Optional[List[ChatMessageContent]] = None,
+        write_behind: Optional[bool] = None,
+        batch_concurrency: Optional[int] = None,
     ) -> None:
         self._buffer_size = buffer_size
         self._messages = initial_messages or []
@@ -58,135 +126,574 @@ class CosmosMemoryContext(MemoryStoreBase):
         self._cosmos_container = cosmos_container or config.COSMOSDB_CONTAINER
         self._cosmos_endpoint = cosmos_endpoint or config.COSMOSDB_ENDPOINT
         self._cosmos_database = cosmos_database or config.COSMOSDB_DATABASE
+        # Queue agent message inserts instead of awaiting them inline
+        self._write_behind = (
+            config.COSMOSDB_WRITE_BEHIND if write_behind is None else write_behind
+        )
+        # Cap on the batches of one bulk call sent concurrently
+        self._batch_concurrency = batch_concurrency or config.COSMOSDB_BATCH_CONCURRENCY
+        self._plan_cache = plan_cache
+        self._embedding_matrices = embedding_matrix_cache
+        self._vector_indexes = vector_index_registry
+        self._partition_layout = partition_layout
+        self._decoder = document_decoder
+        self._large_text = large_text_store
+        self._hedging = hedge_policy
 
-        self._database = None
         self._container = None
         self.session_id = session_id
         self.user_id = user_id
-        self._initialized = asyncio.Event()
-        # Skip auto-initialize in constructor to avoid requiring a running event loop
-        self._initialized.set()
+        # Initialized lazily on first use, which does not require a running event loop here
+        self._initialization = SingleFlight(f"memory context of session {session_id}")
 
     async def initialize(self):
-        """Initialize the memory context using CosmosDB."""
-        try:
-            if not self._database:
-                # Create Cosmos client
-                cosmos_client = CosmosClient(
-                    self._cosmos_endpoint, credential=get_azure_credential()
-                )
-                self._database = cosmos_client.get_database_client(
-                    self._cosmos_database
-                )
+        """Initialize the memory context using CosmosDB.
 
-            # Set up CosmosDB container
-            self._container = await self._database.create_container_if_not_exists(
-                id=self._cosmos_container,
-                partition_key=PartitionKey(path="/session_id"),
-            )
-        except Exception as e:
-            logging.error(
-                f"Failed to initialize CosmosDB container: {e}. Continuing without CosmosDB for testing."
-            )
-            # Do not raise to prevent test failures
-            self._container = None
-
-        self._initialized.set()
+        Raises:
+            Exception: If the shared container can not be created
+        """
+        # Borrow the process-wide container instead of creating a client per request
+        self._container = await cosmos_registry.get_container(
+            self._cosmos_endpoint, self._cosmos_database, self._cosmos_container
+        )
 
     # Helper method for awaiting initialization
     async def ensure_initialized(self):
-        """Ensure that the container is initialized."""
-        if not self._initialized.is_set():
-            # If the initialization hasn't been done, do it now
-            await self.initialize()
+        """Ensure that the container is initialized.
 
-        # If after initialization the container is still None, that means initialization failed
-        if self._container is None:
-            # Re-attempt initialization once in case the previous attempt failed
-            try:
-                await self.initialize()
-            except Exception as e:
-                logging.error(f"Re-initialization attempt failed: {e}")
+        Concurrent callers share a single call to initialize. After a failed call every
+        caller fails fast until the retry delay of SingleFlight has passed, instead of
+        each of them opening a connection of its own.
 
-            # If still not initialized, raise error
-            if self._container is None:
-                raise RuntimeError(
-                    "CosmosDB container is not available. Initialization failed."
-                )
+        Raises:
+            RuntimeError: If the container is not available
+        """
+        if self._container is not None:
+            return
+        try:
+            await self._initialization.run(self.initialize)
+        except Exception as e:
+            raise RuntimeError(
+                "CosmosDB container is not available. Initialization failed."
+            ) from e
+
+    async def _to_document(self, item: BaseDataModel) -> Dict[str, Any]:
+        """Convert a data model to a Cosmos DB document, see encode_document.
+
+        Long texts are replaced by references to the large text store when it is enabled.
+        """
+        return await self._large_text.offload(encode_document(item))
+
+    async def _decode(self, document: Dict[str, Any], model_class: Type[BaseDataModel]) -> BaseDataModel:
+        """Build a model from a document, loading its offloaded texts in worker threads."""
+        model = self._decoder.decode(document, model_class)
+        await self._large_text.resolve((model,))
+        return model
+
+    async def _decode_many(
+        self, documents: List[Dict[str, Any]], model_class: Type[BaseDataModel]
+    ) -> List[BaseDataModel]:
+        """Build models from documents, loading their offloaded texts in worker threads."""
+        models = self._decoder.decode_many(documents, model_class)
+        await self._large_text.resolve(models)
+        return models
 
     async def add_item(self, item: BaseDataModel) -> None:
         """Add a data model item to Cosmos DB."""
         await self.ensure_initialized()
 
         try:
-            # Convert the model to a dict
-            document = item.model_dump()
+            document = await self._to_document(item)
 
-            # Handle datetime objects by converting them to ISO format strings
-            for key, value in list(document.items()):
-                if isinstance(value, datetime.datetime):
-                    document[key] = value.isoformat()
+            if self._write_behind and isinstance(item, AgentMessage):
+                # Agent messages are not read back on the request path, so write them later
+                await write_behind_queue.enqueue(
+                    self._container, document["session_id"], document
+                )
+                return
 
             # Now create the item with the serialized datetime values
             await self._container.create_item(body=document)
             logging.info(f"Item added to Cosmos DB - {document['id']}")
+
+            if isinstance(item, (Plan, Step)):
+                self._plan_cache.invalidate(item.user_id, item.session_id)
         except Exception as e:
             logging.exception(f"Failed to add item to Cosmos DB: {e}")
             raise  # Propagate the error instead of silently failing
 
-    async def update_item(self, item: BaseDataModel) -> None:
-        """Update an existing item in Cosmos DB."""
+    async def add_items_batch(self, items: List[BaseDataModel]) -> None:
+        """Add several data model items using Cosmos DB transactional batches.
+
+        Items are grouped by their session_id partition key and each group is written in
+        batches of at most TRANSACTIONAL_BATCH_LIMIT operations. Each batch is atomic; a
+        group larger than the limit is written as several consecutive batches.
+
+        Args:
+            items: The items to add
+        """
         await self.ensure_initialized()
 
+        batches: Dict[str, List[Tuple[str, Tuple[Any, ...]]]] = {}
+        for item in items:
+            document = await self._to_document(item)
+            partition_key = document.get("session_id", self.session_id)
+            batches.setdefault(partition_key, []).append(("create", (document,)))
+
         try:
-            # Convert the model to a dict
-            document = item.model_dump()
+            await self._execute_batches(batches)
+            logging.info(f"{len(items)} items added to Cosmos DB in batch")
+
+            for item in items:
+                if isinstance(item, (Plan, Step)):
+                    self._plan_cache.invalidate(item.user_id, item.session_id)
+        except Exception as e:
+            logging.exception(f"Failed to add items to Cosmos DB in batch: {e}")
+            raise  # Propagate the error instead of silently failing
+
+    async def _execute_batches(
+        self, batches: Dict[str, List[Tuple[Any, ...]]]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Run batch operations grouped by session as transactional batches.
+
+        Each partition's operations are split into batches of at most
+        TRANSACTIONAL_BATCH_LIMIT operations, and up to batch_concurrency batches are
+        in flight at once.
+
+        Args:
+            batches: The operations of each of the current user's sessions, by session_id
+
+        Returns:
+            The operation results of each session, in operation order
+
+        Raises:
+            CosmosBatchOperationError: If an operation failed, its batch was rolled back
+        """
+        semaphore = asyncio.Semaphore(self._batch_concurrency)
 
-            # Handle datetime objects by converting them to ISO format strings
-            for key, value in list(document.items()):
-                if isinstance(value, datetime.datetime):
-                    document[key] = value.isoformat()
+        async def execute(session_id: str, chunk: List[Tuple[Any, ...]]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._container.execute_item_batch(
+                    batch_operations=chunk, partition_key=self._partition_key(session_id)
+                )
+
+        chunks = [
+            (session_id, operations[start:start + self.TRANSACTIONAL_BATCH_LIMIT])
+            for session_id, operations in batches.items()
+            for start in range(0, len(operations), self.TRANSACTIONAL_BATCH_LIMIT)
+        ]
+        chunk_results = await asyncio.gather(
+            *[execute(session_id, chunk) for session_id, chunk in chunks]
+        )
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        for (session_id, _), chunk_result in zip(chunks, chunk_results):
+            results.setdefault(session_id, []).extend(chunk_result)
+        return results
+
+    async def update_item(
+        self, item: BaseDataModel, etag: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Update an existing item in Cosmos DB.
+
+        Args:
+            item: The item to upsert
+            etag: Optional etag the stored document must still have
+
+        Returns:
+            The stored document as returned by Cosmos DB
+
+        Raises:
+            CosmosAccessConditionFailedError: If etag is given and the stored document has changed
+        """
+        await self.ensure_initialized()
+
+        try:
+            document = await self._to_document(item)
 
             # Now upsert the item with the serialized datetime values
-            await self._container.upsert_item(body=document)
+            if etag:
+                return await self._container.upsert_item(
+                    body=document,
+                    etag=etag,
+                    match_condition=MatchConditions.IfNotModified,
+                )
+            return await self._container.upsert_item(body=document)
+        except CosmosAccessConditionFailedError:
+            raise
         except Exception as e:
             logging.exception(f"Failed to update item in Cosmos DB: {e}")
             raise  # Propagate the error instead of silently failing
 
+    async def _get_with_etag(
+        self, item: BaseDataModel
+    ) -> Tuple[Optional[BaseDataModel], Optional[str]]:
+        """Get the stored version of a plan or step and its etag, from the plan cache if possible.
+
+        Args:
+            item: The plan or step about to be written
+
+        Returns:
+            The stored model and its etag, or (None, None) if it does not exist yet
+        """
+        model_class = Plan if isinstance(item, Plan) else Step
+        return await self._get_stored(model_class, item.id, item.session_id, item.user_id)
+
+    async def _get_stored(
+        self, model_class: Type[BaseDataModel], item_id: str, session_id: str, user_id: str
+    ) -> Tuple[Optional[BaseDataModel], Optional[str]]:
+        """Get a stored plan or step by its ID and its etag, from the plan cache if possible.
+
+        Args:
+            model_class: Plan or Step
+            item_id: The ID of the plan or step
+            session_id: The session of the plan or step
+            user_id: The user of the plan or step
+
+        Returns:
+            The stored model and its etag, or (None, None) if it does not exist
+        """
+        if model_class is Plan:
+            cached = self._plan_cache.get_plan(user_id, session_id)
+            if cached is not None and cached.id != item_id:
+                cached = None
+        else:
+            cached = self._plan_cache.get_step(user_id, session_id, item_id)
+        etag = self._plan_cache.get_etag(user_id, session_id, item_id)
+        if cached is not None and etag is not None:
+            return cached, etag
+
+        await self.ensure_initialized()
+        try:
+            document = await self._container.read_item(
+                item=item_id, partition_key=self._partition_key(session_id, user_id)
+            )
+        except CosmosResourceNotFoundError:
+            return None, None
+        return await self._decode(document, model_class), document.get("_etag")
+
+    @staticmethod
+    def _step_count_patch(
+        old_status: Optional[StepStatus], new_status: StepStatus
+    ) -> List[Dict[str, Any]]:
+        """Build the patch operations that move a step between the counters of its plan.
+
+        Args:
+            old_status: The previous status of the step, None for a new step
+            new_status: The status the step is written with
+
+        Returns:
+            Cosmos DB patch operations for the plan document
+        """
+        if old_status is None:
+            operations = [{"op": "incr", "path": "/total_steps", "value": 1}]
+        else:
+            operations = [
+                {"op": "incr", "path": f"/{StepStatus(old_status).value}", "value": -1}
+            ]
+        operations.append(
+            {"op": "incr", "path": f"/{StepStatus(new_status).value}", "value": 1}
+        )
+        return operations
+
+    @staticmethod
+    def _match_kwargs(etag: Optional[str]) -> Dict[str, Any]:
+        """Build the arguments that make a single document write conditional on an etag."""
+        if not etag:
+            return {}
+        return {"etag": etag, "match_condition": MatchConditions.IfNotModified}
+
+    @staticmethod
+    def _is_precondition_failure(error: CosmosBatchOperationError) -> bool:
+        """Check whether a batch failed because another writer got there first.
+
+        That is an etag condition that did not match, or a create of an ID that was
+        stored in the meantime.
+        """
+        responses = error.operation_responses or []
+        if error.error_index is not None and error.error_index < len(responses):
+            return responses[error.error_index].get("statusCode") in (409, 412)
+        return error.status_code in (409, 412)
+
     async def get_item_by_id(
-        self, item_id: str, partition_key: str, model_class: Type[BaseDataModel]
+        self,
+        item_id: str,
+        partition_key: str,
+        model_class: Type[BaseDataModel],
+        hedge: Optional[str] = None,
     ) -> Optional[BaseDataModel]:
-        """Retrieve an item by its ID and partition key."""
+        """Retrieve an item of the current user by its ID and session_id partition key.
+
+        Args:
+            item_id: The ID of the item
+            partition_key: The session of the item
+            model_class: The model to validate the document into
+            hedge: Name of the read for the hedge policy, None to never hedge it
+        """
         await self.ensure_initialized()
 
         try:
-            item = await self._container.read_item(
-                item=item_id, partition_key=partition_key
+            item = await self._hedged(
+                hedge,
+                lambda: self._container.read_item(
+                    item=item_id, partition_key=self._partition_key(partition_key)
+                ),
             )
-            return model_class.model_validate(item)
+            return await self._decode(item, model_class)
+        except MissingBlobError:
+            raise
         except Exception as e:
             logging.exception(f"Failed to retrieve item from Cosmos DB: {e}")
             return None
 
+    def _partition_key(
+        self, session_id: Optional[str] = None, user_id: Optional[str] = None
+    ) -> Optional[PartitionKeyValue]:
+        """Get the narrowest partition key of a user's documents.
+
+        Args:
+            session_id: The session of the documents, None if it is not known
+            user_id: The user of the documents, the current user by default
+
+        Returns:
+            The partition key of the session; without a session, the user's prefix of
+            hierarchical partition keys, or None to query every partition
+        """
+        user_id = user_id or self.user_id
+        if session_id is None:
+            return self._partition_layout.user_prefix(user_id)
+        return self._partition_layout.key(user_id, session_id)
+
+    @staticmethod
+    def _partition_kwargs(partition_key: Optional[PartitionKeyValue]) -> Dict[str, Any]:
+        """Build the query_items arguments that scope a query to one partition.
+
+        Without a partition key Cosmos DB fans the query out across every partition.
+        """
+        if partition_key is None:
+            return {}
+        return {"partition_key": partition_key}
+
+    def _hedged(
+        self, hedge: Optional[str], read: Callable[[], Awaitable[Any]]
+    ) -> Awaitable[Any]:
+        """Run a read through the hedge policy, or directly when it is not hedged."""
+        if hedge is None:
+            return read()
+        return self._hedging.run(hedge, read)
+
+    @staticmethod
+    async def _collect(items: AsyncIterator[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Read every document of a query."""
+        return [item async for item in items]
+
+    async def _query_items_with_etags(
+        self,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        model_class: Type[BaseDataModel],
+        partition_key: Optional[PartitionKeyValue] = None,
+        hedge: Optional[str] = None,
+    ) -> List[Tuple[BaseDataModel, Optional[str]]]:
+        """Query items from Cosmos DB and keep the _etag of each document for the plan cache."""
+        await self.ensure_initialized()
+
+        try:
+            documents = await self._hedged(
+                hedge,
+                lambda: self._collect(
+                    self._container.query_items(
+                        query=query, parameters=parameters, **self._partition_kwargs(partition_key)
+                    )
+                ),
+            )
+            for document in documents:
+                document["ts"] = document["_ts"]
+            models = await self._decode_many(documents, model_class)
+            return [(model, document.get("_etag")) for model, document in zip(models, documents)]
+        except MissingBlobError:
+            raise
+        except Exception as e:
+            logging.exception(f"Failed to query items from Cosmos DB: {e}")
+            return []
+
     async def query_items(
         self,
         query: str,
         parameters: List[Dict[str, Any]],
         model_class: Type[BaseDataModel],
+        partition_key: Optional[PartitionKeyValue] = None,
+        hedge: Optional[str] = None,
     ) -> List[BaseDataModel]:
-        """Query items from Cosmos DB and return a list of model instances."""
+        """Query items from Cosmos DB and return a list of model instances.
+
+        Args:
+            query: The Cosmos DB SQL query
+            parameters: The query parameters
+            model_class: The model to validate each document into
+            partition_key: Optional partition key to scope the query to a single partition
+            hedge: Name of the query for the hedge policy, None to never hedge it
+
+        Returns:
+            List of model instances
+        """
         await self.ensure_initialized()
 
         try:
-            items = self._container.query_items(query=query, parameters=parameters)
-            result_list = []
+            documents = await self._hedged(
+                hedge,
+                lambda: self._collect(
+                    self._container.query_items(
+                        query=query, parameters=parameters, **self._partition_kwargs(partition_key)
+                    )
+                ),
+            )
+            for document in documents:
+                document["ts"] = document["_ts"]
+            # One validation call for the whole result instead of one per document
+            return await self._decode_many(documents, model_class)
+        except MissingBlobError:
+            raise
+        except Exception as e:
+            logging.exception(f"Failed to query items from Cosmos DB: {e}")
+            return []
+
+    async def iter_items(
+        self,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        model_class: Type[BaseDataModel],
+        partition_key: Optional[PartitionKeyValue] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[BaseDataModel]:
+        """Stream items from Cosmos DB as model instances.
+
+        Documents are fetched a page at a time and validated as they are consumed, so
+        only the current page is held in memory whatever the size of the result set.
+
+        Args:
+            query: The Cosmos DB SQL query
+            parameters: The query parameters
+            model_class: The model to validate each document into
+            partition_key: Optional partition key to scope the query to a single partition
+            page_size: Optional number of documents fetched per round trip
+
+        Yields:
+            Model instances in query order
+
+        Raises:
+            Exception: Query errors are logged and re-raised, ending the stream
+        """
+        await self.ensure_initialized()
+
+        try:
+            items = self._container.query_items(
+                query=query,
+                parameters=parameters,
+                max_item_count=page_size,
+                **self._partition_kwargs(partition_key),
+            )
             async for item in items:
                 item["ts"] = item["_ts"]
-                result_list.append(model_class.model_validate(item))
-            return result_list
+                yield await self._decode(item, model_class)
         except Exception as e:
             logging.exception(f"Failed to query items from Cosmos DB: {e}")
-            return []
+            raise
+
+    async def query_page(
+        self,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        model_class: Optional[Type[BaseDataModel]],
+        page_size: Optional[int] = None,
+        cursor: Optional[str] = None,
+        partition_key: Optional[PartitionKeyValue] = None,
+    ) -> Tuple[List[Any], Optional[str]]:
+        """Query one page of items, resuming from a Cosmos DB continuation token.
+
+        Args:
+            query: The Cosmos DB SQL query
+            parameters: The query parameters
+            model_class: The model to validate each document into, None for raw documents
+            page_size: Maximum number of items in the page, None to read every page
+            cursor: The opaque cursor returned with the previous page, None for the first page
+            partition_key: Optional partition key to scope the query to a single partition
+
+        Returns:
+            The items of the page and the cursor of the next page, None after the last page
+
+        Raises:
+            InvalidCursorError: If the cursor is malformed or was issued for another query
+            Exception: Query errors, a document referencing a text missing from the large
+                text store among them, are logged and re-raised
+        """
+        await self.ensure_initialized()
+
+        # Continuation tokens and _ts order do not carry over to a migrated container
+        scope = query_scope(query, parameters, self._cosmos_container)
+        state = decode_cursor(cursor, scope)
+
+        async def convert(documents: List[Dict[str, Any]]) -> List[Any]:
+            if model_class is None:
+                return [
+                    await self._large_text.hydrate(strip_system_fields(document))
+                    for document in documents
+                ]
+            for document in documents:
+                document["ts"] = document["_ts"]
+            return await self._decode_many(documents, model_class)
+
+        try:
+            items = self._container.query_items(
+                query=query,
+                parameters=parameters,
+                max_item_count=page_size,
+                **self._partition_kwargs(partition_key),
+            )
+            if page_size is None:
+                return await convert([item async for item in items]), None
+
+            pages = items.by_page(continuation_token=state["token"] if state else None)
+            result_list = []
+            async for page in pages:
+                result_list = await convert([item async for item in page])
+                break
+            token = pages.continuation_token
+        except Exception as e:
+            # An empty page would end the client's listing early without an error
+            logging.exception(f"Failed to query page from Cosmos DB: {e}")
+            raise
+
+        next_cursor = encode_cursor({"token": token}, scope) if token else None
+        return result_list, next_cursor
+
+    @staticmethod
+    def _since_clause(since_ts: Optional[int], parameters: List[Dict[str, Any]]) -> str:
+        """Build the filter that restricts a query to documents changed after since_ts."""
+        if since_ts is None:
+            return ""
+        parameters.append({"name": "@since_ts", "value": since_ts})
+        return " AND c._ts > @since_ts"
+
+    async def _merge_pending_writes(
+        self,
+        results: List[BaseDataModel],
+        session_id: str,
+        data_type: str,
+        model_class: Type[BaseDataModel],
+        user_id: Optional[str] = None,
+    ) -> List[BaseDataModel]:
+        """Append queued write-behind documents that are not visible to queries yet."""
+        if not self._write_behind:
+            return results
+
+        seen = {item.id for item in results}
+        for document in write_behind_queue.get_pending(session_id):
+            if document.get("data_type") != data_type or document["id"] in seen:
+                continue
+            if user_id is not None and document.get("user_id") != user_id:
+                continue
+            results.append(await self._decode(document, model_class))
+        return results
 
     async def add_session(self, session: Session) -> None:
         """Add a session to Cosmos DB."""
@@ -199,101 +706,593 @@ class CosmosMemoryContext(MemoryStoreBase):
             {"name": "@id", "value": session_id},
             {"name": "@data_type", "value": "session"},
         ]
-        sessions = await self.query_items(query, parameters, Session)
+        sessions = await self.query_items(query, parameters, Session, hedge="get_session")
         return sessions[0] if sessions else None
 
     async def get_all_sessions(self) -> List[Session]:
-        """Retrieve all sessions."""
-        query = "SELECT * FROM c WHERE c.data_type=@data_type"
+        """Retrieve all sessions of the current user."""
+        query = "SELECT * FROM c WHERE c.user_id=@user_id AND c.data_type=@data_type"
         parameters = [
             {"name": "@data_type", "value": "session"},
+            {"name": "@user_id", "value": self.user_id},
         ]
-        sessions = await self.query_items(query, parameters, Session)
+        sessions = await self.query_items(
+            query, parameters, Session, partition_key=self._partition_key()
+        )
         return sessions
 
     async def add_plan(self, plan: Plan) -> None:
-        """Add a plan to Cosmos DB."""
+        """Add a plan to Cosmos DB, its step counters are then maintained by the step writes."""
+        plan.counters_version = Plan.COUNTERS_VERSION
         await self.add_item(plan)
 
+    async def recount_plan_steps(self, plan: Plan) -> Plan:
+        """Count the steps of a plan stored before step counters and persist the counts.
+
+        The counters are patched conditionally on the etag of the stored plan. Every
+        step write also patches the plan, so a conflict means the steps changed while
+        they were counted; the counts are then only returned, and the next listing of
+        the plan counts again.
+
+        Args:
+            plan: The plan, with counters_version below Plan.COUNTERS_VERSION
+
+        Returns:
+            The plan with its step counters set
+        """
+        _, etag = await self._get_stored(Plan, plan.id, plan.session_id, plan.user_id)
+        steps = await self.get_steps_by_plan(plan_id=plan.id, session_id=plan.session_id)
+        plan.set_step_counts(steps)
+        if etag is None:
+            return plan
+
+        operations = set_operations(
+            **{field: getattr(plan, field) for field in self.STEP_COUNT_FIELDS}
+        )
+        try:
+            await self.patch_plan(plan.id, plan.session_id, operations, etag=etag)
+        except CosmosAccessConditionFailedError:
+            logging.info(f"Plan {plan.id} changed while counting its steps, not storing the counts")
+        return plan
+
     async def update_plan(self, plan: Plan) -> None:
-        """Update an existing plan in Cosmos DB."""
-        await self.update_item(plan)
+        """Update an existing plan in Cosmos DB.
+
+        The step counters of a plan are maintained by the step writes, so the stored
+        counters are kept instead of the ones on the caller's possibly older copy. The
+        write is conditional on the etag the counters were read with.
+        """
+        await self.ensure_initialized()
+
+        for _ in range(self.CONDITIONAL_WRITE_ATTEMPTS):
+            stored, etag = await self._get_with_etag(plan)
+            if stored is not None:
+                for field in self.STEP_COUNT_FIELDS:
+                    setattr(plan, field, getattr(stored, field))
+            try:
+                document = await self.update_item(plan, etag=etag)
+            except CosmosAccessConditionFailedError as e:
+                logging.info(f"Plan {plan.id} changed while updating, retrying")
+                self._plan_cache.invalidate(plan.user_id, plan.session_id)
+                last_error = e
+                continue
+
+            new_etag = document.get("_etag") if isinstance(document, dict) else None
+            self._plan_cache.put_plan(plan.user_id, plan, new_etag)
+            return
+
+        logging.error(f"Giving up updating plan {plan.id} after repeated conflicts")
+        raise last_error
+
+    async def patch_plan(
+        self,
+        plan_id: str,
+        session_id: str,
+        operations: List[Dict[str, Any]],
+        etag: Optional[str] = None,
+    ) -> Optional[Plan]:
+        """Apply partial document updates to a plan of the current user.
+
+        Only the patched fields are sent, instead of the whole plan document, and the
+        fields the operations leave alone keep their stored values. The step counters
+        are maintained by the step writes and should not be patched here.
+
+        Args:
+            plan_id: The ID of the plan
+            session_id: The session of the plan
+            operations: Cosmos DB patch operations, see set_operations
+            etag: Optional etag the stored plan must still have
+
+        Returns:
+            The patched plan, or None if it does not exist
+
+        Raises:
+            CosmosAccessConditionFailedError: If etag is given and the stored plan has changed
+        """
+        await self.ensure_initialized()
+        operations = await self._large_text.offload_operations(operations)
+
+        try:
+            document = await self._container.patch_item(
+                item=plan_id,
+                partition_key=self._partition_key(session_id),
+                patch_operations=operations,
+                **self._match_kwargs(etag),
+            )
+        except CosmosResourceNotFoundError:
+            return None
+        except CosmosAccessConditionFailedError:
+            self._plan_cache.invalidate(self.user_id, session_id)
+            raise
+        except Exception as e:
+            logging.exception(f"Failed to patch plan {plan_id} in Cosmos DB: {e}")
+            raise
+
+        plan = await self._decode(document, Plan)
+        self._plan_cache.put_plan(self.user_id, plan, document.get("_etag"))
+        return plan
 
     async def get_plan_by_session(self, session_id: str) -> Optional[Plan]:
         """Retrieve a plan associated with a session."""
+        cached = self._plan_cache.get_plan(self.user_id, session_id)
+        if cached is not None:
+            return cached
+
         query = "SELECT * FROM c WHERE c.session_id=@session_id AND c.user_id=@user_id AND c.data_type=@data_type"
         parameters = [
             {"name": "@session_id", "value": session_id},
             {"name": "@data_type", "value": "plan"},
             {"name": "@user_id", "value": self.user_id},
         ]
-        plans = await self.query_items(query, parameters, Plan)
-        return plans[0] if plans else None
+        plans = await self._query_items_with_etags(
+            query,
+            parameters,
+            Plan,
+            partition_key=self._partition_key(session_id),
+            hedge="get_plan_by_session",
+        )
+        if not plans:
+            return None
+        plan, etag = plans[0]
+        self._plan_cache.put_plan(self.user_id, plan, etag)
+        return plan
 
     async def get_plan_by_plan_id(self, plan_id: str) -> Optional[Plan]:
-        """Retrieve a plan associated with a session."""
+        """Retrieve a plan by its ID.
+
+        When the session of the plan is known this is a point read, otherwise a
+        cross-partition query whose result is remembered for later lookups.
+        """
+        session_id = self._plan_cache.get_plan_session(self.user_id, plan_id)
+        if session_id is not None:
+            cached = self._plan_cache.get_plan(self.user_id, session_id)
+            if cached is not None and cached.id == plan_id:
+                return cached
+            plan = await self.get_item_by_id(plan_id, partition_key=session_id, model_class=Plan)
+            if plan is not None and plan.user_id == self.user_id:
+                return plan
+            return None
+
         query = "SELECT * FROM c WHERE c.id=@id AND c.user_id=@user_id AND c.data_type=@data_type"
         parameters = [
             {"name": "@id", "value": plan_id},
             {"name": "@data_type", "value": "plan"},
             {"name": "@user_id", "value": self.user_id},
         ]
-        plans = await self.query_items(query, parameters, Plan)
-        return plans[0] if plans else None
+        plans = await self.query_items(
+            query, parameters, Plan, partition_key=self._partition_key()
+        )
+        if not plans:
+            return None
+        self._plan_cache.remember_plan_session(self.user_id, plan_id, plans[0].session_id)
+        return plans[0]
+
+    async def get_thread_by_session(self, session_id: str) -> Optional[Any]:
+        """Retrieve a plan associated with a session."""
+        query = "SELECT * FROM c WHERE c.session_id=@session_id AND c.user_id=@user_id AND c.data_type=@data_type"
+        parameters = [
+            {"name": "@session_id", "value": session_id},
+            {"name": "@data_type", "value": "thread"},
+            {"name": "@user_id", "value": self.user_id},
+        ]
+        threads = await self.query_items(
+            query, parameters, Plan, partition_key=self._partition_key(session_id)
+        )
+        return threads[0] if threads else None
+
+    async def get_plan(self, plan_id: str) -> Optional[Plan]:
+        """Retrieve a plan by its ID.
+
+        Args:
+            plan_id: The ID of the plan to retrieve
+
+        Returns:
+            The Plan object or None if not found
+        """
+        # Use the session_id as the partition key since that's how we're partitioning our data
+        return await self.get_item_by_id(
+            plan_id, partition_key=self.session_id, model_class=Plan
+        )
+
+    async def get_all_plans(self) -> List[Plan]:
+        """Retrieve all plans."""
+        query = "SELECT * FROM c WHERE c.user_id=@user_id AND c.data_type=@data_type ORDER BY c._ts DESC"
+        parameters = [
+            {"name": "@data_type", "value": "plan"},
+            {"name": "@user_id", "value": self.user_id},
+        ]
+        plans = await self.query_items(
+            query, parameters, Plan, partition_key=self._partition_key()
+        )
+        return plans
+
+    async def get_plan_summaries(
+        self,
+        page_size: Optional[int] = None,
+        since_ts: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Plan], Optional[str]]:
+        """Retrieve plans, newest first, with only the fields needed to list them.
+
+        Args:
+            page_size: Maximum number of plans to return, None for all of them
+            since_ts: Only return plans changed after this Cosmos DB _ts
+            cursor: The cursor returned with the previous page
+
+        Returns:
+            Plan objects carrying identity, goal, status and step counters, and the
+            cursor of the next page
+        """
+        query, parameters = self._plan_summaries_query(since_ts)
+        return await self.query_page(
+            query, parameters, Plan, page_size, cursor, partition_key=self._partition_key()
+        )
+
+    def iter_plan_summaries(self, since_ts: Optional[int] = None) -> AsyncIterator[Plan]:
+        """Stream plans, newest first, with only the fields needed to list them.
+
+        Args:
+            since_ts: Only return plans changed after this Cosmos DB _ts
+
+        Returns:
+            An async iterator of Plan objects
+        """
+        query, parameters = self._plan_summaries_query(since_ts)
+        return self.iter_items(query, parameters, Plan, partition_key=self._partition_key())
+
+    def _plan_summaries_query(
+        self, since_ts: Optional[int]
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the projection query used to list the current user's plans."""
+        projection = ", ".join(f"c.{field}" for field in self.PLAN_SUMMARY_FIELDS)
+        parameters = [
+            {"name": "@data_type", "value": "plan"},
+            {"name": "@user_id", "value": self.user_id},
+        ]
+        query = (
+            f"SELECT {projection} FROM c WHERE c.user_id=@user_id AND c.data_type=@data_type"
+            f"{self._since_clause(since_ts, parameters)} ORDER BY c._ts DESC"
+        )
+        return query, parameters
+
+    async def get_plan_list_view(self) -> Optional[List[Plan]]:
+        """Read the current user's plan list view, newest plan first.
+
+        The view is one document per user maintained from the change feed, so this is a
+        point read instead of a query over the user's plans. It trails recent writes by
+        the change feed poll interval.
+
+        Returns:
+            Plan objects carrying the fields of get_plan_summaries, or None if the user has
+            no view or the view was truncated to its most recent plans
+        """
+        view = await self._read_view(PLAN_LIST_VIEW)
+        if view is None or view.get("truncated"):
+            return None
+        plans = sorted(view.get("plans", {}).values(), key=lambda p: p.get("_ts", 0), reverse=True)
+        return await self._decode_many(plans, Plan)
+
+    async def get_latest_messages_view(self) -> Optional[Dict[str, AgentMessage]]:
+        """Read the newest agent message of each of the current user's sessions.
+
+        Returns:
+            The latest message by session ID, or None if the user has no view
+        """
+        view = await self._read_view(LATEST_MESSAGES_VIEW)
+        if view is None:
+            return None
+        return {
+            session_id: await self._decode(message, AgentMessage)
+            for session_id, message in view.get("sessions", {}).items()
+        }
+
+    async def get_latest_agent_messages(self) -> Dict[str, AgentMessage]:
+        """Get the newest agent message of each of the current user's sessions.
+
+        Reads the latest messages view when change feed views are enabled, otherwise,
+        or until the view exists, queries every agent message of the user.
+
+        Returns:
+            The latest message by session ID
+        """
+        if config.COSMOSDB_CHANGE_FEED_VIEWS:
+            latest = await self.get_latest_messages_view()
+            if latest is not None:
+                return latest
+
+        query = "SELECT * FROM c WHERE c.user_id=@user_id AND c.data_type=@data_type ORDER BY c._ts ASC"
+        parameters = [
+            {"name": "@user_id", "value": self.user_id},
+            {"name": "@data_type", "value": "agent_message"},
+        ]
+        messages = await self.query_items(
+            query, parameters, AgentMessage, partition_key=self._partition_key()
+        )
+        return {message.session_id: message for message in messages}
+
+    async def _read_view(self, data_type: str) -> Optional[Dict[str, Any]]:
+        """Point read one of the current user's view documents."""
+        await self.ensure_initialized()
+        try:
+            return await self._container.read_item(
+                item=view_id(data_type, self.user_id),
+                partition_key=view_partition_key(data_type, self.user_id),
+            )
+        except CosmosResourceNotFoundError:
+            return None
+        except Exception as e:
+            logging.exception(f"Failed to read {data_type} from Cosmos DB: {e}")
+            return None
+
+    async def add_step(self, step: Step) -> None:
+        """Add a step to Cosmos DB and count it on its plan in the same transactional batch."""
+        await self.ensure_initialized()
+
+        try:
+            await self._container.execute_item_batch(
+                batch_operations=[
+                    ("create", (await self._to_document(step),)),
+                    ("patch", (step.plan_id, self._step_count_patch(None, step.status))),
+                ],
+                partition_key=self._partition_key(step.session_id, step.user_id),
+            )
+            logging.info(f"Step added to Cosmos DB - {step.id}")
+            self._plan_cache.invalidate(step.user_id, step.session_id)
+        except Exception as e:
+            logging.exception(f"Failed to add step to Cosmos DB: {e}")
+            raise
+
+    async def update_step(self, step: Step) -> None:
+        """Update an existing step in Cosmos DB.
+
+        When the status of the step changes, the step is written in one transactional batch
+        with a patch that moves it between the status counters of its plan. The batch is
+        conditional on the etag of the step it replaces, so a concurrent status change can
+        not be counted twice or lost. A step that is not stored yet is created and counted
+        on its plan the same way.
+        """
+        await self.ensure_initialized()
+
+        for _ in range(self.CONDITIONAL_WRITE_ATTEMPTS):
+            stored, etag = await self._get_with_etag(step)
+            if stored is not None and stored.status == step.status:
+                # The counters do not move, but the write must still not replace a
+                # status change made since the step was read
+                try:
+                    document = await self.update_item(step, etag=etag)
+                except CosmosAccessConditionFailedError as e:
+                    logging.info(f"Step {step.id} changed while updating, retrying")
+                    self._plan_cache.invalidate(step.user_id, step.session_id)
+                    last_error = e
+                    continue
+                new_etag = document.get("_etag") if isinstance(document, dict) else None
+                self._plan_cache.put_step(step.user_id, step, new_etag)
+                return
+
+            if stored is None:
+                # A step that is not stored yet is created and counted on its plan;
+                # the create conflicts if another writer stored it in the meantime
+                step_operation = ("create", (await self._to_document(step),))
+            else:
+                step_operation = ("upsert", (await self._to_document(step),), {"if_match_etag": etag})
+            try:
+                results = await self._container.execute_item_batch(
+                    batch_operations=[
+                        step_operation,
+                        (
+                            "patch",
+                            (
+                                step.plan_id,
+                                self._step_count_patch(
+                                    stored.status if stored is not None else None, step.status
+                                ),
+                            ),
+                        ),
+                    ],
+                    partition_key=self._partition_key(step.session_id, step.user_id),
+                )
+            except CosmosBatchOperationError as e:
+                if not self._is_precondition_failure(e):
+                    logging.exception(f"Failed to update step {step.id} in Cosmos DB: {e}")
+                    raise
+                logging.info(f"Step {step.id} changed while updating, retrying")
+                self._plan_cache.invalidate(step.user_id, step.session_id)
+                last_error = e
+                continue
+
+            step_result, plan_result = results[0], results[1]
+            self._plan_cache.put_step(step.user_id, step, step_result.get("eTag"))
+            if plan_result.get("resourceBody"):
+                self._plan_cache.put_plan(
+                    step.user_id,
+                    await self._decode(plan_result["resourceBody"], Plan),
+                    plan_result.get("eTag"),
+                )
+            return
+
+        logging.error(f"Giving up updating step {step.id} after repeated conflicts")
+        raise last_error
+
+    async def patch_step(
+        self,
+        step_id: str,
+        session_id: str,
+        operations: List[Dict[str, Any]],
+        etag: Optional[str] = None,
+    ) -> Optional[Step]:
+        """Apply partial document updates to a step of the current user.
+
+        Only the patched fields are sent, so a status change does not rewrite the agent
+        reply and feedback of the step. When the operations set the status, the patch is
+        conditional on the etag the old status was read with, and a status change runs
+        in one transactional batch with the patch that moves the step between the
+        counters of its plan. Conflicts are retried against the freshly read step, like
+        in update_step.
+
+        Args:
+            step_id: The ID of the step
+            session_id: The session of the step
+            operations: Cosmos DB patch operations, see set_operations
+            etag: Optional etag the stored step must still have; a conflict is then
+                raised instead of retried
+
+        Returns:
+            The patched step, or None if it does not exist
+
+        Raises:
+            CosmosAccessConditionFailedError: If etag is given and the stored step has changed
+        """
+        await self.ensure_initialized()
+        new_status = self._patched_status(operations)
+        operations = await self._large_text.offload_operations(operations)
+
+        for _ in range(self.CONDITIONAL_WRITE_ATTEMPTS):
+            stored, condition = None, etag
+            if new_status is not None:
+                stored, stored_etag = await self._get_stored(Step, step_id, session_id, self.user_id)
+                if stored is None:
+                    return None
+                condition = etag or stored_etag
+
+            try:
+                if stored is None or stored.status == new_status:
+                    document = await self._container.patch_item(
+                        item=step_id,
+                        partition_key=self._partition_key(session_id),
+                        patch_operations=operations,
+                        **self._match_kwargs(condition),
+                    )
+                else:
+                    document = await self._patch_step_status(stored, new_status, operations, condition)
+            except CosmosResourceNotFoundError:
+                return None
+            except CosmosAccessConditionFailedError as e:
+                self._plan_cache.invalidate(self.user_id, session_id)
+                if etag:
+                    raise
+                logging.info(f"Step {step_id} changed while patching, retrying")
+                last_error = e
+                continue
+            except Exception as e:
+                logging.exception(f"Failed to patch step {step_id} in Cosmos DB: {e}")
+                raise
 
-    async def get_thread_by_session(self, session_id: str) -> Optional[Any]:
-        """Retrieve a plan associated with a session."""
-        query = "SELECT * FROM c WHERE c.session_id=@session_id AND c.user_id=@user_id AND c.data_type=@data_type"
-        parameters = [
-            {"name": "@session_id", "value": session_id},
-            {"name": "@data_type", "value": "thread"},
-            {"name": "@user_id", "value": self.user_id},
-        ]
-        threads = await self.query_items(query, parameters, Plan)
-        return threads[0] if threads else None
+            step = await self._decode(document, Step)
+            self._plan_cache.put_step(self.user_id, step, document.get("_etag"))
+            return step
 
-    async def get_plan(self, plan_id: str) -> Optional[Plan]:
-        """Retrieve a plan by its ID.
+        logging.error(f"Giving up patching step {step_id} after repeated conflicts")
+        raise last_error
+
+    async def _patch_step_status(
+        self,
+        stored: Step,
+        new_status: StepStatus,
+        operations: List[Dict[str, Any]],
+        etag: Optional[str],
+    ) -> Dict[str, Any]:
+        """Patch a step and move it between the status counters of its plan in one batch.
 
         Args:
-            plan_id: The ID of the plan to retrieve
+            stored: The stored step the operations apply to
+            new_status: The status the operations set
+            operations: Cosmos DB patch operations for the step
+            etag: The etag the stored step must still have
 
         Returns:
-            The Plan object or None if not found
+            The patched step document
+
+        Raises:
+            CosmosAccessConditionFailedError: If the stored step has changed
         """
-        # Use the session_id as the partition key since that's how we're partitioning our data
-        return await self.get_item_by_id(
-            plan_id, partition_key=self.session_id, model_class=Plan
-        )
+        try:
+            results = await self._container.execute_item_batch(
+                batch_operations=[
+                    ("patch", (stored.id, operations), {"if_match_etag": etag}),
+                    (
+                        "patch",
+                        (stored.plan_id, self._step_count_patch(stored.status, new_status)),
+                    ),
+                ],
+                partition_key=self._partition_key(stored.session_id, stored.user_id),
+            )
+        except CosmosBatchOperationError as e:
+            if self._is_precondition_failure(e):
+                raise CosmosAccessConditionFailedError(
+                    status_code=412, message=f"Step {stored.id} has changed"
+                )
+            raise
+
+        step_result, plan_result = results[0], results[1]
+        if plan_result.get("resourceBody"):
+            self._plan_cache.put_plan(
+                stored.user_id,
+                await self._decode(plan_result["resourceBody"], Plan),
+                plan_result.get("eTag"),
+            )
+        return step_result["resourceBody"]
+
+    @staticmethod
+    def _patched_status(operations: List[Dict[str, Any]]) -> Optional[StepStatus]:
+        """Get the status patch operations set on a step, None if they leave it alone."""
+        for operation in operations:
+            if operation["path"] == "/status" and operation["op"] in ("add", "set", "replace"):
+                return StepStatus(operation["value"])
+        return None
 
-    async def get_all_plans(self) -> List[Plan]:
-        """Retrieve all plans."""
-        query = "SELECT * FROM c WHERE c.user_id=@user_id AND c.data_type=@data_type ORDER BY c._ts DESC"
-        parameters = [
-            {"name": "@data_type", "value": "plan"},
-            {"name": "@user_id", "value": self.user_id},
-        ]
-        plans = await self.query_items(query, parameters, Plan)
-        return plans
+    async def get_steps_by_plan(
+        self, plan_id: str, session_id: Optional[str] = None
+    ) -> List[Step]:
+        """Retrieve all steps associated with a plan.
 
-    async def add_step(self, step: Step) -> None:
-        """Add a step to Cosmos DB."""
-        await self.add_item(step)
+        Args:
+            plan_id: The ID of the plan to retrieve steps for
+            session_id: Optional session ID of the plan, used to query a single partition
 
-    async def update_step(self, step: Step) -> None:
-        """Update an existing step in Cosmos DB."""
-        await self.update_item(step)
+        Returns:
+            List of Step objects
+        """
+        cached = self._plan_cache.get_steps(self.user_id, plan_id)
+        if cached is not None:
+            return cached
+
+        if session_id is None:
+            session_id = self._plan_cache.get_plan_session(self.user_id, plan_id)
 
-    async def get_steps_by_plan(self, plan_id: str) -> List[Step]:
-        """Retrieve all steps associated with a plan."""
         query = "SELECT * FROM c WHERE c.plan_id=@plan_id AND c.user_id=@user_id AND c.data_type=@data_type"
         parameters = [
             {"name": "@plan_id", "value": plan_id},
             {"name": "@data_type", "value": "step"},
             {"name": "@user_id", "value": self.user_id},
         ]
-        steps = await self.query_items(query, parameters, Step)
-        return steps
+        steps = await self._query_items_with_etags(
+            query, parameters, Step, partition_key=self._partition_key(session_id)
+        )
+        if steps:
+            self._plan_cache.put_steps(
+                self.user_id, steps[0][0].session_id, plan_id, steps
+            )
+        return [step for step, _ in steps]
 
     async def get_steps_for_plan(
         self, plan_id: str, session_id: Optional[str] = None
@@ -307,11 +1306,15 @@ class CosmosMemoryContext(MemoryStoreBase):
         Returns:
             List of Step objects
         """
-        return await self.get_steps_by_plan(plan_id)
+        return await self.get_steps_by_plan(plan_id, session_id=session_id)
 
     async def get_step(self, step_id: str, session_id: str) -> Optional[Step]:
+        cached = self._plan_cache.get_step(self.user_id, session_id, step_id)
+        if cached is not None:
+            return cached
+
         return await self.get_item_by_id(
-            step_id, partition_key=session_id, model_class=Step
+            step_id, partition_key=session_id, model_class=Step, hedge="get_step"
         )
 
     async def add_agent_message(self, message: AgentMessage) -> None:
@@ -338,36 +1341,178 @@ class CosmosMemoryContext(MemoryStoreBase):
             {"name": "@session_id", "value": session_id},
             {"name": "@data_type", "value": "agent_message"},
         ]
-        messages = await self.query_items(query, parameters, AgentMessage)
-        return messages
+        messages = await self.query_items(
+            query, parameters, AgentMessage, partition_key=self._partition_key(session_id)
+        )
+        return await self._merge_pending_writes(
+            messages, session_id, "agent_message", AgentMessage
+        )
+
+    async def get_agent_messages_page(
+        self,
+        session_id: str,
+        page_size: Optional[int] = None,
+        since_ts: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[AgentMessage], Optional[str]]:
+        """Retrieve a page of the current user's agent messages in a session, oldest first.
+
+        Args:
+            session_id: The session ID to get messages for
+            page_size: Maximum number of messages to return, None for all of them
+            since_ts: Only return messages written after this Cosmos DB _ts
+            cursor: The cursor returned with the previous page
+
+        Returns:
+            The messages of the page and the cursor of the next page
+        """
+        query, parameters = self._agent_messages_query(session_id, since_ts)
+        messages, next_cursor = await self.query_page(
+            query, parameters, AgentMessage, page_size, cursor,
+            partition_key=self._partition_key(session_id),
+        )
+        if next_cursor is None:
+            # Queued messages are newer than anything stored, so they belong on the last page
+            messages = await self._merge_pending_writes(
+                messages, session_id, "agent_message", AgentMessage, self.user_id
+            )
+        return messages, next_cursor
+
+    async def iter_agent_messages(
+        self, session_id: str, since_ts: Optional[int] = None
+    ) -> AsyncIterator[AgentMessage]:
+        """Stream the current user's agent messages in a session, oldest first.
+
+        Args:
+            session_id: The session ID to get messages for
+            since_ts: Only return messages written after this Cosmos DB _ts
+
+        Yields:
+            AgentMessage objects, followed by queued messages not written yet
+        """
+        query, parameters = self._agent_messages_query(session_id, since_ts)
+        seen = set()
+        async for message in self.iter_items(
+            query, parameters, AgentMessage, partition_key=self._partition_key(session_id)
+        ):
+            seen.add(message.id)
+            yield message
+
+        if self._write_behind:
+            for document in write_behind_queue.get_pending(session_id):
+                if (
+                    document.get("data_type") == "agent_message"
+                    and document.get("user_id") == self.user_id
+                    and document["id"] not in seen
+                ):
+                    yield await self._decode(document, AgentMessage)
+
+    def _agent_messages_query(
+        self, session_id: str, since_ts: Optional[int]
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the query listing the current user's agent messages in a session."""
+        parameters = [
+            {"name": "@session_id", "value": session_id},
+            {"name": "@data_type", "value": "agent_message"},
+            {"name": "@user_id", "value": self.user_id},
+        ]
+        query = (
+            "SELECT * FROM c WHERE c.session_id=@session_id AND c.user_id=@user_id AND c.data_type=@data_type"
+            f"{self._since_clause(since_ts, parameters)} ORDER BY c._ts ASC"
+        )
+        return query, parameters
+
+    async def get_agent_messages_by_plan(
+        self,
+        plan_id: str,
+        page_size: Optional[int] = None,
+        since_ts: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[AgentMessage], Optional[str]]:
+        """Retrieve a page of the current user's agent messages for a plan, oldest first.
+
+        Args:
+            plan_id: The plan ID to get messages for
+            page_size: Maximum number of messages to return, None for all of them
+            since_ts: Only return messages written after this Cosmos DB _ts
+            cursor: The cursor returned with the previous page
+
+        Returns:
+            The messages of the page and the cursor of the next page
+        """
+        session_id = self._plan_cache.get_plan_session(self.user_id, plan_id)
+        query, parameters = self._agent_messages_by_plan_query(plan_id, since_ts)
+        return await self.query_page(
+            query, parameters, AgentMessage, page_size, cursor,
+            partition_key=self._partition_key(session_id),
+        )
+
+    def iter_agent_messages_by_plan(
+        self, plan_id: str, since_ts: Optional[int] = None
+    ) -> AsyncIterator[AgentMessage]:
+        """Stream the current user's agent messages for a plan, oldest first.
+
+        Args:
+            plan_id: The plan ID to get messages for
+            since_ts: Only return messages written after this Cosmos DB _ts
+
+        Returns:
+            An async iterator of AgentMessage objects
+        """
+        session_id = self._plan_cache.get_plan_session(self.user_id, plan_id)
+        query, parameters = self._agent_messages_by_plan_query(plan_id, since_ts)
+        return self.iter_items(
+            query, parameters, AgentMessage, partition_key=self._partition_key(session_id)
+        )
+
+    def _agent_messages_by_plan_query(
+        self, plan_id: str, since_ts: Optional[int]
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """Build the query listing the current user's agent messages for a plan."""
+        parameters = [
+            {"name": "@plan_id", "value": plan_id},
+            {"name": "@data_type", "value": "agent_message"},
+            {"name": "@user_id", "value": self.user_id},
+        ]
+        query = (
+            "SELECT * FROM c WHERE c.plan_id=@plan_id AND c.user_id=@user_id AND c.data_type=@data_type"
+            f"{self._since_clause(since_ts, parameters)} ORDER BY c._ts ASC"
+        )
+        return query, parameters
 
     async def add_message(self, message: ChatMessageContent) -> None:
         """Add a message to the memory and save to Cosmos DB."""
         await self.ensure_initialized()
 
         try:
-            self._messages.append(message)
-            # Ensure buffer size is maintained
-            while len(self._messages) > self._buffer_size:
-                self._messages.pop(0)
-
-            message_dict = {
-                "id": str(uuid.uuid4()),
-                "session_id": self.session_id,
-                "user_id": self.user_id,
-                "data_type": "message",
-                "content": {
-                    "role": message.role.value,
-                    "content": message.content,
-                    "metadata": message.metadata,
-                },
-                "source": message.metadata.get("source", ""),
-            }
-            await self._container.create_item(body=message_dict)
+            self._buffer_message(message)
+            await self._container.create_item(body=self._message_document(message))
         except Exception as e:
             logging.exception(f"Failed to add message to Cosmos DB: {e}")
             raise  # Propagate the error instead of silently failing
 
+    def _buffer_message(self, message: ChatMessageContent) -> None:
+        """Keep a message in the in-memory buffer of recent messages."""
+        self._messages.append(message)
+        # Ensure buffer size is maintained
+        while len(self._messages) > self._buffer_size:
+            self._messages.pop(0)
+
+    def _message_document(self, message: ChatMessageContent) -> Dict[str, Any]:
+        """Build the document stored for a chat message."""
+        return {
+            "id": str(uuid.uuid4()),
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "data_type": "message",
+            "content": {
+                "role": message.role.value,
+                "content": message.content,
+                "metadata": message.metadata,
+            },
+            "source": message.metadata.get("source", ""),
+        }
+
     async def get_messages(self) -> List[ChatMessageContent]:
         """Get recent messages for the session."""
         await self.ensure_initialized()
@@ -387,6 +1532,7 @@ class CosmosMemoryContext(MemoryStoreBase):
             items = self._container.query_items(
                 query=query,
                 parameters=parameters,
+                partition_key=self._partition_key(self.session_id),
             )
             messages = []
             async for item in items:
@@ -419,9 +1565,19 @@ class CosmosMemoryContext(MemoryStoreBase):
         return history
 
     async def save_chat_history(self, history: ChatHistory) -> None:
-        """Save a ChatHistory object to the store."""
-        for message in history.messages:
-            await self.add_message(message)
+        """Save a ChatHistory object to the store in transactional batches."""
+        await self.ensure_initialized()
+
+        try:
+            operations = []
+            for message in history.messages:
+                self._buffer_message(message)
+                operations.append(("create", (self._message_document(message),)))
+            if operations:
+                await self._execute_batches({self.session_id: operations})
+        except Exception as e:
+            logging.exception(f"Failed to save chat history to Cosmos DB: {e}")
+            raise  # Propagate the error instead of silently failing
 
     async def get_data_by_type(self, data_type: str) -> List[BaseDataModel]:
         """Query the Cosmos DB for documents with the matching data_type, session_id and user_id."""
@@ -437,7 +1593,12 @@ class CosmosMemoryContext(MemoryStoreBase):
                 {"name": "@data_type", "value": data_type},
                 {"name": "@user_id", "value": self.user_id},
             ]
-            return await self.query_items(query, parameters, model_class)
+            results = await self.query_items(
+                query, parameters, model_class, partition_key=self._partition_key(self.session_id)
+            )
+            return await self._merge_pending_writes(
+                results, self.session_id, data_type, model_class, self.user_id
+            )
         except Exception as e:
             logging.exception(f"Failed to query data by type from Cosmos DB: {e}")
             return []
@@ -458,43 +1619,80 @@ class CosmosMemoryContext(MemoryStoreBase):
                 {"name": "@data_type", "value": data_type},
                 {"name": "@user_id", "value": self.user_id},
             ]
-            return await self.query_items(query, parameters, model_class)
+            results = await self.query_items(
+                query, parameters, model_class, partition_key=self._partition_key(session_id)
+            )
+            return await self._merge_pending_writes(
+                results, session_id, data_type, model_class, self.user_id
+            )
         except Exception as e:
             logging.exception(f"Failed to query data by type from Cosmos DB: {e}")
             return []
 
     async def delete_item(self, item_id: str, partition_key: str) -> None:
-        """Delete an item from Cosmos DB."""
+        """Delete an item of the current user by its ID and session_id partition key."""
         await self.ensure_initialized()
         try:
-            await self._container.delete_item(item=item_id, partition_key=partition_key)
+            await self._container.delete_item(
+                item=item_id, partition_key=self._partition_key(partition_key)
+            )
+            self._plan_cache.invalidate(self.user_id, partition_key)
         except Exception as e:
             logging.exception(f"Failed to delete item from Cosmos DB: {e}")
 
     async def delete_items_by_query(
         self, query: str, parameters: List[Dict[str, Any]]
     ) -> None:
-        """Delete items matching the query."""
+        """Delete items matching the query and wait for the deletion to finish.
+
+        The query must select c.id and c.session_id of the items.
+        """
         await self.ensure_initialized()
-        try:
-            items = self._container.query_items(query=query, parameters=parameters)
-            async for item in items:
-                item_id = item["id"]
-                partition_key = item.get("session_id", None)
-                await self._container.delete_item(
-                    item=item_id, partition_key=partition_key
-                )
-        except Exception as e:
-            logging.exception(f"Failed to delete items from Cosmos DB: {e}")
+        job = bulk_delete_engine.start(self._container, self.user_id, query, parameters)
+        await job.wait()
 
-    async def delete_all_messages(self, data_type) -> None:
-        """Delete all messages of a specific type from Cosmos DB."""
-        query = "SELECT c.id, c.session_id FROM c WHERE c.data_type=@data_type AND c.user_id=@user_id"
+    async def start_bulk_delete(self, data_types: List[str]) -> BulkDeleteJob:
+        """Start deleting all of the current user's items of the given types in the background.
+
+        Args:
+            data_types: The data types to delete, e.g. ["plan", "step"]
+
+        Returns:
+            The job handle, see get_bulk_delete_job
+        """
+        await self.ensure_initialized()
+        if self._write_behind:
+            # Make sure queued inserts land before they are deleted
+            await write_behind_queue.flush()
+        self._plan_cache.invalidate_user(self.user_id)
+
+        query = "SELECT c.id, c.session_id FROM c WHERE c.user_id=@user_id AND ARRAY_CONTAINS(@data_types, c.data_type)"
         parameters = [
-            {"name": "@data_type", "value": data_type},
             {"name": "@user_id", "value": self.user_id},
+            {"name": "@data_types", "value": data_types},
         ]
-        await self.delete_items_by_query(query, parameters)
+        if config.COSMOSDB_CHANGE_FEED_VIEWS:
+            # Deletes are not in the change feed, so drop the views built from the documents
+            await reset_user_views(self._container, self.user_id, data_types)
+
+        user_id = self.user_id
+        return bulk_delete_engine.start(
+            self._container,
+            user_id,
+            query,
+            parameters,
+            # Reads racing the deletion may have cached documents that are now gone
+            on_complete=lambda job: self._plan_cache.invalidate_user(user_id),
+        )
+
+    def get_bulk_delete_job(self, job_id: str) -> Optional[BulkDeleteJob]:
+        """Get a bulk delete job started by the current user."""
+        return bulk_delete_engine.get_job(job_id, self.user_id)
+
+    async def delete_all_messages(self, data_type) -> None:
+        """Delete all messages of a specific type from Cosmos DB."""
+        job = await self.start_bulk_delete([data_type])
+        await job.wait()
 
     async def delete_all_items(self, data_type) -> None:
         """Delete all items of a specific type from Cosmos DB."""
@@ -508,26 +1706,64 @@ class CosmosMemoryContext(MemoryStoreBase):
 
         try:
             messages_list = []
-            query = "SELECT * FROM c WHERE c.user_id=@user_id OFFSET 0 LIMIT @limit"
+            # The change feed views are internal documents, not messages
+            query = (
+                "SELECT * FROM c WHERE c.user_id=@user_id"
+                " AND NOT ARRAY_CONTAINS(@view_types, c.data_type) OFFSET 0 LIMIT @limit"
+            )
             parameters = [
                 {"name": "@user_id", "value": self.user_id},
+                {"name": "@view_types", "value": list(VIEW_DATA_TYPES)},
                 {"name": "@limit", "value": 100},
             ]
-            items = self._container.query_items(query=query, parameters=parameters)
+            items = self._container.query_items(
+                query=query, parameters=parameters, **self._partition_kwargs(self._partition_key())
+            )
             async for item in items:
-                messages_list.append(item)
+                messages_list.append(await self._large_text.hydrate(strip_system_fields(item)))
             return messages_list
+        except MissingBlobError:
+            raise
         except Exception as e:
             logging.exception(f"Failed to get messages from Cosmos DB: {e}")
             return []
 
+    async def get_messages_page(
+        self,
+        page_size: Optional[int] = 100,
+        since_ts: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Retrieve a page of all of the current user's documents, oldest first.
+
+        The change feed view documents of the user are left out.
+
+        Args:
+            page_size: Maximum number of documents to return, None for all of them
+            since_ts: Only return documents changed after this Cosmos DB _ts
+            cursor: The cursor returned with the previous page
+
+        Returns:
+            The raw documents of the page and the cursor of the next page
+        """
+        parameters = [
+            {"name": "@user_id", "value": self.user_id},
+            {"name": "@view_types", "value": list(VIEW_DATA_TYPES)},
+        ]
+        query = (
+            "SELECT * FROM c WHERE c.user_id=@user_id AND NOT ARRAY_CONTAINS(@view_types, c.data_type)"
+            f"{self._since_clause(since_ts, parameters)} ORDER BY c._ts ASC"
+        )
+        return await self.query_page(
+            query, parameters, None, page_size, cursor, partition_key=self._partition_key()
+        )
+
     async def get_all_items(self) -> List[Dict[str, Any]]:
         """Retrieve all items from Cosmos DB."""
         return await self.get_all_messages()
 
     def close(self) -> None:
-        """Close the Cosmos DB client."""
-        # No-op or implement synchronous cleanup if required
+        """Release this context. The shared Cosmos client is closed by the registry at shutdown."""
         return
 
     async def __aenter__(self):
@@ -562,7 +1798,9 @@ class CosmosMemoryContext(MemoryStoreBase):
             """
             parameters = [{"name": "@session_id", "value": self.session_id}]
 
-            items = self._container.query_items(query=query, parameters=parameters)
+            items = self._container.query_items(
+                query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+            )
             collections = []
             async for item in items:
                 if "collection" in item and item["collection"] not in collections:
@@ -592,17 +1830,31 @@ class CosmosMemoryContext(MemoryStoreBase):
                 {"name": "@session_id", "value": self.session_id},
             ]
 
-            items = self._container.query_items(query=query, parameters=parameters)
+            items = self._container.query_items(
+                query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+            )
             async for item in items:
                 await self._container.delete_item(
-                    item=item["id"], partition_key=item["session_id"]
+                    item=item["id"], partition_key=self._partition_key(item["session_id"])
                 )
         except Exception as e:
             logging.exception(f"Failed to delete collection from Cosmos DB: {e}")
+        finally:
+            self._embedding_matrices.invalidate(self.session_id, collection_name)
+            if self._vector_indexes.enabled:
+                self._vector_indexes.drop(self.session_id, collection_name)
 
     async def upsert_memory_record(self, collection: str, record: MemoryRecord) -> str:
         """Store a memory record."""
-        memory_dict = {
+        await self.ensure_initialized()
+        memory_dict = self._memory_document(collection, record)
+        await self._container.upsert_item(body=memory_dict)
+        self._index_memory_documents(collection, [memory_dict])
+        return memory_dict["id"]
+
+    def _memory_document(self, collection: str, record: MemoryRecord) -> Dict[str, Any]:
+        """Build the document stored for a memory record."""
+        return {
             "id": record.id or str(uuid.uuid4()),
             "session_id": self.session_id,
             "user_id": self.user_id,
@@ -610,21 +1862,44 @@ class CosmosMemoryContext(MemoryStoreBase):
             "collection": collection,
             "text": record.text,
             "description": record.description,
-            "external_source_name": record.external_source_name,
+            # MemoryRecord has no public accessors for these, the SK memory stores read them the same way
+            "external_source_name": record._external_source_name,
             "additional_metadata": record.additional_metadata,
-            "embedding": (
-                record.embedding.tolist() if record.embedding is not None else None
-            ),
-            "key": record.key,
+            "embedding": encode_embedding(record.embedding),
+            "key": record._key,
         }
 
-        await self._container.upsert_item(body=memory_dict)
-        return memory_dict["id"]
+    def _index_memory_documents(
+        self, collection: str, documents: List[Dict[str, Any]]
+    ) -> None:
+        """Bring the nearest match index of a collection up to date after writes."""
+        self._embedding_matrices.invalidate(self.session_id, collection)
+        if not self._vector_indexes.enabled:
+            return
+        index = self._vector_indexes.get(self.session_id, collection)
+        if index is None:
+            # Built from the container on the first search
+            return
+        embeddings = {doc["id"]: decode_embedding(doc.get("embedding")) for doc in documents}
+        index.remove([key for key, embedding in embeddings.items() if embedding is None])
+        embedded = {key: embedding for key, embedding in embeddings.items() if embedding is not None}
+        if embedded:
+            index.add(list(embedded), np.vstack(list(embedded.values())))
+
+    def _unindex_memory_documents(self, collection: str, ids: List[str]) -> None:
+        """Bring the nearest match index of a collection up to date after removals."""
+        self._embedding_matrices.invalidate(self.session_id, collection)
+        if not self._vector_indexes.enabled:
+            return
+        index = self._vector_indexes.get(self.session_id, collection)
+        if index is not None:
+            index.remove(ids)
 
     async def get_memory_record(
         self, collection: str, key: str, with_embedding: bool = False
     ) -> Optional[MemoryRecord]:
         """Retrieve a memory record."""
+        await self.ensure_initialized()
         query = """
             SELECT * FROM c
             WHERE c.collection=@collection AND c.key=@key AND c.session_id=@session_id AND c.data_type=@data_type
@@ -636,25 +1911,23 @@ class CosmosMemoryContext(MemoryStoreBase):
             {"name": "@data_type", "value": "memory"},
         ]
 
-        items = self._container.query_items(query=query, parameters=parameters)
+        items = self._container.query_items(
+            query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+        )
         async for item in items:
-            return MemoryRecord(
-                id=item["id"],
-                text=item["text"],
-                description=item["description"],
-                external_source_name=item["external_source_name"],
-                additional_metadata=item["additional_metadata"],
-                embedding=(
-                    np.array(item["embedding"])
-                    if with_embedding and "embedding" in item
-                    else None
-                ),
-                key=item["key"],
+            return self._memory_record_from_document(
+                item, decode_embedding(item.get("embedding")) if with_embedding else None
             )
         return None
 
     async def remove_memory_record(self, collection: str, key: str) -> None:
         """Remove a memory record."""
+        await self.ensure_initialized()
+        ids = await self._delete_memory_record(collection, key)
+        self._unindex_memory_documents(collection, ids)
+
+    async def _delete_memory_record(self, collection: str, key: str) -> List[str]:
+        """Delete the documents of a memory record, returning their IDs."""
         query = """
             SELECT c.id FROM c
             WHERE c.collection=@collection AND c.key=@key AND c.session_id=@session_id AND c.data_type=@data_type
@@ -666,11 +1939,16 @@ class CosmosMemoryContext(MemoryStoreBase):
             {"name": "@data_type", "value": "memory"},
         ]
 
-        items = self._container.query_items(query=query, parameters=parameters)
+        items = self._container.query_items(
+            query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+        )
+        ids = []
         async for item in items:
             await self._container.delete_item(
-                item=item["id"], partition_key=self.session_id
+                item=item["id"], partition_key=self._partition_key(self.session_id)
             )
+            ids.append(item["id"])
+        return ids
 
     async def upsert_async(self, collection_name: str, record: Dict[str, Any]) -> str:
         """Helper method to insert documents directly."""
@@ -684,6 +1962,14 @@ class CosmosMemoryContext(MemoryStoreBase):
                 record["id"] = str(uuid.uuid4())
 
             await self._container.upsert_item(body=record)
+            if record.get("data_type") == "memory" and record["session_id"] == self.session_id:
+                self._index_memory_documents(
+                    record.get("collection", collection_name), [record]
+                )
+            elif record.get("data_type") == "memory":
+                self._embedding_matrices.invalidate(
+                    record["session_id"], record.get("collection", collection_name)
+                )
             return record["id"]
         except Exception as e:
             logging.exception(f"Failed to upsert item to Cosmos DB: {e}")
@@ -711,23 +1997,16 @@ class CosmosMemoryContext(MemoryStoreBase):
                 {"name": "@limit", "value": limit},
             ]
 
-            items = self._container.query_items(query=query, parameters=parameters)
+            items = self._container.query_items(
+                query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+            )
             records = []
             async for item in items:
                 embedding = None
-                if with_embeddings and "embedding" in item and item["embedding"]:
-                    embedding = np.array(item["embedding"])
-
-                record = MemoryRecord(
-                    id=item["id"],
-                    key=item.get("key", ""),
-                    text=item.get("text", ""),
-                    embedding=embedding,
-                    description=item.get("description", ""),
-                    additional_metadata=item.get("additional_metadata", ""),
-                    external_source_name=item.get("external_source_name", ""),
-                )
-                records.append(record)
+                if with_embeddings:
+                    embedding = decode_embedding(item.get("embedding"))
+
+                records.append(self._memory_record_from_document(item, embedding))
             return records
         except Exception as e:
             logging.exception(f"Failed to get memory records from Cosmos DB: {e}")
@@ -740,12 +2019,23 @@ class CosmosMemoryContext(MemoryStoreBase):
     async def upsert_batch(
         self, collection_name: str, records: List[MemoryRecord]
     ) -> List[str]:
-        """Upsert a batch of memory records into the store."""
-        result_ids = []
-        for record in records:
-            record_id = await self.upsert_memory_record(collection_name, record)
-            result_ids.append(record_id)
-        return result_ids
+        """Upsert a batch of memory records into the store.
+
+        The records share the session partition and are written with transactional
+        batches, returning their IDs in record order.
+        """
+        await self.ensure_initialized()
+
+        documents = [self._memory_document(collection_name, record) for record in records]
+        try:
+            if documents:
+                await self._execute_batches(
+                    {self.session_id: [("upsert", (document,)) for document in documents]}
+                )
+        finally:
+            # Batches may have been written before a failure, index everything once
+            self._index_memory_documents(collection_name, documents)
+        return [document["id"] for document in documents]
 
     async def get(
         self, collection_name: str, key: str, with_embedding: bool = False
@@ -756,22 +2046,87 @@ class CosmosMemoryContext(MemoryStoreBase):
     async def get_batch(
         self, collection_name: str, keys: List[str], with_embeddings: bool = False
     ) -> List[MemoryRecord]:
-        """Get a batch of memory records from the store."""
+        """Get a batch of memory records from the store.
+
+        Keys are looked up with IN-list queries of up to GET_BATCH_QUERY_SIZE keys.
+        Records are returned in the order of their keys, missing keys are skipped.
+        """
+        await self.ensure_initialized()
+
+        documents = await self._get_memory_documents(collection_name, keys)
         results = []
         for key in keys:
-            record = await self.get_memory_record(collection_name, key, with_embeddings)
-            if record:
-                results.append(record)
+            if key in documents:
+                item = documents[key][0]
+                embedding = decode_embedding(item.get("embedding")) if with_embeddings else None
+                results.append(self._memory_record_from_document(item, embedding))
         return results
 
+    async def _get_memory_documents(
+        self, collection: str, keys: List[str]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the memory documents of some keys, grouped by key."""
+        unique_keys = list(dict.fromkeys(keys))
+        semaphore = asyncio.Semaphore(self._batch_concurrency)
+
+        async def query(chunk: List[str]) -> List[Dict[str, Any]]:
+            placeholders = ", ".join(f"@key{i}" for i in range(len(chunk)))
+            parameters = [
+                {"name": "@collection", "value": collection},
+                {"name": "@session_id", "value": self.session_id},
+                {"name": "@data_type", "value": "memory"},
+                *({"name": f"@key{i}", "value": key} for i, key in enumerate(chunk)),
+            ]
+            async with semaphore:
+                items = self._container.query_items(
+                    query=f"""
+                        SELECT * FROM c
+                        WHERE c.collection=@collection AND c.session_id=@session_id
+                        AND c.data_type=@data_type AND c.key IN ({placeholders})
+                    """,
+                    parameters=parameters,
+                    partition_key=self._partition_key(self.session_id),
+                )
+                return [item async for item in items]
+
+        chunks = [
+            unique_keys[start:start + self.GET_BATCH_QUERY_SIZE]
+            for start in range(0, len(unique_keys), self.GET_BATCH_QUERY_SIZE)
+        ]
+        documents: Dict[str, List[Dict[str, Any]]] = {}
+        for items in await asyncio.gather(*[query(chunk) for chunk in chunks]):
+            for item in items:
+                documents.setdefault(item["key"], []).append(item)
+        return documents
+
     async def remove(self, collection_name: str, key: str) -> None:
         """Remove a memory record from the store."""
         await self.remove_memory_record(collection_name, key)
 
     async def remove_batch(self, collection_name: str, keys: List[str]) -> None:
-        """Remove a batch of memory records from the store."""
-        for key in keys:
-            await self.remove_memory_record(collection_name, key)
+        """Remove a batch of memory records from the store.
+
+        The records are found with IN-list queries and deleted with transactional
+        batches. A batch that fails because a record is already gone is retried one
+        record at a time.
+        """
+        await self.ensure_initialized()
+
+        documents = await self._get_memory_documents(collection_name, keys)
+        ids = [item["id"] for items in documents.values() for item in items]
+        try:
+            if ids:
+                await self._execute_batches(
+                    {self.session_id: [("delete", (item_id,)) for item_id in ids]}
+                )
+        except CosmosBatchOperationError:
+            for item_id in ids:
+                try:
+                    await self._container.delete_item(item=item_id, partition_key=self._partition_key(self.session_id))
+                except CosmosResourceNotFoundError:
+                    pass
+        finally:
+            self._unindex_memory_documents(collection_name, ids)
 
     async def get_nearest_match(
         self,
@@ -795,28 +2150,212 @@ class CosmosMemoryContext(MemoryStoreBase):
         min_relevance_score: float = 0.0,
         with_embeddings: bool = False,
     ) -> List[Tuple[MemoryRecord, float]]:
-        """Get the nearest matches to the given embedding."""
+        """Get the nearest matches to the given embedding.
+
+        With the default "matrix" vector index every record of the collection is
+        scored, using the cached embedding matrix of the collection. Otherwise the
+        persistent vector index of the collection, caught up with the records written
+        since its last search, picks the matches, and only their documents are read.
+        """
         await self.ensure_initialized()
 
         try:
-            records = await self.get_memory_records(
-                collection_name, limit=100, with_embeddings=True
-            )
-
+            if self._vector_indexes.enabled:
+                return await self._search_vector_index(
+                    collection_name, embedding, limit, min_relevance_score, with_embeddings
+                )
+            matrix = await self._get_embedding_matrix(collection_name)
             results = []
-            for record in records:
-                if record.embedding is not None:
-                    similarity = np.dot(embedding, record.embedding) / (
-                        np.linalg.norm(embedding) * np.linalg.norm(record.embedding)
-                    )
-
-                    if similarity >= min_relevance_score:
-                        if not with_embeddings:
-                            record.embedding = None
-                        results.append((record, float(similarity)))
-
-            results.sort(key=lambda x: x[1], reverse=True)
-            return results[:limit]
+            for row, score in matrix.search(embedding, limit, min_relevance_score):
+                record = self._memory_record_from_document(
+                    matrix.documents[row],
+                    matrix.embedding(row) if with_embeddings else None,
+                )
+                results.append((record, score))
+            return results
         except Exception as e:
             logging.exception(f"Failed to get nearest matches from Cosmos DB: {e}")
             return []
+
+    async def _get_embedding_matrix(self, collection: str) -> EmbeddingMatrix:
+        """Get the embedding matrix of a collection, loading every record on a cache miss."""
+        matrix = self._embedding_matrices.get(self.session_id, collection)
+        if matrix is not None:
+            return matrix
+
+        version = self._embedding_matrices.version(self.session_id, collection)
+        query = """
+            SELECT c.id, c.key, c.text, c.description, c.external_source_name,
+                   c.additional_metadata, c.embedding
+            FROM c
+            WHERE c.collection = @collection
+            AND c.data_type = 'memory'
+            AND c.session_id = @session_id
+        """
+        parameters = [
+            {"name": "@collection", "value": collection},
+            {"name": "@session_id", "value": self.session_id},
+        ]
+        items = self._container.query_items(
+            query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+        )
+        documents, embeddings = [], []
+        async for item in items:
+            embedding = decode_embedding(item.pop("embedding", None))
+            if embedding is not None:
+                documents.append(item)
+                embeddings.append(embedding)
+
+        matrix = EmbeddingMatrix(documents, embeddings)
+        self._embedding_matrices.put(self.session_id, collection, matrix, version)
+        return matrix
+
+    async def _search_vector_index(
+        self,
+        collection: str,
+        embedding: np.ndarray,
+        limit: int,
+        min_relevance_score: float,
+        with_embeddings: bool,
+    ) -> List[Tuple[MemoryRecord, float]]:
+        """Get the nearest matches from the vector index of a collection."""
+        index = await self._get_vector_index(collection)
+        hits = index.search(embedding, limit, min_relevance_score)
+        if not hits:
+            return []
+
+        query = f"""
+            SELECT c.id, c.key, c.text, c.description, c.external_source_name,
+                   c.additional_metadata{", c.embedding" if with_embeddings else ""}
+            FROM c
+            WHERE ARRAY_CONTAINS(@ids, c.id)
+            AND c.collection = @collection
+            AND c.data_type = 'memory'
+            AND c.session_id = @session_id
+        """
+        parameters = [
+            {"name": "@ids", "value": [key for key, _ in hits]},
+            {"name": "@collection", "value": collection},
+            {"name": "@session_id", "value": self.session_id},
+        ]
+        items = self._container.query_items(
+            query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+        )
+        documents = {}
+        async for item in items:
+            documents[item["id"]] = item
+
+        results = []
+        for key, score in hits:
+            # Records removed by another process stay in this process' index, skip them
+            item = documents.get(key)
+            if item is None:
+                continue
+            record_embedding = None
+            if with_embeddings:
+                record_embedding = decode_embedding(item.get("embedding"))
+            results.append((self._memory_record_from_document(item, record_embedding), score))
+        return results
+
+    async def _get_vector_index(self, collection: str) -> VectorIndex:
+        """Get the vector index of a collection, building it from every record if needed.
+
+        An existing index is first caught up with the records written since its
+        version, so records upserted by other processes, or while this one was down,
+        are found as well.
+        """
+        index = self._vector_indexes.get(self.session_id, collection)
+        if index is not None:
+            await self._catch_up_vector_index(collection, index)
+            return index
+
+        async with self._vector_indexes.build_lock(self.session_id, collection):
+            index = self._vector_indexes.get(self.session_id, collection)
+            if index is not None:
+                return index
+
+            query = """
+                SELECT c.id, c.embedding, c._ts
+                FROM c
+                WHERE c.collection = @collection
+                AND c.data_type = 'memory'
+                AND c.session_id = @session_id
+            """
+            parameters = [
+                {"name": "@collection", "value": collection},
+                {"name": "@session_id", "value": self.session_id},
+            ]
+            for _ in range(3):
+                # Writes during the scan bump the version, scan again to include them
+                version = self._embedding_matrices.version(self.session_id, collection)
+                ids, embeddings, timestamps = [], [], {}
+                async for item in self._container.query_items(
+                    query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+                ):
+                    timestamps[item["id"]] = item.get("_ts", 0)
+                    embedding = decode_embedding(item.get("embedding"))
+                    if embedding is not None:
+                        ids.append(item["id"])
+                        embeddings.append(embedding)
+                if self._embedding_matrices.version(self.session_id, collection) == version:
+                    break
+
+            index = self._vector_indexes.create(self.session_id, collection)
+            if ids:
+                index.add(ids, np.vstack(embeddings))
+            if timestamps:
+                latest = max(timestamps.values())
+                index.mark_version(latest, [key for key, ts in timestamps.items() if ts == latest])
+            logging.info(f"Built vector index of collection {collection} with {len(ids)} records")
+            return index
+
+    async def _catch_up_vector_index(self, collection: str, index: VectorIndex) -> None:
+        """Apply the records of a collection written since the version of its index."""
+        query = """
+            SELECT c.id, c.embedding, c._ts
+            FROM c
+            WHERE c.collection = @collection
+            AND c.data_type = 'memory'
+            AND c.session_id = @session_id
+            AND c._ts >= @since_ts
+        """
+        parameters = [
+            {"name": "@collection", "value": collection},
+            {"name": "@session_id", "value": self.session_id},
+            {"name": "@since_ts", "value": index.version},
+        ]
+        changed: Dict[str, Tuple[int, Optional[np.ndarray]]] = {}
+        async for item in self._container.query_items(
+            query=query, parameters=parameters, partition_key=self._partition_key(self.session_id)
+        ):
+            ts = item.get("_ts", 0)
+            # _ts has a resolution of seconds, the records of the version second are re-read
+            if ts == index.version and item["id"] in index.version_keys:
+                continue
+            changed[item["id"]] = (ts, decode_embedding(item.get("embedding")))
+        if not changed:
+            return
+
+        index.remove([key for key, (_, embedding) in changed.items() if embedding is None])
+        embedded = {key: embedding for key, (_, embedding) in changed.items() if embedding is not None}
+        if embedded:
+            index.add(list(embedded), np.vstack(list(embedded.values())))
+        latest = max(ts for ts, _ in changed.values())
+        index.mark_version(latest, [key for key, (ts, _) in changed.items() if ts == latest])
+        logging.debug(f"Caught up vector index of collection {collection} with {len(changed)} records")
+
+    @staticmethod
+    def _memory_record_from_document(
+        item: Dict[str, Any], embedding: Optional[np.ndarray] = None
+    ) -> MemoryRecord:
+        """Build a MemoryRecord from a memory document."""
+        return MemoryRecord(
+            id=item["id"],
+            key=item.get("key", ""),
+            text=item.get("text", ""),
+            embedding=embedding,
+            description=item.get("description", ""),
+            additional_metadata=item.get("additional_metadata", ""),
+            external_source_name=item.get("external_source_name", ""),
+            is_reference=False,
+        )
@@ -0,0 +1,97 @@
+# document_codec.py
+
+from enum import Enum
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from context.large_text import LargeTextStore, large_text_store
+
+# Cosmos DB system properties that are never returned to callers
+SYSTEM_FIELDS = frozenset(("_rid", "_self", "_attachments"))
+
+
+def encode_document(item: BaseModel) -> Dict[str, Any]:
+    """Serialize a model to a Cosmos DB document in a single pass.
+
+    Pydantic's JSON mode writes datetimes as ISO 8601 strings and enums as their
+    values, nested ones included, so the result only holds JSON types and goes to the
+    SDK as is. The SDK needs a dict rather than encoded bytes, as it reads the id and
+    partition key of the document before encoding the request body itself.
+    """
+    return item.__pydantic_serializer__.to_python(item, mode="json")
+
+
+def set_operations(**fields: Any) -> List[Dict[str, Any]]:
+    """Build the Cosmos DB patch operations that set top-level fields of a document.
+
+    Example:
+        set_operations(status=StepStatus.completed, agent_reply=reply)
+    """
+    return [
+        {"op": "set", "path": f"/{name}", "value": value.value if isinstance(value, Enum) else value}
+        for name, value in fields.items()
+    ]
+
+
+def strip_system_fields(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a document without the Cosmos DB system properties, in a single pass."""
+    return {key: value for key, value in document.items() if key not in SYSTEM_FIELDS}
+
+
+class DocumentDecoder:
+    """Build models from documents read from the memory store.
+
+    ``model_validate`` pays the Python overhead of a validation call for every
+    document. A page of documents is instead validated by a cached list TypeAdapter in
+    a single pydantic-core call, and single documents go straight to the model's core
+    validator. Documents are still fully validated: in pydantic 2 the Rust validator
+    is faster than ``model_construct``, which copies fields in Python and would leave
+    enums and datetimes unconverted. Unknown keys, the Cosmos DB system properties
+    among them, are dropped by the validator while it builds the model.
+
+    References to texts offloaded to the large text store are not loaded while
+    decoding: their fields are deferred, for LargeTextStore.resolve to load them.
+    """
+
+    def __init__(self, large_text: Optional[LargeTextStore] = None) -> None:
+        self._list_adapters: Dict[type, TypeAdapter] = {}
+        self._large_text = large_text
+
+    def decode(self, document: Dict[str, Any], model_class: Type[BaseModel]) -> BaseModel:
+        """Build a model from a document.
+
+        Raises:
+            pydantic.ValidationError: If the document does not match the model
+        """
+        if self._large_text is None:
+            return model_class.__pydantic_validator__.validate_python(document)
+        document, loaders = self._large_text.defer(document)
+        model = model_class.__pydantic_validator__.validate_python(document)
+        if loaders:
+            model.defer_fields(loaders)
+        return model
+
+    def decode_many(
+        self, documents: List[Dict[str, Any]], model_class: Type[BaseModel]
+    ) -> List[BaseModel]:
+        """Build models from a list of documents in one validation call.
+
+        Raises:
+            pydantic.ValidationError: If any document does not match the model
+        """
+        adapter = self._list_adapters.get(model_class)
+        if adapter is None:
+            adapter = self._list_adapters[model_class] = TypeAdapter(List[model_class])
+        if self._large_text is None:
+            return adapter.validate_python(documents)
+        deferred = [self._large_text.defer(document) for document in documents]
+        models = adapter.validate_python([document for document, _ in deferred])
+        for model, (_, loaders) in zip(models, deferred):
+            if loaders:
+                model.defer_fields(loaders)
+        return models
+
+
+# Create a global instance of the decoder shared by all memory contexts
+document_decoder = DocumentDecoder(large_text_store)
@@ -0,0 +1,69 @@
+# embedding_codec.py
+
+import base64
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from app_config import config
+
+# Storage formats of embeddings in memory documents, mapped to their little-endian dtype
+EMBEDDING_FORMATS = {"list": None, "float32": "<f4", "float16": "<f2"}
+
+
+def encode_embedding(
+    embedding: Optional[np.ndarray], embedding_format: Optional[str] = None
+) -> Union[Dict[str, Any], list, None]:
+    """Encode an embedding for storage in a memory document.
+
+    The "list" format stores a JSON array of floats, the layout of older documents.
+    The binary formats store the little-endian vector as base64 with its dtype and
+    shape, about a sixth of the size of the JSON array for float32.
+
+    Args:
+        embedding: The embedding to encode
+        embedding_format: "list", "float32" or "float16", defaults to the configured format
+
+    Returns:
+        The value to store in the document's embedding field
+    """
+    if embedding is None:
+        return None
+    embedding_format = embedding_format or config.COSMOSDB_EMBEDDING_FORMAT
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise ValueError(
+            f"Unknown embedding format {embedding_format!r}, expected one of {list(EMBEDDING_FORMATS)}"
+        )
+    dtype = EMBEDDING_FORMATS[embedding_format]
+    if dtype is None:
+        return np.asarray(embedding).tolist()
+
+    vector = np.ascontiguousarray(embedding, dtype=dtype)
+    return {
+        "dtype": dtype,
+        "shape": list(vector.shape),
+        "data": base64.b64encode(vector.tobytes()).decode("ascii"),
+    }
+
+
+def decode_embedding(value: Any) -> Optional[np.ndarray]:
+    """Decode the embedding field of a memory document.
+
+    Binary embeddings are returned as a read-only view of the decoded bytes, JSON
+    arrays written by older versions are converted as before.
+
+    Args:
+        value: The stored embedding field
+
+    Returns:
+        The embedding, or None if the document has none
+    """
+    if value is None or (isinstance(value, (list, dict)) and not value):
+        return None
+    if isinstance(value, dict):
+        dtype = np.dtype(value["dtype"])
+        if dtype.kind != "f":
+            raise ValueError(f"Unsupported embedding dtype {value['dtype']!r}")
+        data = base64.b64decode(value["data"])
+        return np.frombuffer(data, dtype=dtype).reshape(value["shape"])
+    return np.array(value)
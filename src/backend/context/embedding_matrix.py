@@ -0,0 +1,128 @@
+# embedding_matrix.py
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingMatrix:
+    """The embeddings of one memory collection as a single normalized float32 matrix.
+
+    Rows are unit length, so the cosine similarity of every record with a query is a
+    single matrix-vector product. The row norms are kept to give callers the original
+    embeddings back.
+    """
+
+    def __init__(self, documents: List[Dict[str, Any]], embeddings: List[Any]) -> None:
+        """Build the matrix.
+
+        Args:
+            documents: The memory documents without their embeddings, one per row
+            embeddings: The embedding of each document
+        """
+        self.documents = documents
+        if embeddings:
+            vectors = np.ascontiguousarray(np.vstack(embeddings), dtype=np.float32)
+        else:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) if len(vectors) else np.zeros(0, np.float32)
+        # Zero vectors stay zero and score 0 against everything
+        safe_norms = np.where(norms > 0, norms, 1).astype(np.float32)
+        self.vectors = vectors / safe_norms[:, None]
+        self.norms = norms.astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(
+        self, embedding: np.ndarray, limit: int, min_relevance_score: float = 0.0
+    ) -> List[Tuple[int, float]]:
+        """Find the rows most similar to an embedding.
+
+        Args:
+            embedding: The query embedding
+            limit: Maximum number of matches
+            min_relevance_score: Minimum cosine similarity of a match
+
+        Returns:
+            (row, score) pairs ordered by descending score
+        """
+        if len(self) == 0 or limit <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32).ravel()
+        if query.shape[0] != self.vectors.shape[1]:
+            raise ValueError(
+                f"Embedding has {query.shape[0]} dimensions, the collection has {self.vectors.shape[1]}"
+            )
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+
+        scores = self.vectors @ (query / query_norm)
+        k = min(limit, len(scores))
+        if k < len(scores):
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [
+            (int(row), float(scores[row]))
+            for row in rows
+            if scores[row] >= min_relevance_score
+        ]
+
+    def embedding(self, row: int) -> np.ndarray:
+        """Get the original embedding of a row."""
+        return self.vectors[row] * self.norms[row]
+
+
+class EmbeddingMatrixCache:
+    """Bounded, process-wide cache of embedding matrices per memory collection.
+
+    A matrix is built from every record of a collection on first search and dropped
+    when a record of the collection is written or removed. Each invalidation bumps a
+    version number, so a matrix whose build raced with a write is not cached.
+    """
+
+    def __init__(self, max_collections: int = 64) -> None:
+        self._max_collections = max_collections
+        self._matrices: "OrderedDict[Tuple[str, str], EmbeddingMatrix]" = OrderedDict()
+        self._versions: Dict[Tuple[str, str], int] = {}
+
+    def get(self, scope: str, collection: str) -> Optional[EmbeddingMatrix]:
+        """Get the cached matrix of a collection."""
+        key = (scope, collection)
+        matrix = self._matrices.get(key)
+        if matrix is not None:
+            self._matrices.move_to_end(key)
+        return matrix
+
+    def version(self, scope: str, collection: str) -> int:
+        """Get the version to pass to put when building a matrix."""
+        return self._versions.get((scope, collection), 0)
+
+    def put(self, scope: str, collection: str, matrix: EmbeddingMatrix, version: int) -> None:
+        """Cache a matrix unless the collection changed since version was read."""
+        key = (scope, collection)
+        if self._versions.get(key, 0) != version:
+            return
+        self._matrices[key] = matrix
+        self._matrices.move_to_end(key)
+        while len(self._matrices) > self._max_collections:
+            self._matrices.popitem(last=False)
+
+    def invalidate(self, scope: str, collection: str) -> None:
+        """Drop the matrix of a collection after one of its records changed."""
+        key = (scope, collection)
+        self._matrices.pop(key, None)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def clear(self) -> None:
+        """Drop every matrix."""
+        for key in list(self._matrices):
+            self.invalidate(*key)
+
+
+# Create a global instance of the cache shared by all memory contexts
+embedding_matrix_cache = EmbeddingMatrixCache()
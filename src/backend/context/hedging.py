@@ -0,0 +1,177 @@
+# hedging.py
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from opentelemetry import metrics
+
+from app_config import config
+
+
+class _ReadStats:
+    """Latency samples and hedging counters of one kind of read."""
+
+    def __init__(self, window: int) -> None:
+        self.latencies_ms: Deque[float] = deque(maxlen=window)
+        self.delay_ms: Optional[float] = None
+        self.samples_since_update = 0
+        self.reads = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "reads": self.reads,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "denied": self.denied,
+            "hedge_rate": round(self.hedged / self.reads, 4) if self.reads else 0.0,
+            "win_rate": round(self.hedge_wins / self.hedged, 4) if self.hedged else 0.0,
+            "delay_ms": round(self.delay_ms, 2) if self.delay_ms is not None else None,
+        }
+
+
+class HedgePolicy:
+    """Hedged reads against the tail latency of Cosmos DB.
+
+    A read that has not returned after the ``percentile`` latency of the recent reads
+    of its kind is sent a second time, and the first successful response of the two
+    is used; the other request is cancelled. Until ``min_samples`` latencies are
+    known, and never below ``min_delay_ms``, reads are not hedged.
+
+    Hedges are paid for from a budget: every read earns ``budget`` of a hedge, up to
+    ``max_burst`` saved hedges, so hedging costs at most that fraction of extra reads
+    and request units even while the whole service is slow. Reads that would have
+    been hedged without budget are counted as denied.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_delay_ms: float = 2.0,
+        min_samples: int = 20,
+        window: int = 1000,
+        max_burst: float = 10.0,
+        meter_provider: Optional[metrics.MeterProvider] = None,
+    ) -> None:
+        self.enabled = enabled
+        self._percentile = percentile
+        self._budget = budget
+        self._min_delay_ms = min_delay_ms
+        self._min_samples = min_samples
+        self._window = window
+        self._max_burst = max_burst
+        self._tokens = 0.0
+        self._stats: Dict[str, _ReadStats] = {}
+        meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+        self._hedges = meter.create_counter(
+            "memory.read.hedges", unit="{request}", description="Hedged memory store reads"
+        )
+        self._hedge_wins = meter.create_counter(
+            "memory.read.hedge_wins", unit="{request}", description="Hedged reads answered by the hedge"
+        )
+
+    def _get_stats(self, name: str) -> _ReadStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _ReadStats(self._window)
+        return stats
+
+    def _record(self, stats: _ReadStats, started: float) -> None:
+        """Add the latency of a response, updating the hedge delay every few samples."""
+        stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+        stats.samples_since_update += 1
+        if len(stats.latencies_ms) < self._min_samples:
+            return
+        if stats.delay_ms is None or stats.samples_since_update >= self._min_samples:
+            ordered = sorted(stats.latencies_ms)
+            index = min(len(ordered) - 1, int(len(ordered) * self._percentile / 100))
+            stats.delay_ms = max(self._min_delay_ms, ordered[index])
+            stats.samples_since_update = 0
+
+    def _take_token(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def _timed(self, stats: _ReadStats, request: Awaitable[Any]) -> Any:
+        started = time.perf_counter()
+        result = await request
+        self._record(stats, started)
+        return result
+
+    async def run(self, name: str, read: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a read, hedging it if it is slow and the budget allows.
+
+        Args:
+            name: The kind of read, whose latencies set the hedge delay
+            read: Starts one request of the read, called again for the hedge. Called
+                from the caller's stack, so the instrumentation attributes both
+                requests to the calling method
+
+        Returns:
+            The first successful response
+
+        Raises:
+            Exception: The error of the first request, if every request failed
+        """
+        if not self.enabled:
+            return await read()
+
+        stats = self._get_stats(name)
+        stats.reads += 1
+        self._tokens = min(self._max_burst, self._tokens + self._budget)
+        if stats.delay_ms is None:
+            return await self._timed(stats, read())
+
+        primary = asyncio.ensure_future(self._timed(stats, read()))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=stats.delay_ms / 1000)
+            if done:
+                return primary.result()
+            if not self._take_token():
+                stats.denied += 1
+                return await primary
+
+            stats.hedged += 1
+            self._hedges.add(1, {"read": name})
+            hedge = asyncio.ensure_future(self._timed(stats, read()))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary, hedge):
+                    if task in done and task.exception() is None:
+                        if task is hedge:
+                            stats.hedge_wins += 1
+                            self._hedge_wins.add(1, {"read": name})
+                        return task.result()
+            # Both requests failed
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if task is None:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Retrieve the error of a losing request so it is not reported as unhandled
+                    task.exception()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get the hedge rate, win rate and current delay by kind of read."""
+        return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+
+# Create a global instance of the policy shared by all memory contexts
+hedge_policy = HedgePolicy(
+    enabled=config.COSMOSDB_HEDGED_READS,
+    percentile=config.COSMOSDB_HEDGE_PERCENTILE,
+    budget=config.COSMOSDB_HEDGE_BUDGET,
+)
@@ -0,0 +1,129 @@
+# indexing_policy.py
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from azure.cosmos.partition_key import PartitionKey
+
+# Document paths that are never filtered or sorted on. Texts, embeddings and the
+# maps of the view documents are only read back, so indexing them only adds to
+# the request charge of every write.
+EXCLUDED_PATHS = (
+    "/content/*",
+    "/agent_reply/*",
+    "/action/*",
+    "/updated_action/*",
+    "/human_feedback/*",
+    "/text/*",
+    "/description/*",
+    "/additional_metadata/*",
+    "/embedding/*",
+    "/initial_goal/*",
+    "/summary/*",
+    "/human_clarification_request/*",
+    "/human_clarification_response/*",
+    "/plans/*",
+    "/sessions/*",
+)
+
+# Equality filters followed by the _ts the listings are sorted by, in both directions
+COMPOSITE_INDEXES = tuple(
+    [
+        {"path": f"/{field}", "order": "ascending"},
+        {"path": "/data_type", "order": "ascending"},
+        {"path": "/_ts", "order": order},
+    ]
+    for field in ("user_id", "session_id")
+    for order in ("ascending", "descending")
+)
+
+MEMORY_INDEXING_POLICY: Dict[str, Any] = {
+    "indexingMode": "consistent",
+    "automatic": True,
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [{"path": path} for path in EXCLUDED_PATHS],
+    "compositeIndexes": [list(index) for index in COMPOSITE_INDEXES],
+}
+
+# Excluded path Cosmos DB adds to every policy
+_SYSTEM_EXCLUDED_PATHS = {'/"_etag"/?'}
+
+
+def _normalize(policy: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a policy to the parts that are compared, in a canonical order."""
+
+    def paths(key: str) -> List[str]:
+        return sorted(
+            entry["path"] for entry in policy.get(key, []) if entry["path"] not in _SYSTEM_EXCLUDED_PATHS
+        )
+
+    def composite(index: List[Dict[str, str]]) -> Tuple[Tuple[str, str], ...]:
+        return tuple((entry["path"], entry.get("order", "ascending").lower()) for entry in index)
+
+    return {
+        "indexingMode": policy.get("indexingMode", "consistent").lower(),
+        "includedPaths": paths("includedPaths"),
+        "excludedPaths": paths("excludedPaths"),
+        "compositeIndexes": sorted(composite(index) for index in policy.get("compositeIndexes", [])),
+    }
+
+
+def compare_indexing_policy(live: Dict[str, Any], expected: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Describe how a container's indexing policy differs from the expected one.
+
+    Args:
+        live: The indexing policy read from the container
+        expected: The policy it should have, MEMORY_INDEXING_POLICY by default
+
+    Returns:
+        One line per difference, empty if the policies match
+    """
+    live_policy = _normalize(live or {})
+    expected_policy = _normalize(expected or MEMORY_INDEXING_POLICY)
+    differences = []
+    if live_policy["indexingMode"] != expected_policy["indexingMode"]:
+        differences.append(
+            f"indexingMode is {live_policy['indexingMode']}, expected {expected_policy['indexingMode']}"
+        )
+    for key in ("includedPaths", "excludedPaths", "compositeIndexes"):
+        missing = [entry for entry in expected_policy[key] if entry not in live_policy[key]]
+        unexpected = [entry for entry in live_policy[key] if entry not in expected_policy[key]]
+        differences.extend(f"{key} is missing {entry}" for entry in missing)
+        differences.extend(f"{key} has unexpected {entry}" for entry in unexpected)
+    return differences
+
+
+async def verify_indexing_policy(container: Any) -> List[str]:
+    """Compare the indexing policy of a container with MEMORY_INDEXING_POLICY.
+
+    Returns:
+        The differences, see compare_indexing_policy
+    """
+    properties = await container.read()
+    return compare_indexing_policy(properties.get("indexingPolicy", {}))
+
+
+async def migrate_indexing_policy(database: Any, container_id: str) -> Dict[str, Any]:
+    """Replace the indexing policy of an existing container with MEMORY_INDEXING_POLICY.
+
+    Cosmos DB rebuilds the index online: the container stays readable and writable
+    while the transformation runs, and queries relying on new composite indexes
+    speed up once it completes.
+
+    Args:
+        database: The async DatabaseProxy holding the container
+        container_id: The container to migrate
+
+    Returns:
+        The container properties after the replace
+    """
+    container = database.get_container_client(container_id)
+    properties = await container.read()
+    paths = properties["partitionKey"]["paths"]
+    partition_key = PartitionKey(path=paths if len(paths) > 1 else paths[0], kind=properties["partitionKey"]["kind"])
+    replaced = await database.replace_container(
+        container_id,
+        partition_key=partition_key,
+        indexing_policy=MEMORY_INDEXING_POLICY,
+        default_ttl=properties.get("defaultTtl"),
+    )
+    return await replaced.read()
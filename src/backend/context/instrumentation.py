@@ -0,0 +1,204 @@
+# instrumentation.py
+
+import logging
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from opentelemetry import metrics, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from app_config import config
+
+# Modules whose frames are skipped when looking for the method that started an operation
+_WRAPPER_MODULES = ("context.throttling", "context.instrumentation")
+
+
+def calling_method(frame: Any = None) -> str:
+    """Find the memory store method an operation was started from.
+
+    Walks up the call stack past the container wrappers and returns the outermost
+    function of the context package, so a query sent by a shared helper such as
+    query_items is tagged with the method that called the helper.
+    """
+    frame = frame or sys._getframe(1)
+    method = "unknown"
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _WRAPPER_MODULES:
+            if not module.startswith("context."):
+                break
+            method = frame.f_code.co_name
+        frame = frame.f_back
+    return method
+
+
+class OperationRecord:
+    """Measurements of one Cosmos DB operation, completed by MemoryInstrumentation.finish."""
+
+    __slots__ = (
+        "method", "operation", "cross_partition", "query", "request_charge",
+        "result_count", "started", "span",
+    )
+
+    def __init__(self, method: str, operation: str, cross_partition: bool, query: Optional[str], span: Any) -> None:
+        self.method = method
+        self.operation = operation
+        self.cross_partition = cross_partition
+        self.query = query
+        self.request_charge = 0.0
+        self.result_count = 0
+        self.started = time.perf_counter()
+        self.span = span
+
+
+class MethodStats:
+    """Totals of the operations started by one method."""
+
+    def __init__(self) -> None:
+        self.operations = 0
+        self.duration_ms = 0.0
+        self.request_charge = 0.0
+        self.result_count = 0
+        self.slow = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "operations": self.operations,
+            "average_ms": round(self.duration_ms / self.operations, 2) if self.operations else 0.0,
+            "request_charge": round(self.request_charge, 2),
+            "result_count": self.result_count,
+            "slow": self.slow,
+        }
+
+
+class MemoryInstrumentation:
+    """Latency, request charge and result count of every memory store operation.
+
+    Each operation gets an OpenTelemetry client span and is recorded in three
+    histograms, attributed with the operation type, the memory store method that
+    started it and whether it was a cross-partition query. Totals per method and
+    operation are also kept in process for stats(). Operations slower than
+    ``slow_threshold_ms`` are logged with their query and kept in a bounded slow log.
+    """
+
+    def __init__(
+        self,
+        slow_threshold_ms: float = 500.0,
+        slow_log_size: int = 100,
+        tracer_provider: Optional[trace.TracerProvider] = None,
+        meter_provider: Optional[metrics.MeterProvider] = None,
+    ) -> None:
+        self._slow_threshold_ms = slow_threshold_ms
+        self._slow_log: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+        self._stats: Dict[Tuple[str, str], MethodStats] = {}
+        # The global providers unless given, no-ops until the app configures OpenTelemetry
+        self._tracer = trace.get_tracer(__name__, tracer_provider=tracer_provider)
+        meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+        self._duration = meter.create_histogram(
+            "memory.operation.duration", unit="ms", description="Duration of memory store operations"
+        )
+        self._request_charge = meter.create_histogram(
+            "memory.operation.request_charge", unit="RU", description="Request charge of memory store operations"
+        )
+        self._result_count = meter.create_histogram(
+            "memory.operation.result_count", unit="{item}", description="Items returned by memory store operations"
+        )
+
+    def start(
+        self,
+        operation: str,
+        method: Optional[str] = None,
+        cross_partition: bool = False,
+        query: Optional[str] = None,
+    ) -> OperationRecord:
+        """Start measuring an operation.
+
+        Args:
+            operation: The operation type, e.g. "read" or "query"
+            method: The calling memory store method, looked up from the call stack if None
+            cross_partition: Whether the query fans out across partitions
+            query: The query text, for the span and the slow log
+
+        Returns:
+            The record to add the charge and results to and to finish
+        """
+        method = method or calling_method(sys._getframe(1))
+        span = self._tracer.start_span(
+            f"cosmosdb {operation}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": "cosmosdb",
+                "db.operation.name": operation,
+                "code.function": method,
+                "db.cosmosdb.cross_partition": cross_partition,
+            },
+        )
+        if query is not None:
+            span.set_attribute("db.query.text", query)
+        return OperationRecord(method, operation, cross_partition, query, span)
+
+    def finish(self, record: OperationRecord, error: Optional[BaseException] = None) -> None:
+        """Record the measurements of a completed or failed operation."""
+        duration_ms = (time.perf_counter() - record.started) * 1000
+        status = "error" if error is not None else "ok"
+        attributes = {
+            "db.operation.name": record.operation,
+            "code.function": record.method,
+            "db.cosmosdb.cross_partition": record.cross_partition,
+            "status": status,
+        }
+        self._duration.record(duration_ms, attributes)
+        self._request_charge.record(record.request_charge, attributes)
+        self._result_count.record(record.result_count, attributes)
+
+        record.span.set_attribute("db.cosmosdb.request_charge", record.request_charge)
+        record.span.set_attribute("db.response.returned_rows", record.result_count)
+        if error is not None:
+            record.span.record_exception(error)
+            record.span.set_status(Status(StatusCode.ERROR, str(error)))
+        record.span.end()
+
+        stats = self._stats.get((record.method, record.operation))
+        if stats is None:
+            stats = self._stats[(record.method, record.operation)] = MethodStats()
+        stats.operations += 1
+        stats.duration_ms += duration_ms
+        stats.request_charge += record.request_charge
+        stats.result_count += record.result_count
+
+        if self._slow_threshold_ms > 0 and duration_ms >= self._slow_threshold_ms:
+            stats.slow += 1
+            entry = {
+                "method": record.method,
+                "operation": record.operation,
+                "duration_ms": round(duration_ms, 2),
+                "request_charge": round(record.request_charge, 2),
+                "result_count": record.result_count,
+                "cross_partition": record.cross_partition,
+                "query": record.query,
+                "status": status,
+                "at": time.time(),
+            }
+            self._slow_log.append(entry)
+            logging.warning(
+                f"Slow Cosmos DB {record.operation} from {record.method}: {duration_ms:.0f} ms, "
+                f"{record.request_charge:.2f} RU, {record.result_count} results, "
+                f"cross_partition={record.cross_partition}, query={record.query!r}"
+            )
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Get the totals by method and operation type."""
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (method, operation), stats in self._stats.items():
+            result.setdefault(method, {})[operation] = stats.to_dict()
+        return result
+
+    def slow_operations(self) -> List[Dict[str, Any]]:
+        """Get the most recent slow operations, oldest first."""
+        return list(self._slow_log)
+
+
+# Create a global instance of the instrumentation shared by all Cosmos DB containers
+memory_instrumentation = MemoryInstrumentation(slow_threshold_ms=config.COSMOSDB_SLOW_QUERY_MS)
@@ -0,0 +1,342 @@
+# large_text.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app_config import config
+
+try:
+    import zstandard
+except ImportError:  # zlib is used when zstandard is not installed
+    zstandard = None
+
+# First bytes of every zstd frame, zlib streams never start with them
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Key of the reference that replaces an offloaded text in a document
+BLOB_KEY = "$blob"
+
+
+def compress(data: bytes) -> bytes:
+    """Compress a blob with zstd, or with zlib when zstandard is not installed."""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress a blob written by compress, whichever codec it was written with.
+
+    Raises:
+        RuntimeError: If the blob is zstd compressed and zstandard is not installed
+    """
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd compressed blobs")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class MissingBlobError(LookupError):
+    """Raised when a document references a text that is not in the blob store."""
+
+
+def is_reference(value: Any) -> bool:
+    """Check whether a document value is a reference to an offloaded text."""
+    return type(value) is dict and BLOB_KEY in value
+
+
+class FileBlobStore:
+    """Content addressed blobs, one file per blob named by its digest.
+
+    Blobs never change once written, so a blob that already exists is not written
+    again, and concurrent writers of the same blob race harmlessly on the final
+    rename. Stands in for a blob container: with more than one replica the directory
+    must be shared by all of them, e.g. an Azure Files mount, or texts offloaded by
+    one replica can not be read by the others.
+
+    Reads and writes block, LargeTextStore runs them in worker threads.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self._directory, digest[:2], digest)
+
+    def put(self, digest: str, data: bytes) -> bool:
+        """Store a blob unless it already exists.
+
+        Returns:
+            True if the blob was written, False if it was already stored
+        """
+        path = self._path(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return True
+
+    def get(self, digest: str) -> bytes:
+        """Read a blob.
+
+        Raises:
+            FileNotFoundError: If the blob does not exist
+        """
+        with open(self._path(digest), "rb") as f:
+            return f.read()
+
+
+class DeferredText:
+    """Loader of a model field holding a text offloaded to a LargeTextStore.
+
+    LargeTextStore.resolve loads the texts of deferred fields in worker threads; a field
+    read before it was resolved loads its text from the calling thread.
+    """
+
+    def __init__(self, store: "LargeTextStore", reference: Dict[str, Any]) -> None:
+        self.store = store
+        self.reference = reference
+
+    def __call__(self) -> str:
+        return self.store.load_blocking(self.reference)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "DeferredText":
+        # Copies of a model share the store and its cache
+        return self
+
+
+class LargeTextStore:
+    """Keeps long texts out of memory store documents.
+
+    Top-level string fields of at least ``threshold`` characters are compressed and
+    stored once in a blob store under the SHA-256 of their text, and the document
+    keeps ``{"$blob": <digest>, "length": <characters>}`` in their place. An agent
+    reply written to its step and to an agent message is therefore stored once.
+
+    References in documents decoded into models become deferred fields, which the
+    memory contexts resolve with ``resolve`` before returning the models, so the
+    reads happen in worker threads rather than on the event loop. Listings that
+    project long fields away never touch the blob store. Loaded texts are kept in an
+    LRU cache bounded by ``cache_chars`` that writes fill too, so a text written and
+    read back by the same process is not read from the blob store. Compression and
+    blob writes run in worker threads as well.
+
+    A reference whose blob is missing, e.g. one offloaded by a replica that does not
+    share the blob directory, raises MissingBlobError when it is loaded, rather than
+    the document reading as missing.
+    """
+
+    def __init__(
+        self,
+        blob_store: Optional[FileBlobStore],
+        threshold: int = 16384,
+        cache_chars: int = 64 * 1024 * 1024,
+    ) -> None:
+        self._blob_store = blob_store
+        self._threshold = threshold
+        self._cache_chars = cache_chars
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cached_chars = 0
+
+        # Metrics
+        self.offloaded = 0
+        self.blobs_written = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._blob_store is not None and self._threshold > 0
+
+    def _remember(self, digest: str, text: str) -> None:
+        """Cache a text, evicting the least recently used ones beyond the bound."""
+        if digest in self._cache:
+            self._cache.move_to_end(digest)
+            return
+        if len(text) > self._cache_chars:
+            return
+        self._cache[digest] = text
+        self._cached_chars += len(text)
+        while self._cached_chars > self._cache_chars:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_chars -= len(evicted)
+
+    def _write_blob(self, digest: str, data: bytes) -> bool:
+        return self._blob_store.put(digest, compress(data))
+
+    def _read_blob(self, digest: str) -> str:
+        """Read and decompress a blob.
+
+        Raises:
+            MissingBlobError: If the blob is not in the blob store
+        """
+        try:
+            data = self._blob_store.get(digest)
+        except FileNotFoundError:
+            logging.error(f"Large text {digest} is referenced by a document but missing from the blob store")
+            raise MissingBlobError(f"Large text {digest} is missing from the blob store")
+        return decompress(data).decode("utf-8")
+
+    def _cached(self, digest: str) -> Optional[str]:
+        text = self._cache.get(digest)
+        if text is not None:
+            self.hits += 1
+            self._cache.move_to_end(digest)
+        else:
+            self.misses += 1
+        return text
+
+    async def store(self, text: str) -> Dict[str, Any]:
+        """Store a text in the blob store and get the reference that replaces it."""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self._cache and await asyncio.to_thread(self._write_blob, digest, data):
+            self.blobs_written += 1
+        self._remember(digest, text)
+        self.offloaded += 1
+        return {BLOB_KEY: digest, "length": len(text)}
+
+    async def load(self, reference: Dict[str, Any]) -> str:
+        """Get the text of a reference, from the cache if possible.
+
+        Raises:
+            MissingBlobError: If the text is not cached and its blob is missing
+        """
+        digest = reference[BLOB_KEY]
+        text = self._cached(digest)
+        if text is None:
+            text = await asyncio.to_thread(self._read_blob, digest)
+            self._remember(digest, text)
+        return text
+
+    def load_blocking(self, reference: Dict[str, Any]) -> str:
+        """Get the text of a reference from the calling thread, see load.
+
+        Only a fallback for deferred fields read before they were resolved, e.g. of
+        models decoded outside the async read paths of the memory contexts.
+        """
+        digest = reference[BLOB_KEY]
+        text = self._cached(digest)
+        if text is None:
+            text = self._read_blob(digest)
+            self._remember(digest, text)
+        return text
+
+    def _is_large(self, value: Any) -> bool:
+        return type(value) is str and len(value) >= self._threshold
+
+    async def offload(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the long texts of a document with references, in place.
+
+        Returns:
+            The document
+        """
+        if not self.enabled:
+            return document
+        for key, value in document.items():
+            if self._is_large(value):
+                document[key] = await self.store(value)
+        return document
+
+    async def offload_operations(self, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Replace the long texts set by top-level patch operations with references."""
+        if not self.enabled:
+            return operations
+        offloaded = []
+        for operation in operations:
+            if (
+                operation["op"] in ("add", "set", "replace")
+                and operation["path"].count("/") == 1
+                and self._is_large(operation.get("value"))
+            ):
+                operation = {**operation, "value": await self.store(operation["value"])}
+            offloaded.append(operation)
+        return offloaded
+
+    async def hydrate(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Get a document with its references replaced by their texts.
+
+        Documents without references are returned as is, the others are copied so that
+        the caller's document keeps its references.
+
+        Raises:
+            MissingBlobError: If a referenced text is missing from the blob store
+        """
+        if self._blob_store is None:
+            return document
+        keys = [key for key, value in document.items() if is_reference(value)]
+        if not keys:
+            return document
+        hydrated = dict(document)
+        for key in keys:
+            hydrated[key] = await self.load(document[key])
+        return hydrated
+
+    async def resolve(self, models: Iterable[Any]) -> None:
+        """Load the deferred texts of models in worker threads, each blob read once.
+
+        Args:
+            models: Models built by DocumentDecoder, see BaseDataModel.defer_fields
+
+        Raises:
+            MissingBlobError: If a referenced text is missing from the blob store
+        """
+        pending = [
+            (model, name, loader.reference)
+            for model in models
+            for name, loader in model.deferred_fields().items()
+            if isinstance(loader, DeferredText) and loader.store is self
+        ]
+        if not pending:
+            return
+        references = {reference[BLOB_KEY]: reference for _, _, reference in pending}
+        texts = dict(
+            zip(references, await asyncio.gather(*[self.load(r) for r in references.values()]))
+        )
+        for model, name, reference in pending:
+            model.set_deferred(name, texts[reference[BLOB_KEY]])
+
+    def defer(self, document: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Callable[[], str]]]:
+        """Split the references off a document so that they are loaded when first read.
+
+        Returns:
+            The document with an empty text in place of each reference, copied if it has
+            any, and the loaders of the referenced texts by field name, for
+            BaseDataModel.defer_fields
+        """
+        if self._blob_store is None:
+            return document, {}
+        loaders = {
+            key: DeferredText(self, value) for key, value in document.items() if is_reference(value)
+        }
+        if not loaders:
+            return document, loaders
+        return {**document, **{key: "" for key in loaders}}, loaders
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Get offload, blob write and cache counters."""
+        return {
+            "offloaded": self.offloaded,
+            "blobs_written": self.blobs_written,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_texts": len(self._cache),
+            "cached_chars": self._cached_chars,
+        }
+
+
+# Create a global instance of the store shared by all memory contexts
+large_text_store = LargeTextStore(
+    FileBlobStore(config.COSMOSDB_LARGE_TEXT_DIR) if config.COSMOSDB_LARGE_TEXT_OFFLOAD else None,
+    threshold=config.COSMOSDB_LARGE_TEXT_THRESHOLD,
+    cache_chars=config.COSMOSDB_LARGE_TEXT_CACHE_CHARS,
+)
@@ -0,0 +1,39 @@
+# memory_backend.py
+
+from typing import Any
+
+from app_config import config
+from context.cosmos_client_registry import cosmos_registry
+from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.sqlite_memory_kernel import SqliteMemoryContext, get_sqlite_container
+
+# Memory context implementations selectable with MEMORY_BACKEND
+MEMORY_BACKENDS = {"cosmos": CosmosMemoryContext, "sqlite": SqliteMemoryContext}
+
+
+def create_memory_context(session_id: str, user_id: str, **kwargs: Any) -> CosmosMemoryContext:
+    """Create the memory context of the backend selected by MEMORY_BACKEND.
+
+    Args:
+        session_id: The session the context is scoped to
+        user_id: The user the context belongs to
+        **kwargs: Backend specific options
+
+    Returns:
+        The memory context
+    """
+    backend = MEMORY_BACKENDS.get(config.MEMORY_BACKEND)
+    if backend is None:
+        raise ValueError(
+            f"Unknown memory backend {config.MEMORY_BACKEND!r}, expected one of {list(MEMORY_BACKENDS)}"
+        )
+    return backend(session_id, user_id, **kwargs)
+
+
+async def get_memory_container() -> Any:
+    """Get the shared container of the backend selected by MEMORY_BACKEND."""
+    if config.MEMORY_BACKEND == "sqlite":
+        return get_sqlite_container(config.SQLITE_DATABASE_PATH)
+    return await cosmos_registry.get_container(
+        config.COSMOSDB_ENDPOINT, config.COSMOSDB_DATABASE, config.COSMOSDB_CONTAINER
+    )
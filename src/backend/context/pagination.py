@@ -0,0 +1,68 @@
+# pagination.py
+
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Largest page a client may request from a listing endpoint
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor is malformed or was issued for a different query."""
+
+
+def query_scope(query: str, parameters: List[Dict[str, Any]], container: str = "") -> str:
+    """Get a short fingerprint of a query, its parameters and the container it runs on.
+
+    Cursors are bound to this fingerprint, so a cursor can only resume the query it
+    was issued for, and cursors issued before the memory container is moved to a new
+    container are rejected.
+    """
+    payload = json.dumps([query, parameters, container], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(state: Dict[str, Any], scope: str) -> str:
+    """Encode the state needed to resume a query as an opaque, URL safe cursor.
+
+    Args:
+        state: Backend specific resume state, e.g. a Cosmos DB continuation token
+        scope: The fingerprint of the query the cursor belongs to
+
+    Returns:
+        The opaque cursor
+    """
+    payload = json.dumps({"scope": scope, "state": state}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], scope: str) -> Optional[Dict[str, Any]]:
+    """Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: The opaque cursor, or None for the first page
+        scope: The fingerprint of the query being resumed
+
+    Returns:
+        The resume state, or None for the first page
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or belongs to another query
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload["scope"] != scope:
+            raise InvalidCursorError("Cursor does not belong to this query")
+        return payload["state"]
+    except InvalidCursorError:
+        raise
+    except Exception as e:
+        raise InvalidCursorError(f"Malformed cursor: {e}") from e
@@ -0,0 +1,145 @@
+# partitioning.py
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+from azure.cosmos.partition_key import PartitionKey
+
+from app_config import config
+
+# Partition key value of a document: the session_id, or [user_id, session_id]
+PartitionKeyValue = Union[str, List[str]]
+
+# System properties Cosmos DB sets on every document, dropped when copying documents
+SYSTEM_FIELDS = ("_rid", "_self", "_etag", "_attachments", "_ts", "_lsn")
+
+
+class PartitionLayout:
+    """How memory documents are partitioned in the container.
+
+    The "session" layout partitions on /session_id alone, so listings of a user's
+    plans, sessions or messages fan out across every partition. The "hierarchical"
+    layout partitions on [/user_id, /session_id]: documents of a session still share
+    a logical partition, and the documents of a user can be queried through the
+    [user_id] prefix, which Cosmos DB routes to the physical partitions holding that
+    user only.
+    """
+
+    SESSION = "session"
+    HIERARCHICAL = "hierarchical"
+
+    def __init__(self, name: str = SESSION) -> None:
+        if name not in (self.SESSION, self.HIERARCHICAL):
+            raise ValueError(
+                f"Unknown partition layout {name!r}, expected {self.SESSION!r} or {self.HIERARCHICAL!r}"
+            )
+        self.name = name
+
+    @property
+    def hierarchical(self) -> bool:
+        return self.name == self.HIERARCHICAL
+
+    @property
+    def paths(self) -> List[str]:
+        """The partition key paths of a container with this layout."""
+        return ["/user_id", "/session_id"] if self.hierarchical else ["/session_id"]
+
+    def partition_key(self) -> PartitionKey:
+        """The partition key definition to create a container with."""
+        if self.hierarchical:
+            return PartitionKey(path=self.paths, kind="MultiHash")
+        return PartitionKey(path=self.paths[0])
+
+    def key(self, user_id: str, session_id: str) -> PartitionKeyValue:
+        """The partition key value of the documents of a user's session."""
+        return [user_id, session_id] if self.hierarchical else session_id
+
+    def document_key(self, document: Dict[str, Any]) -> PartitionKeyValue:
+        """The partition key value of a document."""
+        return self.key(document.get("user_id", ""), document.get("session_id", ""))
+
+    def user_prefix(self, user_id: str) -> Optional[List[str]]:
+        """The partition key prefix of a user's documents, None if the layout has none."""
+        return [user_id] if self.hierarchical else None
+
+
+async def copy_documents(
+    source: Any,
+    target: Any,
+    lease_store: Any,
+    lease_name: str,
+    owner: str,
+    lease_duration: float = 300,
+    page_size: int = 100,
+) -> int:
+    """Copy the documents changed since the last checkpoint from one container to another.
+
+    Used to move the memory container to a new partition layout online: the change
+    feed of the source is read from the beginning, or from the checkpoint of the
+    previous run, and every document is upserted into the target, which computes its
+    new partition key from the document's user_id and session_id. Running the copy
+    again catches up with the writes made since, so the application keeps serving
+    from the source until the final catch-up before it is pointed at the target.
+
+    The change feed only has the latest version of each document and no deletes, so
+    documents deleted from the source after they were copied stay in the target.
+
+    Cosmos DB sets ``_ts`` when a document is written, so every copied document gets
+    the time of the copy as its ``_ts``. Listings order by ``_ts`` and ``since_ts``
+    filters compare against it: after the cut over, documents copied together list in
+    copy order rather than in the order they were written, and a ``since_ts`` from
+    before the copy matches every copied document. Cursors are bound to the container
+    name, so those issued against the source are rejected by the target.
+
+    Args:
+        source: The container to copy from
+        target: The container to copy to, created with the new partition layout
+        lease_store: The store keeping the checkpoint, see change_feed.FileLeaseStore
+        lease_name: The lease of this migration
+        owner: The process running the copy
+        lease_duration: Seconds the lease is held between pages
+        page_size: Number of documents read from the change feed per page
+
+    Returns:
+        The number of documents copied
+
+    Raises:
+        RuntimeError: If another process holds or takes over the lease
+    """
+    # The lease store blocks on file locks, keep it off the event loop
+    lease = await asyncio.to_thread(lease_store.acquire, lease_name, owner, lease_duration)
+    if lease is None:
+        raise RuntimeError(f"Lease {lease_name} is held by another process")
+
+    continuation = lease.get("continuation")
+    if continuation:
+        feed = source.query_items_change_feed(continuation=continuation, max_item_count=page_size)
+    else:
+        feed = source.query_items_change_feed(start_time="Beginning", max_item_count=page_size)
+
+    copied = 0
+    try:
+        pages = feed.by_page()
+        async for page in pages:
+            documents = [
+                {field: value for field, value in document.items() if field not in SYSTEM_FIELDS}
+                async for document in page
+            ]
+            await asyncio.gather(*[target.upsert_item(body=document) for document in documents])
+            copied += len(documents)
+            # Renew the lease before recording progress, a long copy outlives one lease
+            if await asyncio.to_thread(
+                lease_store.acquire, lease_name, owner, lease_duration
+            ) is None or not await asyncio.to_thread(
+                lease_store.checkpoint, lease_name, owner, pages.continuation_token
+            ):
+                raise RuntimeError(f"Lease {lease_name} was taken over by another process")
+            logging.info(f"Copied {copied} documents")
+    finally:
+        await asyncio.to_thread(lease_store.release, lease_name, owner)
+    return copied
+
+
+# Create a global instance of the layout the memory container is created with
+partition_layout = PartitionLayout(config.COSMOSDB_PARTITION_LAYOUT)
@@ -0,0 +1,223 @@
+# plan_cache.py
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from opentelemetry import metrics
+
+from app_config import config
+from models.messages_kernel import Plan, Step
+
+
+class _SessionEntry:
+    """Cached plan and steps of one user session."""
+
+    def __init__(self, expires_at: float) -> None:
+        self.expires_at = expires_at
+        self.plan: Optional[Plan] = None
+        self.plan_etag: Optional[str] = None
+        self.plan_id: Optional[str] = None
+        self.steps: Optional[Dict[str, Tuple[Step, Optional[str]]]] = None
+
+
+class PlanCache:
+    """Bounded per-session cache of plans and steps in front of Cosmos DB.
+
+    Entries are keyed by (user_id, session_id), evicted least recently used once
+    ``max_sessions`` is exceeded, and expire ``ttl_seconds`` after they were loaded.
+    The ``_etag`` of every cached document is kept so that writes can be made
+    conditional on it: a failed precondition means another writer changed the
+    document and the session entry must be invalidated.
+
+    Cached models are returned as copies, because callers mutate the steps they read
+    before writing them back.
+
+    Reads are not revalidated against Cosmos DB: within the TTL, a change made by
+    another process (another replica handling human feedback or a step update) is not
+    seen until the entry expires or a conditional write of this process fails. The
+    cache is therefore meant for single-replica deployments; set
+    ``COSMOSDB_PLAN_CACHE_TTL`` to 0 when the backend runs more than one replica.
+
+    Independently of the session entries, the cache keeps a bounded plan_id to
+    session_id index. A plan never moves to another session, so the index does not
+    expire and lets plan lookups target a single partition.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1024,
+        ttl_seconds: float = 30.0,
+        max_plan_ids: int = 10000,
+        meter_provider: Optional[metrics.MeterProvider] = None,
+    ) -> None:
+        self._max_sessions = max_sessions
+        self._ttl_seconds = ttl_seconds
+        self._max_plan_ids = max_plan_ids
+        self._entries: "OrderedDict[Tuple[str, str], _SessionEntry]" = OrderedDict()
+        self._plan_sessions: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+        self._hits = meter.create_counter(
+            "memory.plan_cache.hits", unit="{read}", description="Plan cache reads served from the cache"
+        )
+        self._misses = meter.create_counter(
+            "memory.plan_cache.misses", unit="{read}", description="Plan cache reads that went to the store"
+        )
+        self._evictions = meter.create_counter(
+            "memory.plan_cache.evictions", unit="{session}", description="Sessions evicted from the plan cache"
+        )
+
+    def _record_hit(self, kind: str) -> None:
+        self.hits += 1
+        self._hits.add(1, {"item": kind})
+
+    def _record_miss(self, kind: str) -> None:
+        self.misses += 1
+        self._misses.add(1, {"item": kind})
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl_seconds > 0 and self._max_sessions > 0
+
+    def _get_entry(self, user_id: str, session_id: str) -> Optional[_SessionEntry]:
+        """Get a live entry and mark it as recently used."""
+        key = (user_id, session_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_or_create_entry(self, user_id: str, session_id: str) -> _SessionEntry:
+        entry = self._get_entry(user_id, session_id)
+        if entry is None:
+            entry = _SessionEntry(time.monotonic() + self._ttl_seconds)
+            self._entries[(user_id, session_id)] = entry
+            while len(self._entries) > self._max_sessions:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+                self._evictions.add(1)
+        return entry
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+
+    def remember_plan_session(self, user_id: str, plan_id: str, session_id: str) -> None:
+        """Record which session (and therefore partition) a plan belongs to."""
+        key = (user_id, plan_id)
+        self._plan_sessions[key] = session_id
+        self._plan_sessions.move_to_end(key)
+        while len(self._plan_sessions) > self._max_plan_ids:
+            self._plan_sessions.popitem(last=False)
+
+    def get_plan_session(self, user_id: str, plan_id: str) -> Optional[str]:
+        """Get the session a plan belongs to, if known."""
+        return self._plan_sessions.get((user_id, plan_id))
+
+    def get_plan(self, user_id: str, session_id: str) -> Optional[Plan]:
+        """Get the cached plan of a session, or None on a miss."""
+        entry = self._get_entry(user_id, session_id)
+        if entry is None or entry.plan is None:
+            self._record_miss("plan")
+            return None
+        self._record_hit("plan")
+        return entry.plan.model_copy()
+
+    def put_plan(self, user_id: str, plan: Plan, etag: Optional[str]) -> None:
+        """Store the plan of a session together with its etag."""
+        if not self.enabled:
+            self.remember_plan_session(user_id, plan.id, plan.session_id)
+            return
+        entry = self._get_or_create_entry(user_id, plan.session_id)
+        entry.plan = plan.model_copy()
+        entry.plan_etag = etag
+        entry.plan_id = plan.id
+        self.remember_plan_session(user_id, plan.id, plan.session_id)
+
+    def get_steps(self, user_id: str, plan_id: str) -> Optional[List[Step]]:
+        """Get the cached steps of a plan, or None on a miss."""
+        session_id = self.get_plan_session(user_id, plan_id)
+        entry = self._get_entry(user_id, session_id) if session_id else None
+        if entry is None or entry.steps is None:
+            self._record_miss("steps")
+            return None
+        self._record_hit("steps")
+        return [step.model_copy() for step, _ in entry.steps.values()]
+
+    def put_steps(
+        self, user_id: str, session_id: str, plan_id: str, steps: List[Tuple[Step, Optional[str]]]
+    ) -> None:
+        """Store the full list of steps of a plan together with their etags."""
+        if not self.enabled:
+            self.remember_plan_session(user_id, plan_id, session_id)
+            return
+        entry = self._get_or_create_entry(user_id, session_id)
+        entry.steps = {step.id: (step.model_copy(), etag) for step, etag in steps}
+        entry.plan_id = plan_id
+        self.remember_plan_session(user_id, plan_id, session_id)
+
+    def get_step(self, user_id: str, session_id: str, step_id: str) -> Optional[Step]:
+        """Get a single cached step, or None on a miss."""
+        entry = self._get_entry(user_id, session_id)
+        cached = entry.steps.get(step_id) if entry is not None and entry.steps else None
+        if cached is None:
+            self._record_miss("step")
+            return None
+        self._record_hit("step")
+        return cached[0].model_copy()
+
+    def put_step(self, user_id: str, step: Step, etag: Optional[str]) -> None:
+        """Replace a step in an already cached step list."""
+        entry = self._get_entry(user_id, step.session_id)
+        if entry is not None and entry.steps is not None:
+            entry.steps[step.id] = (step.model_copy(), etag)
+
+    def get_etag(self, user_id: str, session_id: str, item_id: str) -> Optional[str]:
+        """Get the etag of a cached plan or step."""
+        entry = self._get_entry(user_id, session_id)
+        if entry is None:
+            return None
+        if entry.plan is not None and entry.plan.id == item_id:
+            return entry.plan_etag
+        if entry.steps and item_id in entry.steps:
+            return entry.steps[item_id][1]
+        return None
+
+    def invalidate(self, user_id: str, session_id: str) -> None:
+        """Drop everything cached for a session."""
+        self._remove((user_id, session_id))
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop every session cached for a user."""
+        for key in [key for key in self._entries if key[0] == user_id]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
+        self._plan_sessions.clear()
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Get hit, miss and eviction counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "sessions": len(self._entries),
+        }
+
+
+# Create a global instance of the cache shared by all memory contexts
+plan_cache = PlanCache(
+    max_sessions=config.COSMOSDB_PLAN_CACHE_SIZE,
+    ttl_seconds=config.COSMOSDB_PLAN_CACHE_TTL,
+)
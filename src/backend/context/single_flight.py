@@ -0,0 +1,92 @@
+# single_flight.py
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from app_config import config
+
+
+class SingleFlight:
+    """Runs an async initialization once, shared by every concurrent caller.
+
+    Callers arriving while an attempt is in flight wait for it instead of starting
+    their own, so a burst of requests on a cold worker opens one connection rather
+    than one per request. The result of a successful attempt is kept. A failure is kept
+    as well: until its retry delay has passed, callers get a RuntimeError chained from
+    it without a new attempt, each its own so that concurrent handlers never share
+    one exception object. The delay starts at ``base_delay`` and doubles with every
+    consecutive failure up to ``max_delay``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_delay: float = config.COSMOSDB_INIT_RETRY_SECONDS,
+        max_delay: float = config.COSMOSDB_INIT_RETRY_MAX_SECONDS,
+    ) -> None:
+        self._name = name
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._lock = asyncio.Lock()
+        self._done = False
+        self._result: Any = None
+        self._error: Optional[Exception] = None
+        self._retry_at = 0.0
+        self._consecutive_failures = 0
+
+        # Metrics
+        self.attempts = 0
+        self.failures = 0
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    async def run(self, initialize: Callable[[], Awaitable[Any]]) -> Any:
+        """Get the result of the initialization, running it if no attempt is due yet.
+
+        Args:
+            initialize: Coroutine function performing the initialization
+
+        Returns:
+            The result of the successful attempt
+
+        Raises:
+            Exception: The error of the attempt run by this call
+            RuntimeError: While the retry delay of the last failed attempt lasts, chained
+                from the error of that attempt
+        """
+        if self._done:
+            return self._result
+
+        async with self._lock:
+            # The attempt we waited for may have settled it either way
+            if self._done:
+                return self._result
+            if self._error is not None and time.monotonic() < self._retry_at:
+                raise RuntimeError(
+                    f"Initialization of {self._name} failed, next attempt in "
+                    f"{self._retry_at - time.monotonic():.1f}s"
+                ) from self._error
+
+            self.attempts += 1
+            try:
+                result = await initialize()
+            except Exception as e:
+                self.failures += 1
+                self._consecutive_failures += 1
+                delay = min(
+                    self._max_delay, self._base_delay * 2 ** (self._consecutive_failures - 1)
+                )
+                self._error = e
+                self._retry_at = time.monotonic() + delay
+                logging.error(f"Initialization of {self._name} failed, next attempt in {delay:.1f}s: {e}")
+                raise
+
+            self._result = result
+            self._done = True
+            self._error = None
+            self._consecutive_failures = 0
+            return result
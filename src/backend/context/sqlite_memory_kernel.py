@@ -0,0 +1,544 @@
+# sqlite_memory_kernel.py
+
+import json
+import re
+import sqlite3
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from app_config import config
+from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.partitioning import PartitionKeyValue
+
+# Document fields stored as columns, so filters and ordering on them can use the indexes
+COLUMNS = ("id", "session_id", "user_id", "data_type", "_ts", "_etag")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    session_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    user_id TEXT,
+    data_type TEXT,
+    _ts INTEGER NOT NULL,
+    _etag TEXT NOT NULL,
+    body TEXT NOT NULL,
+    _lsn INTEGER NOT NULL,
+    PRIMARY KEY (session_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_items_lsn ON items (_lsn);
+CREATE INDEX IF NOT EXISTS idx_items_session ON items (session_id, data_type, user_id, _ts);
+CREATE INDEX IF NOT EXISTS idx_items_user ON items (user_id, data_type, _ts);
+CREATE INDEX IF NOT EXISTS idx_items_plan ON items (json_extract(body, '$.plan_id'), data_type);
+"""
+
+_QUERY_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?P<distinct>DISTINCT\s+)?(?P<projection>.+?)\s+FROM\s+c\b"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+OFFSET\s+(?P<offset>\S+)\s+LIMIT\s+(?P<limit>\S+))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_PATH_PATTERN = re.compile(r"\bc\.([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)")
+_ARRAY_CONTAINS_PATTERN = re.compile(r"ARRAY_CONTAINS\(\s*@(\w+)\s*,\s*(c\.[\w.]+)\s*\)", re.IGNORECASE)
+_IS_DEFINED_PATTERN = re.compile(r"IS_DEFINED\(\s*c\.([\w.]+)\s*\)", re.IGNORECASE)
+
+
+def _column(path: str) -> str:
+    """Get the SQLite expression of a document path."""
+    if path in COLUMNS:
+        return path
+    return f"json_extract(body, '$.{path}')"
+
+
+def _partition_columns(partition_key: PartitionKeyValue) -> List[Tuple[str, Any]]:
+    """Get the columns a session_id, or a hierarchical key or key prefix, constrains."""
+    if isinstance(partition_key, (list, tuple)):
+        return list(zip(("user_id", "session_id"), partition_key))
+    return [("session_id", partition_key)]
+
+
+def _session_of(partition_key: Optional[PartitionKeyValue]) -> Optional[str]:
+    """Get the session_id of the partition a point operation addresses."""
+    return dict(_partition_columns(partition_key)).get("session_id")
+
+
+def translate_query(
+    query: str, parameters: Optional[List[Dict[str, Any]]], partition_key: Optional[PartitionKeyValue]
+) -> Tuple[str, Dict[str, Any], Optional[List[str]], bool]:
+    """Translate a Cosmos DB SQL query to SQLite.
+
+    Supports the subset the memory contexts use: ``SELECT *`` or a list of ``c.field``
+    projections, optionally DISTINCT, a WHERE clause of comparisons, IN lists,
+    ARRAY_CONTAINS and IS_DEFINED, ORDER BY and OFFSET/LIMIT.
+
+    Args:
+        query: The Cosmos DB SQL query
+        parameters: The query parameters
+        partition_key: Optional partition key the query is scoped to
+
+    Returns:
+        The SQLite query, its parameters, the projected fields (None for every field)
+        and whether the rows must be distinct
+
+    Raises:
+        ValueError: If the query uses syntax outside the supported subset
+    """
+    match = _QUERY_PATTERN.match(query)
+    if match is None:
+        raise ValueError(f"Unsupported query: {query}")
+
+    projection = None
+    if match.group("projection").strip() != "*":
+        projection = []
+        for field in match.group("projection").split(","):
+            field_match = re.fullmatch(r"\s*c\.([\w.]+)\s*", field)
+            if field_match is None:
+                raise ValueError(f"Unsupported projection: {field}")
+            projection.append(field_match.group(1))
+
+    def translate(clause: str) -> str:
+        clause = _ARRAY_CONTAINS_PATTERN.sub(
+            lambda m: f"{m.group(2)} IN (SELECT value FROM json_each(@{m.group(1)}))", clause
+        )
+        clause = _IS_DEFINED_PATTERN.sub(
+            lambda m: f"json_type(body, '$.{m.group(1)}') IS NOT NULL", clause
+        )
+        clause = _PATH_PATTERN.sub(lambda m: _column(m.group(1)), clause)
+        return re.sub(r"@(\w+)", r":\1", clause)
+
+    sql_parameters: Dict[str, Any] = {}
+    for parameter in parameters or []:
+        value = parameter["value"]
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value)
+        sql_parameters[parameter["name"].lstrip("@")] = value
+
+    conditions = []
+    if partition_key is not None:
+        for column, value in _partition_columns(partition_key):
+            conditions.append(f"{column} = :__partition_{column}")
+            sql_parameters[f"__partition_{column}"] = value
+    if match.group("where"):
+        conditions.append(f"({translate(match.group('where'))})")
+
+    sql = "SELECT body, _ts, _etag FROM items"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if match.group("order"):
+        order = translate(match.group("order"))
+        # Break _ts ties by insertion order, as Cosmos DB would by commit order
+        direction = "DESC" if order.rstrip().upper().endswith("DESC") else "ASC"
+        sql += f" ORDER BY {order}, rowid {direction}"
+    else:
+        sql += " ORDER BY rowid"
+    if match.group("limit"):
+        sql += f" LIMIT {translate(match.group('limit'))} OFFSET {translate(match.group('offset'))}"
+    return sql, sql_parameters, projection, bool(match.group("distinct"))
+
+
+def _project(document: Dict[str, Any], projection: Optional[List[str]]) -> Dict[str, Any]:
+    """Keep the projected fields of a document, leaving out undefined ones like Cosmos DB."""
+    if projection is None:
+        return document
+    result = {}
+    for path in projection:
+        value: Any = document
+        for part in path.split("."):
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            result[path.split(".")[-1]] = value
+    return result
+
+
+def _apply_patch(document: Dict[str, Any], operations: List[Dict[str, Any]]) -> None:
+    """Apply Cosmos DB patch operations to a document in place."""
+    for operation in operations:
+        *parents, name = operation["path"].strip("/").split("/")
+        target = document
+        for part in parents:
+            target = target.setdefault(part, {})
+        op = operation["op"]
+        if op in ("add", "set", "replace"):
+            if op == "replace" and name not in target:
+                raise CosmosHttpResponseError(status_code=400, message=f"Path {operation['path']} not found")
+            target[name] = operation["value"]
+        elif op == "remove":
+            target.pop(name, None)
+        elif op == "incr":
+            target[name] = target.get(name, 0) + operation["value"]
+        else:
+            raise ValueError(f"Unsupported patch operation {op}")
+
+
+class SqliteQueryIterable:
+    """Query results with the iteration interface of the Cosmos DB async query iterable."""
+
+    def __init__(
+        self,
+        container: "SqliteContainer",
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]],
+        partition_key: Optional[PartitionKeyValue],
+        max_item_count: Optional[int],
+    ) -> None:
+        self._container = container
+        self._sql, self._parameters, self._projection, self._distinct = translate_query(
+            query, parameters, partition_key
+        )
+        self._page_size = max_item_count
+
+    def _rows(self, offset: int = 0, limit: int = -1) -> List[Dict[str, Any]]:
+        sql = f"SELECT * FROM ({self._sql}) LIMIT {int(limit)} OFFSET {int(offset)}"
+        rows = self._container._connection.execute(sql, self._parameters).fetchall()
+        documents = [
+            _project(self._container._document(body, ts, etag), self._projection)
+            for body, ts, etag in rows
+        ]
+        if self._distinct:
+            unique = {json.dumps(document, sort_keys=True): document for document in documents}
+            documents = list(unique.values())
+        return documents
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        for document in self._rows():
+            yield document
+
+    def by_page(self, continuation_token: Optional[str] = None) -> "SqlitePageIterator":
+        """Iterate the results page by page, resuming from a continuation token."""
+        return SqlitePageIterator(self, continuation_token)
+
+
+class SqlitePageIterator:
+    """Pages of a SqliteQueryIterable, exposing the token of the next page like Cosmos DB."""
+
+    # Page size when the query did not set max_item_count
+    DEFAULT_PAGE_SIZE = 100
+
+    def __init__(self, results: SqliteQueryIterable, continuation_token: Optional[str]) -> None:
+        self._results = results
+        self.continuation_token = continuation_token
+
+    async def __aiter__(self) -> AsyncIterator[AsyncIterator[Dict[str, Any]]]:
+        offset = int(self.continuation_token or 0)
+        size = self._results._page_size or self.DEFAULT_PAGE_SIZE
+        while True:
+            documents = self._results._rows(offset, size + 1)
+            offset += size
+            more = len(documents) > size
+            self.continuation_token = str(offset) if more else None
+            yield _async_iter(documents[:size])
+            if not more:
+                return
+
+
+async def _async_iter(items: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    for item in items:
+        yield item
+
+
+class SqliteChangeFeed:
+    """Change feed of a SqliteContainer, with the paging interface of the Cosmos DB change feed.
+
+    Continuation tokens are change sequence numbers. Deletes are not in the feed,
+    like the latest version mode of Cosmos DB.
+    """
+
+    # Page size when the feed was opened without max_item_count
+    DEFAULT_PAGE_SIZE = 100
+
+    def __init__(self, container: "SqliteContainer", start: int, max_item_count: Optional[int]) -> None:
+        self._container = container
+        self._start = start
+        self._page_size = max_item_count or self.DEFAULT_PAGE_SIZE
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        async for page in self.by_page():
+            async for document in page:
+                yield document
+
+    def by_page(self, continuation_token: Optional[str] = None) -> "SqliteChangeFeedPages":
+        """Iterate the changes a page at a time, resuming from a continuation token."""
+        start = int(continuation_token) if continuation_token is not None else self._start
+        return SqliteChangeFeedPages(self, start)
+
+    def _changes(self, after: int) -> List[Tuple[str, int, str, int]]:
+        return self._container._connection.execute(
+            "SELECT body, _ts, _etag, _lsn FROM items WHERE _lsn > ? ORDER BY _lsn LIMIT ?",
+            (after, self._page_size),
+        ).fetchall()
+
+
+class SqliteChangeFeedPages:
+    """Pages of a SqliteChangeFeed, continuation_token is updated after each page."""
+
+    def __init__(self, feed: SqliteChangeFeed, start: int) -> None:
+        self._feed = feed
+        self.continuation_token: Optional[str] = str(start)
+
+    async def __aiter__(self) -> AsyncIterator[AsyncIterator[Dict[str, Any]]]:
+        after = int(self.continuation_token)
+        while True:
+            rows = self._feed._changes(after)
+            if not rows:
+                return
+            after = rows[-1][3]
+            self.continuation_token = str(after)
+            yield _async_iter([self._feed._container._document(body, ts, etag) for body, ts, etag, _ in rows])
+
+
+class SqliteContainer:
+    """A Cosmos DB container stand-in stored in one SQLite table.
+
+    Implements the async ContainerProxy methods CosmosMemoryContext uses with the
+    same semantics: documents are partitioned by session_id, every write sets _ts and
+    a new _etag, conditional writes fail with the same exceptions, and transactional
+    batches run in one SQLite transaction.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # Autocommit, transactional batches open their own transaction
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    @staticmethod
+    def _document(body: str, ts: int, etag: str) -> Dict[str, Any]:
+        document = json.loads(body)
+        document["_ts"] = ts
+        document["_etag"] = etag
+        return document
+
+    def _read(self, item_id: str, partition_key: Optional[PartitionKeyValue]) -> Optional[Dict[str, Any]]:
+        row = self._connection.execute(
+            "SELECT body, _ts, _etag FROM items WHERE session_id = ? AND id = ?",
+            (_session_of(partition_key) or "", item_id),
+        ).fetchone()
+        return self._document(*row) if row else None
+
+    def _write(self, body: Dict[str, Any], create: bool = False) -> Dict[str, Any]:
+        document = {k: v for k, v in body.items() if k not in ("_ts", "_etag", "_rid", "_self", "_attachments")}
+        if "id" not in document:
+            raise CosmosHttpResponseError(status_code=400, message="Document has no id")
+        ts, etag = int(time.time()), f'"{uuid.uuid4()}"'
+        body = json.dumps(document, default=str)
+        values = (
+            document.get("session_id") or "",
+            document["id"],
+            document.get("user_id"),
+            document.get("data_type"),
+            ts,
+            etag,
+            body,
+        )
+        # Every write gets the next change feed sequence number
+        insert = (
+            "INSERT INTO items (session_id, id, user_id, data_type, _ts, _etag, body, _lsn) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(_lsn), 0) + 1 FROM items))"
+        )
+        try:
+            if create:
+                self._connection.execute(insert, values)
+            else:
+                self._connection.execute(
+                    insert + " ON CONFLICT (session_id, id) DO UPDATE SET "
+                    "user_id = excluded.user_id, data_type = excluded.data_type, _ts = excluded._ts, "
+                    "_etag = excluded._etag, body = excluded.body, _lsn = excluded._lsn",
+                    values,
+                )
+        except sqlite3.IntegrityError:
+            raise CosmosResourceExistsError(status_code=409, message=f"Document {document['id']} already exists")
+        return self._document(body, ts, etag)
+
+    def _check_etag(
+        self, current: Optional[Dict[str, Any]], etag: Optional[str], match_condition: Optional[MatchConditions]
+    ) -> None:
+        if etag and match_condition == MatchConditions.IfNotModified:
+            if current is None or current["_etag"] != etag:
+                raise CosmosAccessConditionFailedError(status_code=412, message="Etag does not match")
+
+    def _require(self, item_id: str, partition_key: Optional[PartitionKeyValue]) -> Dict[str, Any]:
+        document = self._read(item_id, partition_key)
+        if document is None:
+            raise CosmosResourceNotFoundError(status_code=404, message=f"Document {item_id} not found")
+        return document
+
+    def _delete(self, item_id: str, partition_key: Optional[PartitionKeyValue]) -> None:
+        cursor = self._connection.execute(
+            "DELETE FROM items WHERE session_id = ? AND id = ?", (_session_of(partition_key) or "", item_id)
+        )
+        if cursor.rowcount == 0:
+            raise CosmosResourceNotFoundError(status_code=404, message=f"Document {item_id} not found")
+
+    def _patch(
+        self, item_id: str, partition_key: Optional[PartitionKeyValue], operations: List[Dict[str, Any]], etag=None, match_condition=None
+    ) -> Dict[str, Any]:
+        document = self._require(item_id, partition_key)
+        self._check_etag(document, etag, match_condition)
+        _apply_patch(document, operations)
+        return self._write(document)
+
+    # ContainerProxy interface
+
+    async def read_item(self, item: str, partition_key: Optional[PartitionKeyValue], **kwargs: Any) -> Dict[str, Any]:
+        return self._require(item, partition_key)
+
+    async def create_item(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        return self._write(body, create=True)
+
+    async def upsert_item(
+        self, body: Dict[str, Any], etag: Optional[str] = None, match_condition: Optional[MatchConditions] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        self._check_etag(self._read(body.get("id"), body.get("session_id")), etag, match_condition)
+        return self._write(body)
+
+    async def replace_item(
+        self, item: str, body: Dict[str, Any], etag: Optional[str] = None,
+        match_condition: Optional[MatchConditions] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        self._check_etag(self._require(item, body.get("session_id")), etag, match_condition)
+        return self._write(body)
+
+    async def patch_item(
+        self, item: str, partition_key: Optional[PartitionKeyValue], patch_operations: List[Dict[str, Any]],
+        etag: Optional[str] = None, match_condition: Optional[MatchConditions] = None, **kwargs: Any
+    ) -> Dict[str, Any]:
+        return self._patch(item, partition_key, patch_operations, etag, match_condition)
+
+    async def delete_item(self, item: str, partition_key: Optional[PartitionKeyValue], **kwargs: Any) -> None:
+        self._delete(item, partition_key)
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        partition_key: Optional[PartitionKeyValue] = None,
+        max_item_count: Optional[int] = None,
+        **kwargs: Any,
+    ) -> SqliteQueryIterable:
+        return SqliteQueryIterable(self, query, parameters, partition_key, max_item_count)
+
+    def query_items_change_feed(
+        self,
+        start_time: Optional[str] = None,
+        continuation: Optional[str] = None,
+        max_item_count: Optional[int] = None,
+        **kwargs: Any,
+    ) -> "SqliteChangeFeed":
+        """Read the latest version of every document changed since a continuation token."""
+        if continuation is not None:
+            start = int(continuation)
+        elif start_time == "Beginning":
+            start = 0
+        else:
+            start = self._connection.execute("SELECT COALESCE(MAX(_lsn), 0) FROM items").fetchone()[0]
+        return SqliteChangeFeed(self, start, max_item_count)
+
+    async def execute_item_batch(
+        self, batch_operations: List[Tuple[Any, ...]], partition_key: Optional[PartitionKeyValue], **kwargs: Any
+    ) -> List[Dict[str, Any]]:
+        """Run batch operations atomically, rolling all of them back if one fails."""
+        results: List[Dict[str, Any]] = []
+        self._connection.execute("BEGIN")
+        try:
+            for index, operation in enumerate(batch_operations):
+                name, args = operation[0], operation[1]
+                options = operation[2] if len(operation) > 2 else {}
+                try:
+                    results.append(self._batch_operation(name, args, options, partition_key))
+                except CosmosHttpResponseError as e:
+                    responses = [{"statusCode": 424} for _ in batch_operations]
+                    responses[index] = {"statusCode": e.status_code}
+                    raise CosmosBatchOperationError(
+                        error_index=index,
+                        headers={},
+                        status_code=e.status_code,
+                        message=f"Batch operation {index} ({name}) failed: {e.message}",
+                        operation_responses=responses,
+                    )
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+        return results
+
+    def _batch_operation(
+        self, name: str, args: Tuple[Any, ...], options: Dict[str, Any], partition_key: Optional[PartitionKeyValue]
+    ) -> Dict[str, Any]:
+        etag = options.get("if_match_etag")
+        condition = MatchConditions.IfNotModified if etag else None
+        if name in ("create", "upsert", "replace"):
+            body = args[0]
+            if (body.get("session_id") or "") != (_session_of(partition_key) or ""):
+                raise CosmosHttpResponseError(status_code=400, message="Partition key mismatch")
+            current = self._read(body["id"], partition_key)
+            if name == "replace" and current is None:
+                raise CosmosResourceNotFoundError(status_code=404, message=f"Document {body['id']} not found")
+            self._check_etag(current, etag, condition)
+            document = self._write(body, create=name == "create")
+            status = 201 if name == "create" or current is None else 200
+        elif name == "patch":
+            document = self._patch(args[0], partition_key, args[1], etag, condition)
+            status = 200
+        elif name == "delete":
+            self._check_etag(self._require(args[0], partition_key), etag, condition)
+            self._delete(args[0], partition_key)
+            return {"statusCode": 204, "requestCharge": 0.0}
+        elif name == "read":
+            document = self._require(args[0], partition_key)
+            status = 200
+        else:
+            raise ValueError(f"Unsupported batch operation {name}")
+        return {"statusCode": status, "requestCharge": 0.0, "eTag": document["_etag"], "resourceBody": document}
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+# SQLite containers of this process by database path
+_containers: Dict[str, SqliteContainer] = {}
+
+
+def get_sqlite_container(path: str) -> SqliteContainer:
+    """Get the process-wide container of a SQLite database, opening it on first use."""
+    container = _containers.get(path)
+    if container is None:
+        container = _containers[path] = SqliteContainer(path)
+    return container
+
+
+def close_sqlite_containers() -> None:
+    """Close every SQLite database opened by this process."""
+    for container in _containers.values():
+        container.close()
+    _containers.clear()
+
+
+class SqliteMemoryContext(CosmosMemoryContext):
+    """A CosmosMemoryContext stored in a local SQLite database instead of Cosmos DB.
+
+    Every method of CosmosMemoryContext, including pagination, step counters,
+    transactional batches and vector search, runs unchanged against a SqliteContainer.
+    Meant for development, CI load tests and single node deployments.
+    """
+
+    def __init__(self, session_id: str, user_id: str, database_path: Optional[str] = None, **kwargs: Any) -> None:
+        super().__init__(session_id, user_id, **kwargs)
+        self._database_path = database_path or config.SQLITE_DATABASE_PATH
+
+    async def initialize(self):
+        """Initialize the memory context using the SQLite database."""
+        self._container = get_sqlite_container(self._database_path)
@@ -0,0 +1,400 @@
+# throttling.py
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from azure.cosmos.exceptions import CosmosHttpResponseError, CosmosResourceNotFoundError
+
+from app_config import config
+from context.instrumentation import (
+    MemoryInstrumentation,
+    OperationRecord,
+    calling_method,
+    memory_instrumentation,
+)
+
+# Headers of Cosmos DB responses
+REQUEST_CHARGE_HEADER = "x-ms-request-charge"
+RETRY_AFTER_HEADER = "x-ms-retry-after-ms"
+
+
+class RequestUnitBudget:
+    """Client-side token bucket of request units per second.
+
+    Charges are only known once an operation completes, so callers record them
+    afterwards and the bucket may go into debt. ``acquire`` waits, in arrival order,
+    until the debt is paid back, which makes bursts queue briefly instead of running
+    into 429 responses. A budget of 0 disables throttling.
+    """
+
+    def __init__(self, request_units_per_second: float) -> None:
+        self._rate = request_units_per_second
+        self._available = request_units_per_second
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._available = min(
+            self._rate, self._available + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Wait while the budget is overdrawn."""
+        if self._rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self._available < 0:
+                await asyncio.sleep(-self._available / self._rate)
+                self._refill()
+
+    def record(self, request_charge: float) -> None:
+        """Take the charge of a completed operation from the budget."""
+        if self._rate <= 0:
+            return
+        self._refill()
+        self._available -= request_charge
+
+    async def spend(self, request_charge: float) -> None:
+        """Record a request charge, waiting while the budget is overdrawn."""
+        self.record(request_charge)
+        await self.acquire()
+
+
+class OperationStats:
+    """Request charge and throttling counters of one operation type."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.request_charge = 0.0
+        self.throttled = 0
+        self.failed = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "request_charge": round(self.request_charge, 2),
+            "average_charge": round(self.request_charge / self.requests, 2) if self.requests else 0.0,
+            "throttled": self.throttled,
+            "failed": self.failed,
+        }
+
+
+class ThrottlingPolicy:
+    """Retry throttled Cosmos DB operations and pace all of them to the provisioned RU/s.
+
+    Every operation waits for the shared RequestUnitBudget before it is sent and its
+    request charge, taken from the response headers, is paid from the budget and
+    counted per operation type. Throttled (429) operations are retried after the
+    x-ms-retry-after-ms delay Cosmos DB asks for, stretched by a random jitter so
+    that callers throttled together do not retry together. Without the header the
+    delay backs off exponentially. The error is raised once ``max_retries`` retries
+    or ``max_wait_seconds`` of waiting are used up.
+    """
+
+    # Delay before the first retry when Cosmos DB does not say how long to wait
+    BASE_DELAY_SECONDS = 0.1
+
+    # Fraction of the retry delay added at random
+    JITTER = 0.5
+
+    def __init__(
+        self,
+        request_units_per_second: float = 0,
+        max_retries: int = 9,
+        max_wait_seconds: float = 30.0,
+    ) -> None:
+        self.budget = RequestUnitBudget(request_units_per_second)
+        self._max_retries = max_retries
+        self._max_wait_seconds = max_wait_seconds
+        self._stats: Dict[str, OperationStats] = {}
+
+    def _operation_stats(self, operation: str) -> OperationStats:
+        stats = self._stats.get(operation)
+        if stats is None:
+            stats = self._stats[operation] = OperationStats()
+        return stats
+
+    @staticmethod
+    def _charge(headers: Optional[Mapping[str, Any]]) -> float:
+        try:
+            return float((headers or {}).get(REQUEST_CHARGE_HEADER, 0) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def record_charge(self, operation: str, headers: Optional[Mapping[str, Any]]) -> float:
+        """Count the request charge of a response against its operation type and the budget."""
+        charge = self._charge(headers)
+        stats = self._operation_stats(operation)
+        stats.requests += 1
+        stats.request_charge += charge
+        self.budget.record(charge)
+        return charge
+
+    def retry_delay(self, error: CosmosHttpResponseError, attempt: int) -> float:
+        """Get the jittered delay before retrying a throttled operation.
+
+        Args:
+            error: The 429 error
+            attempt: The number of retries already made
+
+        Returns:
+            Seconds to wait before the next attempt
+        """
+        headers = getattr(error, "headers", None) or {}
+        try:
+            delay = int(headers[RETRY_AFTER_HEADER]) / 1000
+        except (KeyError, TypeError, ValueError):
+            delay = self.BASE_DELAY_SECONDS * 2 ** attempt
+        return delay * (1 + random.uniform(0, self.JITTER))
+
+    async def run(
+        self,
+        operation: str,
+        call: Callable[[Callable[[Mapping[str, Any], Any], None]], Awaitable[Any]],
+        record: Optional[OperationRecord] = None,
+    ) -> Any:
+        """Run an operation, retrying it while it is throttled.
+
+        Args:
+            operation: The operation type its request charge is counted under
+            call: Sends the operation, passing the given response hook to the SDK
+            record: Optional instrumentation record the request charge is added to
+
+        Returns:
+            The result of the operation
+        """
+
+        def response_hook(headers: Mapping[str, Any], _: Any) -> None:
+            charge = self.record_charge(operation, headers)
+            if record is not None:
+                record.request_charge += charge
+
+        waited = 0.0
+        attempt = 0
+        while True:
+            await self.budget.acquire()
+            try:
+                return await call(response_hook)
+            except CosmosHttpResponseError as e:
+                if not self._should_retry(operation, e, attempt, waited):
+                    raise
+                if record is not None:
+                    record.request_charge += self._charge(e.headers)
+                delay = self.retry_delay(e, attempt)
+                logging.info(f"Cosmos DB {operation} throttled, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                waited += delay
+                attempt += 1
+
+    def _should_retry(self, operation: str, error: CosmosHttpResponseError, attempt: int, waited: float) -> bool:
+        stats = self._operation_stats(operation)
+        if error.status_code != 429:
+            return False
+        stats.throttled += 1
+        self.record_charge(operation, getattr(error, "headers", None))
+        if attempt >= self._max_retries or waited >= self._max_wait_seconds:
+            stats.failed += 1
+            logging.warning(f"Cosmos DB {operation} still throttled after {attempt} retries")
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the request charge and throttling counters by operation type."""
+        return {operation: stats.to_dict() for operation, stats in self._stats.items()}
+
+
+async def _async_iter(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+class ThrottledPages:
+    """Pages of a ThrottledQuery, refetching a throttled page from its continuation token."""
+
+    def __init__(self, query: "ThrottledQuery", continuation_token: Optional[str]) -> None:
+        self._query = query
+        self.continuation_token = continuation_token
+
+    async def __aiter__(self) -> AsyncIterator[AsyncIterator[Any]]:
+        query = self._query
+        record = query.instrumentation.start(query.operation, query.method, query.cross_partition, query.text)
+        error = None
+        try:
+            async for page in self._pages(record):
+                yield page
+        except GeneratorExit:
+            # The caller stopped reading pages, e.g. after the one page it asked for
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            query.instrumentation.finish(record, error)
+
+    async def _pages(self, record: OperationRecord) -> AsyncIterator[AsyncIterator[Any]]:
+        pages = None
+        while True:
+            async def next_page(response_hook):
+                nonlocal pages
+                if pages is None:
+                    pages = self._query.factory(response_hook).by_page(self.continuation_token)
+                try:
+                    page = await pages.__anext__()
+                    return [item async for item in page], pages.continuation_token
+                except CosmosHttpResponseError:
+                    # Resume a new page iterator from the last page that was read
+                    pages = None
+                    raise
+
+            try:
+                items, self.continuation_token = await self._query.policy.run(
+                    self._query.operation, next_page, record
+                )
+            except StopAsyncIteration:
+                return
+            record.result_count += len(items)
+            yield _async_iter(items)
+            if not self.continuation_token:
+                return
+
+
+class ThrottledQuery:
+    """A query or change feed whose pages are read through a ThrottlingPolicy.
+
+    Each iteration is measured as one operation, from the first page to the last one read.
+    """
+
+    def __init__(
+        self,
+        policy: ThrottlingPolicy,
+        instrumentation: MemoryInstrumentation,
+        operation: str,
+        factory: Callable[[Any], Any],
+        cross_partition: bool = False,
+        text: Optional[str] = None,
+    ) -> None:
+        self.policy = policy
+        self.instrumentation = instrumentation
+        self.operation = operation
+        # Opens the SDK iterable, passing the given response hook
+        self.factory = factory
+        self.cross_partition = cross_partition
+        self.text = text
+        # The query is created by the memory store method, but iterated later
+        self.method = calling_method()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        async for page in self.by_page():
+            async for item in page:
+                yield item
+
+    def by_page(self, continuation_token: Optional[str] = None) -> ThrottledPages:
+        """Iterate the results a page at a time, resuming from a continuation token."""
+        return ThrottledPages(self, continuation_token)
+
+
+class ThrottledContainer:
+    """Container proxy sending every item operation through a ThrottlingPolicy.
+
+    Wraps an async azure.cosmos ContainerProxy. Every operation is also measured by
+    the MemoryInstrumentation. Operations that are not wrapped are passed through to
+    the proxy.
+    """
+
+    def __init__(
+        self,
+        container: Any,
+        policy: ThrottlingPolicy,
+        instrumentation: Optional[MemoryInstrumentation] = None,
+    ) -> None:
+        self._container = container
+        self._policy = policy
+        self._instrumentation = instrumentation or memory_instrumentation
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._container, name)
+
+    def _run(
+        self, operation: str, method: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any
+    ) -> Awaitable[Any]:
+        # Started here rather than in the coroutine, where the caller is still on the stack
+        record = self._instrumentation.start(operation)
+        return self._measure(record, operation, method, args, kwargs)
+
+    async def _measure(
+        self,
+        record: OperationRecord,
+        operation: str,
+        method: Callable[..., Awaitable[Any]],
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+    ) -> Any:
+        try:
+            result = await self._policy.run(
+                operation, lambda hook: method(*args, response_hook=hook, **kwargs), record
+            )
+        except CosmosResourceNotFoundError as e:
+            # A miss is an expected outcome of a point read, not a failure
+            self._instrumentation.finish(record, None if operation == "read" else e)
+            raise
+        except BaseException as e:
+            self._instrumentation.finish(record, e)
+            raise
+        record.result_count = len(result) if operation == "batch" else int(result is not None)
+        self._instrumentation.finish(record)
+        return result
+
+    def read_item(self, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        return self._run("read", self._container.read_item, *args, **kwargs)
+
+    def create_item(self, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        return self._run("create", self._container.create_item, *args, **kwargs)
+
+    def upsert_item(self, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        return self._run("upsert", self._container.upsert_item, *args, **kwargs)
+
+    def replace_item(self, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        return self._run("replace", self._container.replace_item, *args, **kwargs)
+
+    def patch_item(self, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        return self._run("patch", self._container.patch_item, *args, **kwargs)
+
+    def delete_item(self, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        return self._run("delete", self._container.delete_item, *args, **kwargs)
+
+    def execute_item_batch(self, *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        return self._run("batch", self._container.execute_item_batch, *args, **kwargs)
+
+    def query_items(self, *args: Any, **kwargs: Any) -> ThrottledQuery:
+        return ThrottledQuery(
+            self._policy,
+            self._instrumentation,
+            "query",
+            lambda hook: self._container.query_items(*args, response_hook=hook, **kwargs),
+            # Without a partition key the query fans out across every partition
+            cross_partition=kwargs.get("partition_key") is None,
+            text=kwargs.get("query", args[0] if args else None),
+        )
+
+    def query_items_change_feed(self, *args: Any, **kwargs: Any) -> ThrottledQuery:
+        return ThrottledQuery(
+            self._policy,
+            self._instrumentation,
+            "change_feed",
+            lambda hook: self._container.query_items_change_feed(*args, response_hook=hook, **kwargs),
+            cross_partition=kwargs.get("partition_key") is None,
+        )
+
+
+# Create a global instance of the policy shared by all Cosmos DB containers
+throttling_policy = ThrottlingPolicy(
+    request_units_per_second=config.COSMOSDB_RU_PER_SECOND,
+    max_retries=config.COSMOSDB_THROTTLE_MAX_RETRIES,
+    max_wait_seconds=config.COSMOSDB_THROTTLE_MAX_WAIT_SECONDS,
+)
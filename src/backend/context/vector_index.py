@@ -0,0 +1,480 @@
+# vector_index.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app_config import config
+
+
+class VectorIndex:
+    """Interface of the nearest neighbour indexes that can sit behind get_nearest_matches.
+
+    Indexes map record keys to embeddings and rank keys by cosine similarity.
+
+    ``version`` is the highest Cosmos DB ``_ts`` of the documents applied to the index,
+    and ``version_keys`` the keys applied at exactly that ``_ts``, so that the index
+    can be caught up with the writes of other processes from where it left off.
+    """
+
+    version: int = 0
+    version_keys: Set[str] = frozenset()
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, keys: List[str], embeddings: np.ndarray) -> None:
+        """Add or replace the embeddings of some keys."""
+        raise NotImplementedError
+
+    def remove(self, keys: List[str]) -> None:
+        """Remove keys from the index, unknown keys are ignored."""
+        raise NotImplementedError
+
+    def search(
+        self, embedding: np.ndarray, limit: int, min_relevance_score: float = 0.0
+    ) -> List[Tuple[str, float]]:
+        """Get up to limit (key, score) pairs ordered by descending cosine similarity."""
+        raise NotImplementedError
+
+    def mark_version(self, version: int, keys: Iterable[str]) -> None:
+        """Record that the documents of some keys, last written at version, are applied."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release the resources held by the index."""
+
+
+class IVFIndex(VectorIndex):
+    """Inverted file index over normalized embeddings, implemented with NumPy.
+
+    Once the index holds ``min_train_size`` vectors they are clustered with spherical
+    k-means into about sqrt(n) lists, and a search only scores the vectors of the
+    ``nprobe`` lists whose centroids are closest to the query. Smaller indexes, and
+    indexes created with ``nlist=1``, score every vector and are exact.
+
+    With ``quantize`` the vectors are stored as int8 with a float32 scale per row,
+    a quarter of the memory of float32 at a small loss of precision.
+
+    When ``path`` is given the index lives in that directory as memory-mapped .npy
+    files with spare capacity, so adding vectors writes only the new rows, and a
+    key file that is only appended to. Removed rows are marked deleted and the
+    index is compacted and re-clustered once enough of it has changed.
+    """
+
+    # Row counts are persisted last, so a crash leaves the previous state readable
+    META_FILE = "meta.json"
+    KEYS_FILE = "keys.txt"
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        quantize: bool = False,
+        nprobe: int = 8,
+        nlist: Optional[int] = None,
+        min_train_size: int = 1024,
+    ) -> None:
+        self._path = path
+        self._quantize = quantize
+        self._nprobe = nprobe
+        self._fixed_nlist = nlist
+        self._min_train_size = min_train_size
+
+        self._dim: Optional[int] = None
+        self._count = 0
+        self._deleted = 0
+        self._trained_count = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._lists: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._keys: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self.version = 0
+        self.version_keys: Set[str] = set()
+
+        if path is not None and os.path.exists(os.path.join(path, self.META_FILE)):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def quantized(self) -> bool:
+        return self._quantize
+
+    @property
+    def nlist(self) -> int:
+        return 1 if self._centroids is None else len(self._centroids)
+
+    # Storage
+
+    def _array_path(self, name: str) -> str:
+        return os.path.join(self._path, f"{name}.npy")
+
+    def _new_array(self, name: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        if self._path is None:
+            return np.zeros(shape, dtype=dtype)
+        os.makedirs(self._path, exist_ok=True)
+        return np.lib.format.open_memmap(self._array_path(name), mode="w+", dtype=dtype, shape=shape)
+
+    def _allocate(self, capacity: int) -> None:
+        """Create storage for capacity rows, keeping the rows in use."""
+        vector_dtype = np.int8 if self._quantize else np.float32
+        old = (self._vectors, self._scales, self._lists)
+        count = self._count
+        if self._path is not None and old[0] is not None:
+            # Copy into memory first, the files are about to be recreated
+            old = tuple(np.array(array[:count]) for array in old)
+
+        self._vectors = self._new_array("vectors", (capacity, self._dim), vector_dtype)
+        self._scales = self._new_array("scales", (capacity,), np.float32)
+        self._lists = self._new_array("lists", (capacity,), np.int32)
+        self._lists[:] = -1
+        if old[0] is not None and count:
+            self._vectors[:count] = old[0][:count]
+            self._scales[:count] = old[1][:count]
+            self._lists[:count] = old[2][:count]
+
+    def _load(self) -> None:
+        with open(os.path.join(self._path, self.META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._dim = meta["dim"]
+        self._count = meta["count"]
+        self._quantize = meta["quantize"]
+        self._trained_count = meta["trained_count"]
+        # Indexes saved without a version are caught up from the start once
+        self.version = meta.get("version", 0)
+        self._vectors = np.load(self._array_path("vectors"), mmap_mode="r+")
+        self._scales = np.load(self._array_path("scales"), mmap_mode="r+")
+        self._lists = np.load(self._array_path("lists"), mmap_mode="r+")
+        if meta["nlist"] > 1:
+            self._centroids = np.load(self._array_path("centroids"))
+
+        with open(os.path.join(self._path, self.KEYS_FILE), "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        keys = [json.loads(line) for line in lines[: self._count]]
+        if len(lines) > self._count:
+            # Drop keys appended by an update that did not complete
+            with open(os.path.join(self._path, self.KEYS_FILE), "w", encoding="utf-8") as f:
+                f.writelines(lines[: self._count])
+        self._keys = []
+        self._rows = {}
+        for row, key in enumerate(keys):
+            if self._lists[row] >= 0:
+                self._keys.append(key)
+                self._rows[key] = row
+            else:
+                self._keys.append(None)
+        self._deleted = self._count - len(self._rows)
+
+    def _save_meta(self) -> None:
+        if self._path is None:
+            return
+        for array in (self._vectors, self._scales, self._lists):
+            if isinstance(array, np.memmap):
+                array.flush()
+        meta = {
+            "dim": self._dim,
+            "count": self._count,
+            "quantize": self._quantize,
+            "trained_count": self._trained_count,
+            "nlist": self.nlist,
+            "version": self.version,
+        }
+        tmp_path = os.path.join(self._path, self.META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self._path, self.META_FILE))
+
+    def _append_keys(self, keys: List[str]) -> None:
+        if self._path is None:
+            return
+        with open(os.path.join(self._path, self.KEYS_FILE), "a", encoding="utf-8") as f:
+            f.writelines(f"{json.dumps(key)}\n" for key in keys)
+
+    def _rewrite_keys(self) -> None:
+        if self._path is None:
+            return
+        with open(os.path.join(self._path, self.KEYS_FILE), "w", encoding="utf-8") as f:
+            f.writelines(f"{json.dumps(key)}\n" for key in self._keys)
+
+    # Encoding
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode normalized vectors for storage, returning the rows and their scales."""
+        if not self._quantize:
+            return vectors, np.ones(len(vectors), dtype=np.float32)
+        peaks = np.abs(vectors).max(axis=1)
+        scales = np.where(peaks > 0, peaks / 127, 1).astype(np.float32)
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._quantize:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    # Clustering
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Get the list of each normalized vector."""
+        if self._centroids is None:
+            return np.zeros(len(vectors), dtype=np.int32)
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 8192):
+            chunk = vectors[start:start + 8192]
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ self._centroids.T, axis=1)
+        return assignments
+
+    @staticmethod
+    def _kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10) -> np.ndarray:
+        """Spherical k-means on normalized vectors, returning unit length centroids."""
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if len(vectors) > 64 * nlist:
+            sample = vectors[rng.choice(len(vectors), 64 * nlist, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty lists with random vectors
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1)
+        return centroids.astype(np.float32)
+
+    def _needs_rebuild(self) -> bool:
+        alive = len(self._rows)
+        if self._deleted > max(alive, 64):
+            return True
+        if self._fixed_nlist == 1 or alive < self._min_train_size:
+            return False
+        return self._centroids is None or alive > 4 * self._trained_count
+
+    def rebuild(self) -> None:
+        """Compact away deleted rows and re-cluster the remaining vectors."""
+        rows = np.array(sorted(self._rows.values()), dtype=np.int64)
+        keys = [self._keys[row] for row in rows]
+        vectors = self._decode(rows) if len(rows) else np.zeros((0, self._dim), np.float32)
+
+        self._centroids = None
+        if self._fixed_nlist != 1 and len(rows) >= self._min_train_size:
+            nlist = self._fixed_nlist or int(np.clip(np.sqrt(len(rows)), 1, 4096))
+            self._centroids = self._kmeans(vectors, nlist)
+            if self._path is not None:
+                np.save(self._array_path("centroids"), self._centroids)
+        self._trained_count = len(rows)
+
+        self._count = 0
+        self._deleted = 0
+        self._vectors = None
+        self._allocate(max(2 * len(rows), 64))
+        self._keys = []
+        self._rows = {}
+        self._rewrite_keys()
+        self._write_rows(keys, vectors)
+        self._save_meta()
+        logging.info(f"Rebuilt vector index with {len(rows)} vectors in {self.nlist} lists")
+
+    # Updates
+
+    def _write_rows(self, keys: List[str], vectors: np.ndarray) -> None:
+        """Append normalized vectors, growing the storage when it is full."""
+        needed = self._count + len(keys)
+        if self._vectors is None or needed > len(self._vectors):
+            self._allocate(max(needed, 2 * (len(self._vectors) if self._vectors is not None else 32)))
+        encoded, scales = self._encode(vectors)
+        end = self._count + len(keys)
+        self._vectors[self._count:end] = encoded
+        self._scales[self._count:end] = scales
+        self._lists[self._count:end] = self._assign(vectors)
+        for offset, key in enumerate(keys):
+            self._keys.append(key)
+            self._rows[key] = self._count + offset
+        self._append_keys(keys)
+        self._count = end
+
+    def add(self, keys: List[str], embeddings: np.ndarray) -> None:
+        if not keys:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(keys), -1)
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"Embeddings have {vectors.shape[1]} dimensions, the index has {self._dim}")
+
+        # A key written twice in one call keeps its last embedding
+        latest = {key: row for row, key in enumerate(keys)}
+        keys = list(latest)
+        vectors = vectors[list(latest.values())]
+
+        self._mark_deleted(keys)
+        self._write_rows(keys, self._normalize(vectors))
+        if self._needs_rebuild():
+            self.rebuild()
+        else:
+            self._save_meta()
+
+    def remove(self, keys: List[str]) -> None:
+        if not self._mark_deleted(keys):
+            return
+        if self._needs_rebuild():
+            self.rebuild()
+        else:
+            self._save_meta()
+
+    def _mark_deleted(self, keys: List[str]) -> int:
+        removed = 0
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._lists[row] = -1
+                self._keys[row] = None
+                removed += 1
+        self._deleted += removed
+        return removed
+
+    def mark_version(self, version: int, keys: Iterable[str]) -> None:
+        if version > self.version:
+            self.version = version
+            self.version_keys = set(keys)
+            if self._dim is not None:
+                self._save_meta()
+        elif version == self.version:
+            self.version_keys.update(keys)
+
+    # Search
+
+    def search(
+        self, embedding: np.ndarray, limit: int, min_relevance_score: float = 0.0
+    ) -> List[Tuple[str, float]]:
+        if not self._rows or limit <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32).ravel()
+        if query.shape[0] != self._dim:
+            raise ValueError(f"Embedding has {query.shape[0]} dimensions, the index has {self._dim}")
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+        query = query / query_norm
+
+        lists = np.asarray(self._lists[: self._count])
+        if self._centroids is None:
+            # Score every row in place, deleted rows are masked out afterwards
+            rows = slice(0, self._count)
+        else:
+            nprobe = min(self._nprobe, len(self._centroids))
+            probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.flatnonzero(np.isin(lists, probe))
+            if not len(rows):
+                return []
+
+        scores = np.asarray(self._vectors[rows]) @ query
+        if self._quantize:
+            scores *= self._scales[rows]
+        if self._centroids is None:
+            scores[lists < 0] = -np.inf
+            rows = np.arange(self._count)
+        k = min(limit, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [
+            (self._keys[rows[i]], float(scores[i]))
+            for i in best
+            if np.isfinite(scores[i]) and scores[i] >= min_relevance_score
+        ]
+
+    def close(self) -> None:
+        if self._dim is not None:
+            self._save_meta()
+        self._vectors = self._scales = self._lists = None
+
+
+class VectorIndexRegistry:
+    """Process-wide registry of the persistent vector indexes of memory collections.
+
+    ``kind`` selects the index behind get_nearest_matches: "matrix" keeps the cached
+    in-memory EmbeddingMatrix and disables the registry, "ivf" uses IVFIndex and
+    "flat" an IVFIndex that always scans every vector.
+    """
+
+    KINDS = ("matrix", "ivf", "flat")
+
+    def __init__(self, kind: str = "matrix", directory: str = ".vector_index", quantize: bool = False) -> None:
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown vector index kind {kind!r}, expected one of {self.KINDS}")
+        self._kind = kind
+        self._directory = directory
+        self._quantize = quantize
+        self._indexes: Dict[Tuple[str, str], VectorIndex] = {}
+        self._build_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._kind != "matrix"
+
+    def _path(self, scope: str, collection: str) -> str:
+        # Hash the names so they can not escape the index directory
+        digest = hashlib.sha256(f"{scope}\0{collection}".encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self._directory, digest)
+
+    def _create(self, path: str) -> VectorIndex:
+        return IVFIndex(path, quantize=self._quantize, nlist=1 if self._kind == "flat" else None)
+
+    def get(self, scope: str, collection: str) -> Optional[VectorIndex]:
+        """Get the index of a collection if it has been built, loading it from disk."""
+        key = (scope, collection)
+        index = self._indexes.get(key)
+        if index is None:
+            path = self._path(scope, collection)
+            if not os.path.exists(os.path.join(path, IVFIndex.META_FILE)):
+                return None
+            index = self._indexes[key] = self._create(path)
+        return index
+
+    def build_lock(self, scope: str, collection: str) -> asyncio.Lock:
+        """Get the lock held while the index of a collection is built."""
+        return self._build_locks.setdefault((scope, collection), asyncio.Lock())
+
+    def create(self, scope: str, collection: str) -> VectorIndex:
+        """Create an empty index for a collection, replacing any existing one."""
+        self.drop(scope, collection)
+        index = self._indexes[(scope, collection)] = self._create(self._path(scope, collection))
+        return index
+
+    def drop(self, scope: str, collection: str) -> None:
+        """Delete the index of a collection."""
+        index = self._indexes.pop((scope, collection), None)
+        if index is not None:
+            index.close()
+        shutil.rmtree(self._path(scope, collection), ignore_errors=True)
+
+    def close(self) -> None:
+        """Flush and release every open index."""
+        for index in self._indexes.values():
+            index.close()
+        self._indexes.clear()
+
+
+# Create a global instance of the registry shared by all memory contexts
+vector_index_registry = VectorIndexRegistry(
+    kind=config.COSMOSDB_VECTOR_INDEX,
+    directory=config.COSMOSDB_VECTOR_INDEX_DIR,
+    quantize=config.COSMOSDB_VECTOR_INDEX_QUANTIZE,
+)
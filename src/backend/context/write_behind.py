@@ -0,0 +1,228 @@
+# write_behind.py
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from opentelemetry import metrics
+
+from app_config import config
+from context.partitioning import partition_layout
+
+
+class WriteBehindQueue:
+    """Bounded write-behind queue for non-critical Cosmos DB inserts.
+
+    Documents are queued and written by a background task in transactional batches
+    grouped by container and partition key. A batch is flushed when it reaches
+    ``batch_size`` documents, when ``flush_interval`` seconds have passed since its
+    first document, or when the queue is closed. ``enqueue`` waits while the queue is
+    full, so producers slow down instead of growing memory without bound.
+
+    Queued documents stay visible through ``get_pending`` until they are written, so
+    readers can merge them into query results and see their own writes.
+
+    If a transactional batch fails, its documents are upserted one by one, so a single
+    bad or duplicate document does not lose the rest of its partition. Documents that
+    still fail are logged by id and counted as dropped.
+    """
+
+    # Maximum number of operations Cosmos DB accepts in one transactional batch
+    MAX_BATCH_SIZE = 100
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        batch_size: int = MAX_BATCH_SIZE,
+        flush_interval: float = 0.5,
+        meter_provider: Optional[metrics.MeterProvider] = None,
+    ) -> None:
+        self._max_size = max_size
+        self._batch_size = min(batch_size, self.MAX_BATCH_SIZE)
+        self._flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+        # Metrics
+        self.flushed_items = 0
+        self.failed_items = 0
+        self.flush_count = 0
+        self.last_flush_latency_ms = 0.0
+        self._total_flush_latency_ms = 0.0
+        meter = metrics.get_meter(__name__, meter_provider=meter_provider)
+        meter.create_observable_gauge(
+            "memory.write_behind.queue_depth",
+            callbacks=[self._observe_queue_depth],
+            unit="{item}",
+            description="Documents waiting in the write-behind queue",
+        )
+        self._written = meter.create_counter(
+            "memory.write_behind.written", unit="{item}", description="Queued documents written"
+        )
+        self._dropped = meter.create_counter(
+            "memory.write_behind.dropped", unit="{item}", description="Queued documents that could not be written"
+        )
+
+    def _observe_queue_depth(self, options: Any) -> Iterable[metrics.Observation]:
+        yield metrics.Observation(self._queue.qsize() if self._queue is not None else 0)
+
+    def _ensure_started(self) -> None:
+        """Create the queue and start the flusher on first use."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self._max_size)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def enqueue(self, container: Any, partition_key: str, document: Dict[str, Any]) -> None:
+        """Queue a document for insertion, waiting while the queue is full.
+
+        Args:
+            container: The Cosmos container proxy to write to
+            partition_key: The session_id of the document, its documents are written together
+            document: The serialized document
+        """
+        self._ensure_started()
+        self._pending.setdefault(partition_key, {})[document["id"]] = document
+        await self._queue.put((container, partition_key, document))
+
+    def get_pending(self, partition_key: str) -> List[Dict[str, Any]]:
+        """Get the queued documents of a session that have not been written yet."""
+        return list(self._pending.get(partition_key, {}).values())
+
+    async def _run(self) -> None:
+        """Collect queued documents into batches and flush them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logging.exception(f"Write-behind flush failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[Any, str, Dict[str, Any]]]) -> None:
+        """Write a batch of queued documents, one transactional batch per partition."""
+        start = time.perf_counter()
+        groups: Dict[Tuple[int, str], Tuple[Any, List[Dict[str, Any]]]] = {}
+        for container, partition_key, document in batch:
+            groups.setdefault((id(container), partition_key), (container, []))[1].append(document)
+
+        await asyncio.gather(
+            *[
+                self._write_group(container, partition_key, documents)
+                for (_, partition_key), (container, documents) in groups.items()
+            ]
+        )
+
+        self.last_flush_latency_ms = (time.perf_counter() - start) * 1000
+        self._total_flush_latency_ms += self.last_flush_latency_ms
+        self.flush_count += 1
+        logging.debug(
+            f"Write-behind flushed {len(batch)} items in {self.last_flush_latency_ms:.1f} ms"
+        )
+
+    async def _write_group(
+        self, container: Any, partition_key: str, documents: List[Dict[str, Any]]
+    ) -> None:
+        """Write the documents of one partition, then drop them from the pending view."""
+        try:
+            try:
+                await container.execute_item_batch(
+                    batch_operations=[("create", (document,)) for document in documents],
+                    partition_key=partition_layout.document_key(documents[0]),
+                )
+                written = len(documents)
+            except Exception as e:
+                logging.warning(
+                    f"Batch write of {len(documents)} queued items for partition {partition_key} "
+                    f"failed, writing them one by one: {e}"
+                )
+                written = await self._write_individually(container, partition_key, documents)
+            self.flushed_items += written
+            self._written.add(written)
+        finally:
+            pending = self._pending.get(partition_key, {})
+            for document in documents:
+                pending.pop(document["id"], None)
+            if not pending:
+                self._pending.pop(partition_key, None)
+
+    async def _write_individually(
+        self, container: Any, partition_key: str, documents: List[Dict[str, Any]]
+    ) -> int:
+        """Upsert documents one at a time, returning how many were written.
+
+        Upserts make the retry idempotent: a document the failed batch or an earlier
+        attempt already stored is overwritten with the same content instead of failing
+        with a conflict.
+        """
+        results = await asyncio.gather(
+            *[container.upsert_item(body=document) for document in documents],
+            return_exceptions=True,
+        )
+        lost = [
+            document["id"]
+            for document, result in zip(documents, results)
+            if isinstance(result, Exception)
+        ]
+        if lost:
+            self.failed_items += len(lost)
+            self._dropped.add(len(lost))
+            errors = {str(result) for result in results if isinstance(result, Exception)}
+            logging.error(
+                f"Dropped {len(lost)} queued items for partition {partition_key}, "
+                f"ids {lost}: {'; '.join(errors)}"
+            )
+        return len(documents) - len(lost)
+
+    async def flush(self) -> None:
+        """Wait until every queued document has been written."""
+        if self._queue is not None and self._flusher is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """Flush the queue and stop the background flusher."""
+        await self.flush()
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        self._queue = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get queue depth and flush statistics."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "pending_items": sum(len(docs) for docs in self._pending.values()),
+            "flushed_items": self.flushed_items,
+            "failed_items": self.failed_items,
+            "flush_count": self.flush_count,
+            "last_flush_latency_ms": self.last_flush_latency_ms,
+            "avg_flush_latency_ms": (
+                self._total_flush_latency_ms / self.flush_count if self.flush_count else 0.0
+            ),
+        }
+
+
+# Create a global instance of the queue shared by all memory contexts
+write_behind_queue = WriteBehindQueue(
+    max_size=config.COSMOSDB_WRITE_BEHIND_QUEUE_SIZE,
+    flush_interval=config.COSMOSDB_WRITE_BEHIND_FLUSH_MS / 1000,
+)
@@ -5,6 +5,7 @@ from typing import (Any, List, Mapping, Optional)
 # Import the new AppConfig instance
 from app_config import config
 from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.document_codec import set_operations
 from event_utils import track_event_if_configured
 from models.messages_kernel import (ActionRequest, ActionResponse,
                                     AgentMessage, Step, StepStatus)
@@ -200,7 +201,11 @@ class BaseAgent(AzureAIAgent):
         # Update step status
         step.status = StepStatus.completed
         step.agent_reply = response_content
-        await self._memory_store.update_step(step)
+        await self._memory_store.patch_step(
+            step.id,
+            step.session_id,
+            set_operations(status=step.status, agent_reply=step.agent_reply),
+        )
 
         # Track step completion in telemetry
         track_event_if_configured(
@@ -3,6 +3,7 @@ from datetime import datetime
 from typing import Dict, List, Optional
 
 from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.document_codec import set_operations
 from event_utils import track_event_if_configured
 from kernel_agents.agent_base import BaseAgent
 from utils_date import format_date_for_user
@@ -207,7 +208,9 @@ class GroupChatManager(BaseAgent):
         # Need to retrieve all the steps for the plan
         logging.info(f"GroupChatManager Received human feedback: {message}")
 
-        steps: List[Step] = await self._memory_store.get_steps_by_plan(message.plan_id)
+        steps: List[Step] = await self._memory_store.get_steps_by_plan(
+            message.plan_id, session_id=message.session_id
+        )
         # Filter for steps that are planned or awaiting feedback
 
         # Get the first step assigned to HumanAgent for feedback
@@ -261,7 +264,14 @@ class GroupChatManager(BaseAgent):
                     # TODO: Implement this logic later
                     step.status = StepStatus.rejected
                     step.human_approval_status = HumanFeedbackStatus.rejected
-                    self._memory_store.update_step(step)
+                    await self._memory_store.patch_step(
+                        step.id,
+                        step.session_id,
+                        set_operations(
+                            status=step.status,
+                            human_approval_status=step.human_approval_status,
+                        ),
+                    )
                     track_event_if_configured(
                         "Group Chat Manager - Steps has been rejected and updated into the cosmos",
                         {
@@ -285,7 +295,14 @@ class GroupChatManager(BaseAgent):
                     # TODO: Implement this logic later
                     step.status = StepStatus.rejected
                     step.human_approval_status = HumanFeedbackStatus.rejected
-                    self._memory_store.update_step(step)
+                    await self._memory_store.patch_step(
+                        step.id,
+                        step.session_id,
+                        set_operations(
+                            status=step.status,
+                            human_approval_status=step.human_approval_status,
+                        ),
+                    )
                     track_event_if_configured(
                         f"{AgentType.GROUP_CHAT_MANAGER.value} - Step has been rejected and updated into the cosmos",
                         {
@@ -310,7 +327,15 @@ class GroupChatManager(BaseAgent):
 
         step.human_feedback = received_human_feedback
         step.status = StepStatus.completed
-        await self._memory_store.update_step(step)
+        await self._memory_store.patch_step(
+            step.id,
+            step.session_id,
+            set_operations(
+                status=step.status,
+                human_approval_status=step.human_approval_status,
+                human_feedback=step.human_feedback,
+            ),
+        )
         track_event_if_configured(
             f"{AgentType.GROUP_CHAT_MANAGER.value} - Received human feedback, Updating step and updated into the cosmos",
             {
@@ -328,7 +353,9 @@ class GroupChatManager(BaseAgent):
         """
         # Update step status to 'action_requested'
         step.status = StepStatus.action_requested
-        await self._memory_store.update_step(step)
+        await self._memory_store.patch_step(
+            step.id, step.session_id, set_operations(status=step.status)
+        )
         track_event_if_configured(
             f"{AgentType.GROUP_CHAT_MANAGER.value} - Update step to action_requested and updated into the cosmos",
             {
@@ -341,7 +368,9 @@ class GroupChatManager(BaseAgent):
 
         # generate conversation history for the invoked agent
         plan = await self._memory_store.get_plan_by_session(session_id=session_id)
-        steps: List[Step] = await self._memory_store.get_steps_by_plan(plan.id)
+        steps: List[Step] = await self._memory_store.get_steps_by_plan(
+            plan.id, session_id=session_id
+        )
 
         current_step_id = step.id
         # Initialize the formatted string
@@ -414,7 +443,9 @@ class GroupChatManager(BaseAgent):
             # we mark the step as complete since we have received the human feedback
             # Update step status to 'completed'
             step.status = StepStatus.completed
-            await self._memory_store.update_step(step)
+            await self._memory_store.patch_step(
+                step.id, step.session_id, set_operations(status=step.status)
+            )
             logging.info(
                 "Marking the step as complete - Since we have received the human feedback"
             )
@@ -2,6 +2,7 @@ import logging
 from typing import Dict, List, Optional
 
 from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.document_codec import set_operations
 from event_utils import track_event_if_configured
 from kernel_agents.agent_base import BaseAgent
 from models.messages_kernel import (AgentMessage, AgentType,
@@ -142,8 +143,12 @@ class HumanAgent(BaseAgent):
         step.human_feedback = human_feedback.human_feedback
         step.status = StepStatus.completed
 
-        # Save the updated step
-        await self._memory_store.update_step(step)
+        # Save the updated fields of the step
+        await self._memory_store.patch_step(
+            step.id,
+            step.session_id,
+            set_operations(status=step.status, human_feedback=step.human_feedback),
+        )
         await self._memory_store.add_item(
             AgentMessage(
                 session_id=human_feedback.session_id,
@@ -219,7 +224,11 @@ class HumanAgent(BaseAgent):
 
         # Update the plan with the clarification
         plan.human_clarification_response = clarification_text
-        await self._memory_store.update_plan(plan)
+        await self._memory_store.patch_plan(
+            plan.id,
+            plan.session_id,
+            set_operations(human_clarification_response=clarification_text),
+        )
         await self._memory_store.add_item(
             AgentMessage(
                 session_id=session_id,
@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Optional, Tuple
 from azure.ai.agents.models import (ResponseFormatJsonSchema,
                                     ResponseFormatJsonSchemaType)
 from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.document_codec import set_operations
 from event_utils import track_event_if_configured
 from kernel_agents.agent_base import BaseAgent
 from kernel_tools.generic_tools import GenericTools
@@ -259,7 +260,11 @@ class PlannerAgent(BaseAgent):
             return f"No plan found for session {session_id}"
 
         plan.human_clarification_response = human_clarification
-        await self._memory_store.update_plan(plan)
+        await self._memory_store.patch_plan(
+            plan.id,
+            plan.session_id,
+            set_operations(human_clarification_response=human_clarification),
+        )
 
         # Add a record of the clarification
         await self._memory_store.add_item(
@@ -389,9 +394,6 @@ class PlannerAgent(BaseAgent):
                 human_clarification_request=human_clarification_request,
             )
 
-            # Store the plan
-            await self._memory_store.add_plan(plan)
-
             # Create steps from the parsed data
             steps = []
             for step_data in steps_data:
@@ -417,17 +419,20 @@ class PlannerAgent(BaseAgent):
                     human_approval_status=HumanFeedbackStatus.requested,
                 )
 
-                # Store the step
-                await self._memory_store.add_step(step)
                 steps.append(step)
 
+            # Store the plan and its steps in one transactional batch, they share the session partition
+            plan.set_step_counts(steps)
+            await self._memory_store.add_items_batch([plan, *steps])
+
+            for step in steps:
                 try:
                     track_event_if_configured(
                         "Planner - Added planned individual step into the cosmos",
                         {
                             "plan_id": plan.id,
-                            "action": action,
-                            "agent": agent_name,
+                            "action": step.action,
+                            "agent": step.agent.value,
                             "status": StepStatus.planned,
                             "session_id": input_task.session_id,
                             "user_id": self._user_id,
@@ -463,9 +468,6 @@ class PlannerAgent(BaseAgent):
                 timestamp=datetime.datetime.utcnow().isoformat(),
             )
 
-            # Store the dummy plan
-            await self._memory_store.add_plan(dummy_plan)
-
             # Create a dummy step for analyzing the task
             dummy_step = Step(
                 id=str(uuid.uuid4()),
@@ -479,9 +481,6 @@ class PlannerAgent(BaseAgent):
                 timestamp=datetime.datetime.utcnow().isoformat(),
             )
 
-            # Store the dummy step
-            await self._memory_store.add_step(dummy_step)
-
             # Add a second step to request human clarification
             clarification_step = Step(
                 id=str(uuid.uuid4()),
@@ -495,8 +494,11 @@ class PlannerAgent(BaseAgent):
                 timestamp=datetime.datetime.utcnow().isoformat(),
             )
 
-            # Store the clarification step
-            await self._memory_store.add_step(clarification_step)
+            # Store the dummy plan and its steps in one transactional batch
+            dummy_plan.set_step_counts([dummy_step, clarification_step])
+            await self._memory_store.add_items_batch(
+                [dummy_plan, dummy_step, clarification_step]
+            )
 
             # Log the event
             try:
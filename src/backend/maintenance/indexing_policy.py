@@ -0,0 +1,59 @@
+# indexing_policy.py
+"""Verify or migrate the indexing policy of the memory container.
+
+Run from src/backend with the COSMOSDB_* settings of the deployment:
+
+    python -m maintenance.indexing_policy verify
+    python -m maintenance.indexing_policy migrate
+
+verify exits with status 1 when the live policy differs from the expected one.
+migrate replaces the policy, Cosmos DB then rebuilds the index online.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app_config import config  # noqa: E402
+from context.cosmos_client_registry import cosmos_registry  # noqa: E402
+from context.indexing_policy import (  # noqa: E402
+    migrate_indexing_policy,
+    verify_indexing_policy,
+)
+
+
+async def run(command: str) -> int:
+    """Run the command against the configured container, returning the exit status."""
+    try:
+        container = await cosmos_registry.get_container(
+            config.COSMOSDB_ENDPOINT, config.COSMOSDB_DATABASE, config.COSMOSDB_CONTAINER
+        )
+        differences = await verify_indexing_policy(container)
+        for difference in differences:
+            print(difference)
+        if not differences:
+            print("Indexing policy is up to date")
+            return 0
+        if command == "verify":
+            return 1
+
+        database = await cosmos_registry.get_database(config.COSMOSDB_ENDPOINT, config.COSMOSDB_DATABASE)
+        await migrate_indexing_policy(database, config.COSMOSDB_CONTAINER)
+        print("Indexing policy replaced, the index is being rebuilt online")
+        return 0
+    finally:
+        await cosmos_registry.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("verify", "migrate"))
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.command)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# partition_migration.py
+"""Copy the memory container into a new container with hierarchical partition keys.
+
+The partition key of a Cosmos DB container can not be changed, so moving to the
+[/user_id, /session_id] layout means copying every document into a new container.
+Run from src/backend with the COSMOSDB_* settings of the deployment:
+
+    python -m maintenance.partition_migration memory-v2
+    python -m maintenance.partition_migration memory-v2 --follow 5
+
+The first run creates the target container and copies every document, later runs
+continue from the checkpoint kept in COSMOSDB_CHANGE_FEED_LEASE_DIR. With --follow
+the copy keeps catching up with new writes every given number of seconds until it is
+interrupted. To cut over, stop writes to the old container, run a final copy, then
+set COSMOSDB_CONTAINER to the target and COSMOSDB_PARTITION_LAYOUT=hierarchical.
+
+Deletes are not in the change feed: run bulk deletes again after the cut over if
+any ran while the copy was in progress.
+
+Copied documents get the time they were copied as their _ts, which listings order
+by and since_ts filters compare against. After the cut over, history written before
+the copy lists in copy order, clients polling with a since_ts from before the cut
+over receive every copied document once, and pagination cursors issued against the
+old container are rejected with a 400 so clients start again from the first page.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app_config import config  # noqa: E402
+from context.change_feed import FileLeaseStore  # noqa: E402
+from context.cosmos_client_registry import cosmos_registry  # noqa: E402
+from context.partitioning import PartitionLayout, copy_documents  # noqa: E402
+
+
+async def run(target_container: str, follow: float) -> int:
+    """Copy the configured container into the target, returning the exit status."""
+    if target_container == config.COSMOSDB_CONTAINER:
+        print("The target must differ from COSMOSDB_CONTAINER")
+        return 1
+
+    layout = PartitionLayout(PartitionLayout.HIERARCHICAL)
+    lease_store = FileLeaseStore(config.COSMOSDB_CHANGE_FEED_LEASE_DIR)
+    owner = f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        source = await cosmos_registry.get_container(
+            config.COSMOSDB_ENDPOINT, config.COSMOSDB_DATABASE, config.COSMOSDB_CONTAINER
+        )
+        target = await cosmos_registry.get_container(
+            config.COSMOSDB_ENDPOINT,
+            config.COSMOSDB_DATABASE,
+            target_container,
+            partition_key=layout.partition_key(),
+        )
+        properties = await target.read()
+        if properties["partitionKey"]["paths"] != layout.paths:
+            print(f"{target_container} is partitioned on {properties['partitionKey']['paths']}, expected {layout.paths}")
+            return 1
+
+        while True:
+            copied = await copy_documents(
+                source, target, lease_store, f"partition-migration-{target_container}", owner
+            )
+            print(f"Copied {copied} documents to {target_container}")
+            if not follow:
+                return 0
+            await asyncio.sleep(follow)
+    finally:
+        await cosmos_registry.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", help="Name of the container to copy into")
+    parser.add_argument(
+        "--follow",
+        type=float,
+        default=0,
+        help="Keep copying new writes every FOLLOW seconds until interrupted",
+    )
+    args = parser.parse_args()
+    try:
+        sys.exit(asyncio.run(run(args.target, args.follow)))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
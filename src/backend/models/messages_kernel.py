@@ -1,8 +1,9 @@
 import uuid
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Callable, ClassVar, Dict, List, Literal, Optional
 
+from pydantic import PrivateAttr, model_serializer
 from semantic_kernel.kernel_pydantic import Field, KernelBaseModel
 
 
@@ -91,11 +92,62 @@ class MessageRole(str, Enum):
 
 
 class BaseDataModel(KernelBaseModel):
-    """Base data model with common fields."""
+    """Base data model with common fields.
+
+    Fields can be deferred with defer_fields and loaded later with set_deferred, e.g.
+    by a reader that loads them asynchronously. A deferred field that is read,
+    compared or serialized before it was set is loaded by its loader then.
+    """
 
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     timestamp: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+    # Loaders of the deferred fields, by field name
+    _deferred: Optional[Dict[str, Callable[[], Any]]] = PrivateAttr(default=None)
+
+    def defer_fields(self, loaders: Dict[str, Callable[[], Any]]) -> None:
+        """Replace the values of fields with loaders called when the fields are first read."""
+        for name in loaders:
+            self.__dict__.pop(name, None)
+        self._deferred = {**(self._deferred or {}), **loaders}
+
+    def deferred_fields(self) -> Dict[str, Callable[[], Any]]:
+        """Get the loaders of the deferred fields that have not been loaded yet."""
+        if not self._deferred:
+            return {}
+        return {name: load for name, load in self._deferred.items() if name not in self.__dict__}
+
+    def set_deferred(self, name: str, value: Any) -> None:
+        """Set the value of a deferred field loaded by its owner, e.g. asynchronously."""
+        self.__dict__[name] = value
+
+    def _load_deferred(self) -> None:
+        """Load every deferred field that has not been read or assigned yet."""
+        if self._deferred:
+            for name, load in self._deferred.items():
+                if name not in self.__dict__:
+                    self.__dict__[name] = load()
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes missing from __dict__, deferred fields among them
+        try:
+            load = object.__getattribute__(self, "__pydantic_private__")["_deferred"][name]
+        except (AttributeError, KeyError, TypeError):
+            return super().__getattr__(name)
+        value = self.__dict__[name] = load()
+        return value
+
+    def __eq__(self, other: Any) -> bool:
+        self._load_deferred()
+        if isinstance(other, BaseDataModel):
+            other._load_deferred()
+        return super().__eq__(other)
+
+    @model_serializer(mode="wrap")
+    def _serialize_deferred(self, handler: Any) -> Any:
+        self._load_deferred()
+        return handler(self)
+
 
 # Basic message class for Semantic Kernel compatibility
 class ChatMessage(KernelBaseModel):
@@ -177,6 +229,35 @@ class Plan(BaseDataModel):
     summary: Optional[str] = None
     human_clarification_request: Optional[str] = None
     human_clarification_response: Optional[str] = None
+    # Denormalized step counters, kept in sync whenever a step changes status
+    total_steps: int = 0
+    planned: int = 0
+    awaiting_feedback: int = 0
+    approved: int = 0
+    rejected: int = 0
+    action_requested: int = 0
+    completed: int = 0
+    failed: int = 0
+    # COUNTERS_VERSION once the counters are maintained, 0 on plans stored before them
+    counters_version: int = 0
+
+    COUNTERS_VERSION: ClassVar[int] = 1
+
+    def set_step_counts(self, steps: List["Step"]) -> None:
+        """Set the step counters from a full list of steps."""
+        status_counts = {status: 0 for status in StepStatus}
+        for step in steps:
+            status_counts[step.status] += 1
+
+        self.total_steps = len(steps)
+        for status, count in status_counts.items():
+            setattr(self, status.value, count)
+        self.counters_version = self.COUNTERS_VERSION
+
+    def update_overall_status(self) -> None:
+        """Mark the plan as complete once every step has completed or failed."""
+        if self.completed + self.failed == self.total_steps:
+            self.overall_status = PlanStatus.completed
 
 
 class Step(BaseDataModel):
@@ -219,42 +300,13 @@ class PlanWithSteps(Plan):
     """Plan model that includes the associated steps."""
 
     steps: List[Step] = Field(default_factory=list)
-    total_steps: int = 0
-    planned: int = 0
-    awaiting_feedback: int = 0
-    approved: int = 0
-    rejected: int = 0
-    action_requested: int = 0
-    completed: int = 0
-    failed: int = 0
 
     def update_step_counts(self):
         """Update the counts of steps by their status."""
-        status_counts = {
-            StepStatus.planned: 0,
-            StepStatus.awaiting_feedback: 0,
-            StepStatus.approved: 0,
-            StepStatus.rejected: 0,
-            StepStatus.action_requested: 0,
-            StepStatus.completed: 0,
-            StepStatus.failed: 0,
-        }
-
-        for step in self.steps:
-            status_counts[step.status] += 1
-
-        self.total_steps = len(self.steps)
-        self.planned = status_counts[StepStatus.planned]
-        self.awaiting_feedback = status_counts[StepStatus.awaiting_feedback]
-        self.approved = status_counts[StepStatus.approved]
-        self.rejected = status_counts[StepStatus.rejected]
-        self.action_requested = status_counts[StepStatus.action_requested]
-        self.completed = status_counts[StepStatus.completed]
-        self.failed = status_counts[StepStatus.failed]
+        self.set_step_counts(self.steps)
 
         # Mark the plan as complete if the sum of completed and failed steps equals the total number of steps
-        if self.completed + self.failed == self.total_steps:
-            self.overall_status = PlanStatus.completed
+        self.update_overall_status()
 
 
 # Message classes for communication between agents
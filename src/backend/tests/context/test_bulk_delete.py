@@ -0,0 +1,136 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from azure.cosmos.exceptions import (
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+    CosmosResourceNotFoundError,
+)
+from context.bulk_delete import BulkDeleteEngine
+
+
+async def _async_iter(items):
+    """Helper to create an async iterable."""
+    for item in items:
+        yield item
+
+
+def _container(documents):
+    container = MagicMock()
+    container.query_items = MagicMock(return_value=_async_iter(documents))
+    container.execute_item_batch = AsyncMock(
+        side_effect=lambda batch_operations, partition_key: [
+            {"statusCode": 204, "requestCharge": 5.0} for _ in batch_operations
+        ]
+    )
+    container.delete_item = AsyncMock()
+    return container
+
+
+@pytest.mark.asyncio
+async def test_deletes_in_batches_per_partition():
+    """Documents are deleted with one transactional batch per partition and chunk."""
+    documents = [{"id": f"a-{i}", "session_id": "s-1"} for i in range(150)]
+    documents += [{"id": "b-1", "session_id": "s-2"}]
+    container = _container(documents)
+    engine = BulkDeleteEngine(max_concurrency=2)
+
+    job = engine.start(container, "user-1", "SELECT c.id, c.session_id FROM c", [])
+    await asyncio.wait_for(job.wait(), timeout=1)
+
+    sizes = sorted(
+        (c.kwargs["partition_key"], len(c.kwargs["batch_operations"]))
+        for c in container.execute_item_batch.call_args_list
+    )
+    assert sizes == [("s-1", 50), ("s-1", 100), ("s-2", 1)]
+    assert job.to_dict()["status"] == "completed"
+    assert (job.total_items, job.deleted_items, job.partitions) == (151, 151, 2)
+    assert job.request_charge == 151 * 5.0
+    container.delete_item.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_partitions_run_with_bounded_concurrency():
+    """No more than max_concurrency partitions are deleted at once."""
+    documents = [{"id": f"d-{i}", "session_id": f"s-{i}"} for i in range(8)]
+    container = _container(documents)
+    in_flight, peak = 0, 0
+
+    async def slow_batch(batch_operations, partition_key):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [{"requestCharge": 1.0}]
+
+    container.execute_item_batch.side_effect = slow_batch
+    engine = BulkDeleteEngine(max_concurrency=3)
+
+    job = engine.start(container, "user-1", "q", [])
+    await asyncio.wait_for(job.wait(), timeout=1)
+
+    assert peak == 3
+    assert job.deleted_items == 8
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_single_deletes():
+    """A batch rejected because a document is gone is retried item by item."""
+    documents = [{"id": f"d-{i}", "session_id": "s-1"} for i in range(3)]
+    container = _container(documents)
+    container.execute_item_batch.side_effect = CosmosBatchOperationError(
+        error_index=1, headers={}, status_code=404, message="gone", operation_responses=[]
+    )
+    container.delete_item.side_effect = [None, CosmosResourceNotFoundError(message="gone"), None]
+    engine = BulkDeleteEngine()
+
+    job = engine.start(container, "user-1", "q", [])
+    await asyncio.wait_for(job.wait(), timeout=1)
+
+    assert container.delete_item.await_count == 3
+    assert job.deleted_items == 3 and job.failed_items == 0
+
+
+@pytest.mark.asyncio
+async def test_throttled_batch_is_left_to_the_container_policy():
+    """A 429 the container's throttling policy gave up on is not retried again."""
+    container = _container([{"id": "d-1", "session_id": "s-1"}])
+    throttled = CosmosHttpResponseError(status_code=429, message="throttled")
+    container.execute_item_batch.side_effect = [throttled, [{"requestCharge": 5.0}]]
+    engine = BulkDeleteEngine()
+
+    job = engine.start(container, "user-1", "q", [])
+    await job.wait()
+
+    container.execute_item_batch.assert_awaited_once()
+    assert (job.deleted_items, job.failed_items, job.status) == (0, 1, "completed_with_errors")
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_only_visible_to_their_user():
+    container = _container([])
+    engine = BulkDeleteEngine()
+
+    job = engine.start(container, "user-1", "q", [])
+    await job.wait()
+
+    assert engine.get_job(job.id, "user-1") is job
+    assert engine.get_job(job.id, "user-2") is None
@@ -0,0 +1,196 @@
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.change_feed import (
+    PLAN_LIST_VIEW,
+    ChangeFeedProcessor,
+    FileLeaseStore,
+    reset_user_views,
+    view_id,
+    view_partition_key,
+)
+from context.embedding_matrix import EmbeddingMatrixCache
+from context.plan_cache import PlanCache
+from context.sqlite_memory_kernel import SqliteContainer, SqliteMemoryContext
+from models.messages_kernel import AgentMessage, AgentType, Plan, Step, StepStatus
+
+
+@pytest.fixture
+def container(tmp_path):
+    container = SqliteContainer(str(tmp_path / "memory.db"))
+    yield container
+    container.close()
+
+
+def _context(container, session_id="session-1", user_id="user-1"):
+    context = SqliteMemoryContext(session_id, user_id, database_path=container.path)
+    context._container = container
+    context._plan_cache = PlanCache(max_sessions=16, ttl_seconds=60)
+    context._embedding_matrices = EmbeddingMatrixCache()
+    return context
+
+
+def _message(session_id, content, user_id="user-1"):
+    return AgentMessage(session_id=session_id, user_id=user_id, plan_id="p", content=content, source="agent")
+
+
+def test_lease_is_exclusive_until_released_or_expired(tmp_path):
+    store = FileLeaseStore(str(tmp_path / "leases"))
+
+    assert store.acquire("views", "a", duration=60) is not None
+    assert store.acquire("views", "b", duration=60) is None
+    assert store.checkpoint("views", "a", "42")
+    assert not store.checkpoint("views", "b", "43")
+
+    store.release("views", "a")
+    lease = store.acquire("views", "b", duration=0)
+    assert lease["continuation"] == "42"
+    # An expired lease can be taken over
+    assert store.acquire("views", "a", duration=60) is not None
+
+
+@pytest.mark.asyncio
+async def test_views_follow_plans_and_messages(container, tmp_path):
+    processor = ChangeFeedProcessor(FileLeaseStore(str(tmp_path / "leases")), page_size=2)
+    context = _context(container)
+
+    assert await context.get_plan_list_view() is None
+
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    step = Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action="a", agent=AgentType.HR)
+    plan.set_step_counts([step])
+    await context.add_items_batch([plan, step])
+    await context.add_agent_message(_message("session-1", "first"))
+    await context.add_agent_message(_message("session-1", "second"))
+    await _context(container, user_id="user-2").add_agent_message(_message("session-1", "other", "user-2"))
+
+    assert await processor.process_changes(container) == 4
+
+    [listed] = await context.get_plan_list_view()
+    assert (listed.id, listed.initial_goal, listed.planned) == (plan.id, "goal", 1)
+    latest = await context.get_latest_messages_view()
+    assert latest["session-1"].content == "second"
+
+    step.status = StepStatus.completed
+    await context.update_step(step)
+    await processor.process_changes(container)
+
+    [listed] = await context.get_plan_list_view()
+    assert (listed.planned, listed.completed) == (0, 1)
+    other = await _context(container, user_id="user-2").get_latest_messages_view()
+    assert other["session-1"].content == "other"
+
+
+@pytest.mark.asyncio
+async def test_processing_resumes_from_checkpoint(container, tmp_path):
+    leases = str(tmp_path / "leases")
+    context = _context(container)
+    await context.add_agent_message(_message("session-1", "first"))
+
+    first = ChangeFeedProcessor(FileLeaseStore(leases))
+    assert await first.process_changes(container) == 1
+    # The lease is held, another processor waits for it
+    second = ChangeFeedProcessor(FileLeaseStore(leases))
+    assert await second.process_changes(container) == 0
+    await first.close()
+
+    await context.add_agent_message(_message("session-2", "second"))
+    # Only the changes after the checkpoint
+    assert await second.process_changes(container) == 1
+    latest = await context.get_latest_messages_view()
+    assert {k: m.content for k, m in latest.items()} == {"session-1": "first", "session-2": "second"}
+
+
+@pytest.mark.asyncio
+async def test_plan_list_view_is_capped(container, tmp_path):
+    lease_threads = []
+
+    class RecordingLeaseStore(FileLeaseStore):
+        def acquire(self, *args, **kwargs):
+            lease_threads.append(threading.get_ident())
+            return super().acquire(*args, **kwargs)
+
+    processor = ChangeFeedProcessor(RecordingLeaseStore(str(tmp_path / "leases")), max_view_plans=2)
+    context = _context(container)
+    for index in range(2):
+        await context.add_plan(Plan(session_id=f"session-{index}", user_id="user-1", initial_goal="goal"))
+    await processor.process_changes(container)
+    assert len(await context.get_plan_list_view()) == 2
+
+    await context.add_plan(Plan(session_id="session-2", user_id="user-1", initial_goal="goal"))
+    await processor.process_changes(container)
+    view = await container.read_item(
+        view_id(PLAN_LIST_VIEW, "user-1"), partition_key=view_partition_key(PLAN_LIST_VIEW, "user-1")
+    )
+    assert len(view["plans"]) == 2 and view["truncated"]
+    # A truncated view can not list every plan, the listing falls back to the query
+    assert await context.get_plan_list_view() is None
+    # The lease file is locked from a worker thread, not from the event loop
+    assert threading.get_ident() not in lease_threads
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_drops_views(container, tmp_path):
+    processor = ChangeFeedProcessor(FileLeaseStore(str(tmp_path / "leases")))
+    context = _context(container)
+    await context.add_plan(Plan(session_id="session-1", user_id="user-1", initial_goal="goal"))
+    await context.add_agent_message(_message("session-1", "first"))
+    await processor.process_changes(container)
+
+    with patch("context.cosmos_memory_kernel.config.COSMOSDB_CHANGE_FEED_VIEWS", True):
+        await context.delete_all_messages("agent_message")
+        assert await context.get_latest_agent_messages() == {}
+
+    assert await context.get_latest_messages_view() is None
+    assert len(await context.get_plan_list_view()) == 1
+
+
+@pytest.mark.asyncio
+async def test_message_listings_leave_out_views(container, tmp_path):
+    processor = ChangeFeedProcessor(FileLeaseStore(str(tmp_path / "leases")))
+    context = _context(container)
+    await context.add_plan(Plan(session_id="session-1", user_id="user-1", initial_goal="goal"))
+    await context.add_agent_message(_message("session-1", "first"))
+    await processor.process_changes(container)
+
+    documents, _ = await context.get_messages_page()
+    assert sorted(d["data_type"] for d in documents) == ["agent_message", "plan"]
+    assert sorted(d["data_type"] for d in await context.get_all_messages()) == ["agent_message", "plan"]
+
+
+@pytest.mark.asyncio
+async def test_view_deleted_while_a_page_is_applied_stays_deleted(container, tmp_path):
+    processor = ChangeFeedProcessor(FileLeaseStore(str(tmp_path / "leases")))
+    context = _context(container)
+    await context.add_agent_message(_message("session-1", "first"))
+    await processor.process_changes(container)
+    await context.add_agent_message(_message("session-2", "second"))
+
+    read_view = ChangeFeedProcessor._read_view
+
+    async def read_then_reset(container, data_type, user_id):
+        view = await read_view(container, data_type, user_id)
+        await reset_user_views(container, user_id, ["agent_message"])
+        return view
+
+    with patch.object(ChangeFeedProcessor, "_read_view", staticmethod(read_then_reset)):
+        await processor.process_changes(container)
+
+    assert await context.get_latest_messages_view() is None
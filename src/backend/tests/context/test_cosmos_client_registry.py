@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from context.cosmos_client_registry import CosmosClientRegistry
+from context.indexing_policy import MEMORY_INDEXING_POLICY
+
+
+@pytest.fixture
+def mock_cosmos():
+    """Patch the Cosmos client and credential used by the registry."""
+    mock_container = MagicMock()
+    mock_database = MagicMock()
+    mock_database.create_container_if_not_exists = AsyncMock(return_value=mock_container)
+    mock_client = MagicMock()
+    mock_client.get_database_client.return_value = mock_database
+    mock_client.close = AsyncMock()
+    mock_credential = MagicMock()
+    mock_credential.close = AsyncMock()
+
+    with patch(
+        "context.cosmos_client_registry.CosmosClient", return_value=mock_client
+    ) as mock_client_cls, patch(
+        "context.cosmos_client_registry.get_azure_credential_async",
+        AsyncMock(return_value=mock_credential),
+    ):
+        yield mock_client_cls, mock_client, mock_database, mock_container, mock_credential
+
+
+@pytest.mark.asyncio
+async def test_get_container_reuses_client_and_container(mock_cosmos):
+    """Concurrent lookups share one client and one control-plane call."""
+    mock_client_cls, _, mock_database, mock_container, _ = mock_cosmos
+    registry = CosmosClientRegistry()
+
+    containers = await asyncio.gather(
+        *[registry.get_container("https://endpoint", "db", "memory") for _ in range(10)]
+    )
+
+    # Every caller gets the same throttled wrapper of the one container proxy
+    assert all(container is containers[0] for container in containers)
+    assert containers[0]._container is mock_container
+    mock_client_cls.assert_called_once()
+    mock_database.create_container_if_not_exists.assert_awaited_once()
+    kwargs = mock_database.create_container_if_not_exists.await_args.kwargs
+    assert kwargs["indexing_policy"] == MEMORY_INDEXING_POLICY
+
+
+@pytest.mark.asyncio
+async def test_failed_lookup_is_shared_and_cached(mock_cosmos):
+    """A burst of lookups during an outage makes one control-plane call."""
+    mock_client_cls, _, mock_database, _, _ = mock_cosmos
+    mock_database.create_container_if_not_exists.side_effect = ConnectionError("unreachable")
+    registry = CosmosClientRegistry()
+
+    results = await asyncio.gather(
+        *[registry.get_container("https://endpoint", "db", "memory") for _ in range(10)],
+        return_exceptions=True,
+    )
+
+    assert all(
+        isinstance(result, ConnectionError) or isinstance(result.__cause__, ConnectionError)
+        for result in results
+    )
+    mock_database.create_container_if_not_exists.assert_awaited_once()
+    mock_client_cls.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_close_releases_clients(mock_cosmos):
+    """Closing the registry closes clients and credentials and clears the cache."""
+    mock_client_cls, mock_client, _, _, mock_credential = mock_cosmos
+    registry = CosmosClientRegistry()
+    await registry.get_container("https://endpoint", "db", "memory")
+
+    await registry.close()
+
+    mock_client.close.assert_awaited_once()
+    mock_credential.close.assert_awaited_once()
+    await registry.get_container("https://endpoint", "db", "memory")
+    assert mock_client_cls.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_warm_up_skips_when_not_configured(mock_cosmos):
+    """Warm up is a no-op without Cosmos settings."""
+    mock_client_cls, _, _, _, _ = mock_cosmos
+    registry = CosmosClientRegistry()
+
+    assert await registry.warm_up("", "db", "memory") is False
+    mock_client_cls.assert_not_called()
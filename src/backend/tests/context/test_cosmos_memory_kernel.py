@@ -0,0 +1,781 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+from semantic_kernel.contents import ChatHistory
+from semantic_kernel.memory.memory_record import MemoryRecord
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+)
+from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.document_codec import set_operations
+from context.embedding_codec import encode_embedding
+from context.embedding_matrix import EmbeddingMatrixCache
+from context.pagination import InvalidCursorError
+from context.plan_cache import PlanCache
+from context.vector_index import VectorIndexRegistry
+from context.write_behind import write_behind_queue
+from models.messages_kernel import AgentMessage, AgentType, Plan, Step, StepStatus
+
+
+async def _async_iter(items):
+    """Helper to create an async iterable."""
+    for item in items:
+        yield item
+
+
+@pytest.fixture
+def mock_container():
+    """A mocked async Cosmos container."""
+    container = MagicMock()
+    container.create_item = AsyncMock()
+    container.upsert_item = AsyncMock()
+    container.execute_item_batch = AsyncMock()
+    return container
+
+
+@pytest.fixture
+def memory_context(mock_container):
+    """A memory context wired to the mocked container."""
+    context = CosmosMemoryContext(
+        session_id="session-1",
+        user_id="user-1",
+        cosmos_container="container",
+        cosmos_endpoint="https://endpoint",
+        cosmos_database="db",
+    )
+    context._container = mock_container
+    context._plan_cache = PlanCache(max_sessions=16, ttl_seconds=60)
+    context._embedding_matrices = EmbeddingMatrixCache()
+    return context
+
+
+def _make_plan(session_id="session-1"):
+    return Plan(session_id=session_id, user_id="user-1", initial_goal="goal")
+
+
+def _make_step(plan, index=0):
+    return Step(
+        plan_id=plan.id,
+        session_id=plan.session_id,
+        user_id="user-1",
+        action=f"action {index}",
+        agent=AgentType.HR,
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_initialize_once(mock_container):
+    """Concurrent first calls on a context wait for one initialization."""
+    context = CosmosMemoryContext(
+        session_id="session-1",
+        user_id="user-1",
+        cosmos_container="container",
+        cosmos_endpoint="https://endpoint",
+        cosmos_database="db",
+    )
+
+    async def get_container(*args):
+        await asyncio.sleep(0.01)
+        return mock_container
+
+    with patch(
+        "context.cosmos_memory_kernel.cosmos_registry.get_container",
+        AsyncMock(side_effect=get_container),
+    ) as get_container_mock:
+        await asyncio.gather(*[context.ensure_initialized() for _ in range(10)])
+        get_container_mock.side_effect = ConnectionError("unreachable")
+        other = CosmosMemoryContext("session-2", "user-1", "container", "https://endpoint", "db")
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await other.ensure_initialized()
+
+    assert context._container is mock_container
+    assert get_container_mock.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_records_initialize_a_cold_context(mock_container):
+    """Memory record methods borrow the container before their first use."""
+    context = CosmosMemoryContext("session-1", "user-1", "container", "https://endpoint", "db")
+    record = MemoryRecord(
+        is_reference=False, external_source_name=None, id="m-1", description=None,
+        text="note", additional_metadata=None, embedding=np.array([1.0, 0.0]),
+    )
+    with patch(
+        "context.cosmos_memory_kernel.cosmos_registry.get_container",
+        AsyncMock(return_value=mock_container),
+    ):
+        assert await context.upsert_memory_record("notes", record) == "m-1"
+
+    assert mock_container.upsert_item.await_args.kwargs["body"]["text"] == "note"
+
+
+@pytest.mark.asyncio
+async def test_add_items_batch_single_partition(memory_context, mock_container):
+    """A plan and its steps are written in one transactional batch."""
+    plan = _make_plan()
+    steps = [_make_step(plan, i) for i in range(6)]
+
+    await memory_context.add_items_batch([plan, *steps])
+
+    mock_container.execute_item_batch.assert_awaited_once()
+    kwargs = mock_container.execute_item_batch.call_args.kwargs
+    assert kwargs["partition_key"] == "session-1"
+    operations = kwargs["batch_operations"]
+    assert [op[0] for op in operations] == ["create"] * 7
+    assert operations[0][1][0]["id"] == plan.id
+    assert isinstance(operations[0][1][0]["timestamp"], str)
+    mock_container.create_item.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_add_items_batch_chunks_at_limit(memory_context, mock_container):
+    """Large groups are split at the batch size limit and per partition."""
+    plan = _make_plan()
+    other_plan = _make_plan(session_id="session-2")
+    steps = [_make_step(plan, i) for i in range(CosmosMemoryContext.TRANSACTIONAL_BATCH_LIMIT + 5)]
+
+    await memory_context.add_items_batch([plan, *steps, other_plan])
+
+    calls = mock_container.execute_item_batch.call_args_list
+    sizes = [(c.kwargs["partition_key"], len(c.kwargs["batch_operations"])) for c in calls]
+    assert sizes == [
+        ("session-1", CosmosMemoryContext.TRANSACTIONAL_BATCH_LIMIT),
+        ("session-1", 6),
+        ("session-2", 1),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_add_items_batch_propagates_errors(memory_context, mock_container):
+    """A failed batch raises instead of silently dropping the plan."""
+    mock_container.execute_item_batch.side_effect = RuntimeError("batch failed")
+
+    with pytest.raises(RuntimeError):
+        await memory_context.add_items_batch([_make_plan()])
+
+
+@pytest.mark.asyncio
+async def test_write_behind_queues_agent_messages(memory_context, mock_container):
+    """With write-behind enabled agent messages are queued and read back before flushing."""
+    release = asyncio.Event()
+
+    async def slow_batch(**kwargs):
+        await release.wait()
+
+    mock_container.execute_item_batch.side_effect = slow_batch
+    mock_container.query_items = MagicMock(return_value=_async_iter([]))
+    memory_context._write_behind = True
+    message = AgentMessage(
+        session_id="session-1",
+        user_id="user-1",
+        plan_id="plan-1",
+        content="hello",
+        source="Planner_Agent",
+    )
+
+    await memory_context.add_item(message)
+    mock_container.create_item.assert_not_called()
+
+    messages = await memory_context.get_data_by_type("agent_message")
+    assert [m.id for m in messages] == [message.id]
+
+    release.set()
+    await write_behind_queue.close()
+    mock_container.execute_item_batch.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_plan_and_steps_are_served_from_cache(memory_context, mock_container):
+    """Repeated plan and step reads for a session hit Cosmos DB once."""
+    plan = _make_plan()
+    steps = [_make_step(plan, i) for i in range(3)]
+    plan_doc = {**plan.model_dump(mode="json"), "_ts": 1, "_etag": "plan-etag"}
+    step_docs = [
+        {**step.model_dump(mode="json"), "_ts": 1, "_etag": f"step-etag-{i}"}
+        for i, step in enumerate(steps)
+    ]
+    mock_container.query_items = MagicMock(
+        side_effect=[_async_iter([plan_doc]), _async_iter(step_docs)]
+    )
+
+    for _ in range(3):
+        assert (await memory_context.get_plan_by_session("session-1")).id == plan.id
+        assert [s.id for s in await memory_context.get_steps_by_plan(plan.id)] == [
+            s.id for s in steps
+        ]
+    assert (await memory_context.get_step(steps[1].id, "session-1")).id == steps[1].id
+
+    assert mock_container.query_items.call_count == 2
+    metrics = memory_context._plan_cache.get_metrics()
+    assert metrics["hits"] == 5
+    assert metrics["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_update_step_is_conditional_on_cached_etag(memory_context, mock_container):
+    """Step updates send the cached etag and refresh the cached copy."""
+    plan = _make_plan()
+    step = _make_step(plan)
+    step_doc = {**step.model_dump(mode="json"), "_ts": 1, "_etag": "etag-1"}
+    mock_container.query_items = MagicMock(return_value=_async_iter([step_doc]))
+    mock_container.upsert_item = AsyncMock(return_value={**step_doc, "_etag": "etag-2"})
+
+    cached_step = (await memory_context.get_steps_by_plan(plan.id))[0]
+    cached_step.agent_reply = "done"
+    await memory_context.update_step(cached_step)
+
+    assert mock_container.upsert_item.call_args.kwargs["etag"] == "etag-1"
+    refreshed = await memory_context.get_steps_by_plan(plan.id)
+    assert refreshed[0].agent_reply == "done"
+    assert memory_context._plan_cache.get_etag("user-1", "session-1", step.id) == "etag-2"
+
+
+@pytest.mark.asyncio
+async def test_stale_etag_invalidates_session(memory_context, mock_container):
+    """A failed precondition drops the cached session and retries against a fresh read."""
+    plan = _make_plan()
+    step = _make_step(plan)
+    step_doc = {**step.model_dump(mode="json"), "_ts": 1, "_etag": "etag-1"}
+    mock_container.query_items = MagicMock(return_value=_async_iter([step_doc]))
+    mock_container.read_item = AsyncMock(return_value={**step_doc, "_etag": "etag-2"})
+    mock_container.upsert_item = AsyncMock(
+        side_effect=[CosmosAccessConditionFailedError(message="stale"), {"_etag": "etag-3"}]
+    )
+
+    cached_step = (await memory_context.get_steps_by_plan(plan.id))[0]
+    await memory_context.update_step(cached_step)
+
+    assert mock_container.upsert_item.await_count == 2
+    assert [call.kwargs["etag"] for call in mock_container.upsert_item.await_args_list] == [
+        "etag-1",
+        "etag-2",
+    ]
+    assert memory_context._plan_cache.get_etag("user-1", "session-1", step.id) is None
+
+
+@pytest.mark.asyncio
+async def test_session_queries_are_partition_scoped(memory_context, mock_container):
+    """Session lookups pass the session as partition key instead of fanning out."""
+    mock_container.query_items = MagicMock(side_effect=lambda **kwargs: _async_iter([]))
+
+    await memory_context.get_plan_by_session("session-9")
+    await memory_context.get_data_by_type("agent_message")
+    await memory_context.get_agent_messages_by_session("session-9")
+    await memory_context.get_steps_by_plan("plan-1", session_id="session-9")
+
+    partition_keys = [c.kwargs.get("partition_key") for c in mock_container.query_items.call_args_list]
+    assert partition_keys == ["session-9", "session-1", "session-9", "session-9"]
+
+
+@pytest.mark.asyncio
+async def test_plan_id_lookup_resolves_session(memory_context, mock_container):
+    """Once a plan's session is known, plan and step lookups by plan id stay in one partition."""
+    plan = _make_plan(session_id="session-7")
+    plan_doc = {**plan.model_dump(mode="json"), "_ts": 1}
+    mock_container.query_items = MagicMock(
+        side_effect=lambda **kwargs: _async_iter([plan_doc])
+    )
+    mock_container.read_item = AsyncMock(return_value=plan_doc)
+
+    # First lookup has to fan out and remembers the session
+    assert (await memory_context.get_plan_by_plan_id(plan.id)).id == plan.id
+    assert "partition_key" not in mock_container.query_items.call_args.kwargs
+
+    # Later lookups are point reads / single-partition queries
+    assert (await memory_context.get_plan_by_plan_id(plan.id)).id == plan.id
+    mock_container.read_item.assert_awaited_once_with(item=plan.id, partition_key="session-7")
+    await memory_context.get_steps_for_plan(plan.id)
+    assert mock_container.query_items.call_args.kwargs["partition_key"] == "session-7"
+
+
+@pytest.mark.asyncio
+async def test_status_change_moves_plan_counters(memory_context, mock_container):
+    """A status change writes the step and patches the plan counters in one batch."""
+    plan = _make_plan()
+    step = _make_step(plan)
+    plan.set_step_counts([step])
+    step_doc = {**step.model_dump(mode="json"), "_ts": 1, "_etag": "etag-1"}
+    mock_container.query_items = MagicMock(return_value=_async_iter([step_doc]))
+    patched_plan = {**plan.model_dump(mode="json"), "planned": 0, "completed": 1}
+    mock_container.execute_item_batch = AsyncMock(
+        return_value=[
+            {"statusCode": 200, "eTag": "etag-2"},
+            {"statusCode": 200, "eTag": "plan-etag-2", "resourceBody": patched_plan},
+        ]
+    )
+
+    cached_step = (await memory_context.get_steps_by_plan(plan.id))[0]
+    cached_step.status = "completed"
+    await memory_context.update_step(cached_step)
+
+    kwargs = mock_container.execute_item_batch.call_args.kwargs
+    assert kwargs["partition_key"] == "session-1"
+    upsert, patch = kwargs["batch_operations"]
+    assert upsert[0] == "upsert" and upsert[2] == {"if_match_etag": "etag-1"}
+    assert patch == (
+        "patch",
+        (
+            plan.id,
+            [
+                {"op": "incr", "path": "/planned", "value": -1},
+                {"op": "incr", "path": "/completed", "value": 1},
+            ],
+        ),
+    )
+    mock_container.upsert_item.assert_not_called()
+    cached_plan = await memory_context.get_plan_by_session("session-1")
+    assert (cached_plan.planned, cached_plan.completed) == (0, 1)
+    assert memory_context._plan_cache.get_etag("user-1", "session-1", step.id) == "etag-2"
+
+
+@pytest.mark.asyncio
+async def test_status_change_retries_on_conflict(memory_context, mock_container):
+    """A conflicting status change is retried against the freshly read step."""
+    plan = _make_plan()
+    step = _make_step(plan)
+    stale_doc = {**step.model_dump(mode="json"), "_etag": "etag-1"}
+    fresh_doc = {**step.model_dump(mode="json"), "status": "approved", "_etag": "etag-2"}
+    mock_container.read_item = AsyncMock(side_effect=[stale_doc, fresh_doc])
+    conflict = CosmosBatchOperationError(
+        error_index=0,
+        headers={},
+        status_code=412,
+        message="stale",
+        operation_responses=[{"statusCode": 412}, {"statusCode": 424}],
+    )
+    mock_container.execute_item_batch = AsyncMock(
+        side_effect=[conflict, [{"eTag": "etag-3"}, {"eTag": "plan-etag"}]]
+    )
+
+    step.status = "completed"
+    await memory_context.update_step(step)
+
+    assert mock_container.execute_item_batch.await_count == 2
+    operations = mock_container.execute_item_batch.call_args.kwargs["batch_operations"]
+    assert operations[0][2] == {"if_match_etag": "etag-2"}
+    assert operations[1][1][1][0] == {"op": "incr", "path": "/approved", "value": -1}
+
+
+@pytest.mark.asyncio
+async def test_patch_step_sends_only_the_operations(memory_context, mock_container):
+    """A status patch and the plan counter patch share one batch conditional on the step etag."""
+    plan = _make_plan()
+    step = _make_step(plan)
+    step_doc = {**step.model_dump(mode="json"), "_etag": "etag-1"}
+    mock_container.read_item = AsyncMock(return_value=step_doc)
+    mock_container.execute_item_batch = AsyncMock(
+        return_value=[
+            {"eTag": "etag-2", "resourceBody": {**step_doc, "status": "action_requested", "_etag": "etag-2"}},
+            {"eTag": "plan-etag"},
+        ]
+    )
+    operations = set_operations(status=StepStatus.action_requested)
+
+    patched = await memory_context.patch_step(step.id, "session-1", operations)
+
+    assert operations == [{"op": "set", "path": "/status", "value": "action_requested"}]
+    step_patch, plan_patch = mock_container.execute_item_batch.call_args.kwargs["batch_operations"]
+    assert step_patch == ("patch", (step.id, operations), {"if_match_etag": "etag-1"})
+    assert plan_patch[1][1] == [
+        {"op": "incr", "path": "/planned", "value": -1},
+        {"op": "incr", "path": "/action_requested", "value": 1},
+    ]
+    assert patched.status == StepStatus.action_requested
+    mock_container.upsert_item.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_plan_keeps_stored_counters(memory_context, mock_container):
+    """Plan updates do not overwrite the counters maintained by step writes."""
+    plan = _make_plan()
+    stored_doc = {**plan.model_dump(mode="json"), "total_steps": 3, "completed": 2, "_etag": "plan-etag"}
+    mock_container.read_item = AsyncMock(return_value=stored_doc)
+    mock_container.upsert_item = AsyncMock(return_value={**stored_doc, "_etag": "plan-etag-2"})
+
+    plan.summary = "summary"
+    await memory_context.update_plan(plan)
+
+    kwargs = mock_container.upsert_item.call_args.kwargs
+    assert kwargs["etag"] == "plan-etag"
+    assert (kwargs["body"]["total_steps"], kwargs["body"]["completed"]) == (3, 2)
+    assert kwargs["body"]["summary"] == "summary"
+
+
+class _PageIterator:
+    """Mimics the page iterator returned by AsyncItemPaged.by_page."""
+
+    def __init__(self, pages, start_token):
+        self._pages = pages
+        self._index = int(start_token or 0)
+        self.continuation_token = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._index >= len(self._pages):
+            raise StopAsyncIteration
+        page = self._pages[self._index]
+        self._index += 1
+        self.continuation_token = str(self._index) if self._index < len(self._pages) else None
+        return _async_iter(page)
+
+
+def _paged_query(pages):
+    """Build a query_items mock whose results are split into the given pages."""
+    def query_items(**kwargs):
+        result = MagicMock()
+        result.by_page = lambda continuation_token=None: _PageIterator(pages, continuation_token)
+        return result
+
+    return MagicMock(side_effect=query_items)
+
+
+@pytest.mark.asyncio
+async def test_plan_listing_is_paginated(memory_context, mock_container):
+    """Plans are listed page by page, resuming from the opaque cursor."""
+    plans = [
+        {**_make_plan(session_id=f"session-{i}").model_dump(mode="json"), "_ts": 10 - i}
+        for i in range(5)
+    ]
+    mock_container.query_items = _paged_query([plans[:2], plans[2:4], plans[4:]])
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = await memory_context.get_plan_summaries(page_size=2, cursor=cursor)
+        seen.extend(plan.id for plan in page)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert seen == [plan["id"] for plan in plans]
+    kwargs = mock_container.query_items.call_args.kwargs
+    assert kwargs["max_item_count"] == 2
+    assert "partition_key" not in kwargs
+
+
+@pytest.mark.asyncio
+async def test_page_filters_since_ts(memory_context, mock_container):
+    """since_ts restricts the query to newer documents of the session partition."""
+    mock_container.query_items = _paged_query([[]])
+
+    messages, cursor = await memory_context.get_agent_messages_page(
+        "session-3", page_size=10, since_ts=1234
+    )
+
+    assert (messages, cursor) == ([], None)
+    kwargs = mock_container.query_items.call_args.kwargs
+    assert "c._ts > @since_ts" in kwargs["query"]
+    assert {"name": "@since_ts", "value": 1234} in kwargs["parameters"]
+    assert kwargs["partition_key"] == "session-3"
+
+
+@pytest.mark.asyncio
+async def test_cursor_from_other_query_is_rejected(memory_context, mock_container):
+    """A cursor issued for one listing can not be replayed against another."""
+    message = {"id": "m1", "user_id": "user-1", "_ts": 1}
+    mock_container.query_items = _paged_query([[message], [message]])
+    _, cursor = await memory_context.get_messages_page(page_size=1)
+    assert cursor is not None
+
+    with pytest.raises(InvalidCursorError):
+        await memory_context.get_plan_summaries(page_size=1, cursor=cursor)
+
+
+@pytest.mark.asyncio
+async def test_page_errors_are_raised(memory_context, mock_container):
+    """A failed page is an error, not an empty last page that ends the listing."""
+    result = MagicMock()
+    result.by_page = MagicMock(side_effect=CosmosHttpResponseError(status_code=429, message="throttled"))
+    mock_container.query_items = MagicMock(return_value=result)
+
+    with pytest.raises(CosmosHttpResponseError):
+        await memory_context.get_plan_summaries(page_size=2)
+
+
+@pytest.mark.asyncio
+async def test_iter_items_streams_validated_models(memory_context, mock_container):
+    """iter_items yields models lazily and re-raises query errors."""
+    plan = _make_plan()
+
+    async def failing_documents():
+        yield {**plan.model_dump(mode="json"), "_ts": 1}
+        raise RuntimeError("connection reset")
+
+    mock_container.query_items = MagicMock(return_value=failing_documents())
+    stream = memory_context.iter_items("SELECT * FROM c", [], Plan, page_size=50)
+
+    first = await stream.__anext__()
+    assert isinstance(first, Plan) and first.id == plan.id
+    assert mock_container.query_items.call_args.kwargs["max_item_count"] == 50
+    with pytest.raises(RuntimeError):
+        await stream.__anext__()
+
+    # query_items keeps returning an empty list on failures
+    mock_container.query_items = MagicMock(return_value=failing_documents())
+    assert await memory_context.query_items("SELECT * FROM c", [], Plan) == []
+
+
+@pytest.mark.asyncio
+async def test_iter_agent_messages_appends_queued_writes(memory_context, mock_container):
+    """Streamed agent messages end with write-behind messages not stored yet."""
+    stored = AgentMessage(
+        session_id="session-1", user_id="user-1", plan_id="p", content="a", source="s"
+    )
+    queued = AgentMessage(
+        session_id="session-1", user_id="user-1", plan_id="p", content="b", source="s"
+    )
+    mock_container.query_items = MagicMock(
+        return_value=_async_iter([{**stored.model_dump(mode="json"), "_ts": 1}])
+    )
+    memory_context._write_behind = True
+    pending = [stored.model_dump(mode="json"), queued.model_dump(mode="json")]
+
+    with patch.object(write_behind_queue, "get_pending", return_value=pending):
+        messages = [m async for m in memory_context.iter_agent_messages("session-1")]
+
+    assert [m.id for m in messages] == [stored.id, queued.id]
+
+
+@pytest.mark.asyncio
+async def test_nearest_matches_search_whole_collection_from_cache(memory_context, mock_container):
+    """Nearest matches scan every record once and reuse the matrix until a write."""
+    angles = np.linspace(0, np.pi / 2, 250)
+    documents = [
+        {"id": f"m-{i}", "key": f"k-{i}", "text": f"t-{i}", "embedding": [2 * np.cos(a), 2 * np.sin(a)]}
+        for i, a in enumerate(angles)
+    ]
+    mock_container.query_items = MagicMock(
+        side_effect=lambda **kwargs: _async_iter([dict(d) for d in documents])
+    )
+
+    matches = await memory_context.get_nearest_matches(
+        "notes", np.array([0.0, 1.0]), limit=3, with_embeddings=True
+    )
+    assert [record.id for record, _ in matches] == ["m-249", "m-248", "m-247"]
+    assert matches[0][0].embedding == pytest.approx([0.0, 2.0], abs=1e-6)
+
+    await memory_context.get_nearest_matches("notes", np.array([1.0, 0.0]), limit=1)
+    assert mock_container.query_items.call_count == 1
+    assert "LIMIT" not in mock_container.query_items.call_args.kwargs["query"]
+
+    record = MemoryRecord(
+        is_reference=False, external_source_name=None, id="m-new", description=None,
+        text="new", additional_metadata=None, embedding=np.array([0.0, 1.0]),
+    )
+    await memory_context.upsert("notes", record)
+    await memory_context.get_nearest_matches("notes", np.array([0.0, 1.0]), limit=1)
+    assert mock_container.query_items.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_nearest_matches_use_vector_index_updated_by_batches(
+    memory_context, mock_container, tmp_path
+):
+    """The vector index is built once, then kept current by batch upserts and removals."""
+    memory_context._vector_indexes = VectorIndexRegistry("ivf", str(tmp_path))
+    stored = {
+        "m-1": {"id": "m-1", "key": "k-1", "text": "east", "embedding": [1.0, 0.0], "_ts": 100},
+        "m-2": {"id": "m-2", "key": "k-2", "text": "north", "embedding": [0.0, 1.0], "_ts": 100},
+    }
+
+    def query_items(query, parameters, **kwargs):
+        values = {p["name"]: p["value"] for p in parameters}
+        if "@ids" in values:
+            return _async_iter([dict(stored[i]) for i in values["@ids"] if i in stored])
+        keys = [value for name, value in values.items() if name.startswith("@key")]
+        if keys:
+            return _async_iter([dict(d) for d in stored.values() if d["key"] in keys])
+        since_ts = values.get("@since_ts", 0)
+        return _async_iter([dict(d) for d in stored.values() if d["_ts"] >= since_ts])
+
+    mock_container.query_items = MagicMock(side_effect=query_items)
+    mock_container.delete_item = AsyncMock()
+
+    matches = await memory_context.get_nearest_matches("notes", np.array([0.1, 1.0]), limit=1)
+    assert [record.text for record, _ in matches] == ["north"]
+
+    record = MemoryRecord(
+        is_reference=False, external_source_name=None, id="m-3", description=None,
+        text="north-east", additional_metadata=None, embedding=np.array([1.0, 1.0]),
+    )
+    await memory_context.upsert_batch("notes", [record])
+    stored["m-3"] = {"id": "m-3", "key": None, "text": "north-east", "embedding": [1.0, 1.0], "_ts": 101}
+    matches = await memory_context.get_nearest_matches("notes", np.array([1.0, 0.9]), limit=1)
+    assert [record.text for record, _ in matches] == ["north-east"]
+
+    await memory_context.remove_batch("notes", ["k-2"])
+    del stored["m-2"]
+    matches = await memory_context.get_nearest_matches("notes", np.array([0.0, 1.0]), limit=3)
+    assert [record.id for record, _ in matches] == ["m-3", "m-1"]
+
+    # Only the first search scanned the whole collection, later ones caught up from its version
+    scans = [
+        c for c in mock_container.query_items.call_args_list
+        if not {"@ids", "@since_ts"} & {p["name"] for p in c.kwargs["parameters"]}
+        and "@key" not in str(c.kwargs["parameters"])
+    ]
+    assert len(scans) == 1
+
+
+@pytest.mark.asyncio
+async def test_vector_index_catches_up_with_other_writers(memory_context, mock_container, tmp_path):
+    """Records written by another process are added to an existing index on the next search."""
+    memory_context._vector_indexes = VectorIndexRegistry("ivf", str(tmp_path))
+    stored = {"m-1": {"id": "m-1", "key": "k-1", "text": "east", "embedding": [1.0, 0.0], "_ts": 100}}
+
+    def query_items(query, parameters, **kwargs):
+        values = {p["name"]: p["value"] for p in parameters}
+        if "@ids" in values:
+            return _async_iter([dict(stored[i]) for i in values["@ids"] if i in stored])
+        since_ts = values.get("@since_ts", 0)
+        return _async_iter([dict(d) for d in stored.values() if d["_ts"] >= since_ts])
+
+    mock_container.query_items = MagicMock(side_effect=query_items)
+    await memory_context.get_nearest_matches("notes", np.array([1.0, 0.0]), limit=1)
+
+    # Written by another replica, this process' index never saw the upsert
+    stored["m-2"] = {"id": "m-2", "key": "k-2", "text": "north", "embedding": [0.0, 1.0], "_ts": 105}
+    matches = await memory_context.get_nearest_matches("notes", np.array([0.0, 1.0]), limit=1)
+    assert [record.text for record, _ in matches] == ["north"]
+
+    # A restarted process loads the persisted index at its version
+    registry = VectorIndexRegistry("ivf", str(tmp_path))
+    memory_context._vector_indexes.close()
+    index = registry.get("session-1", "notes")
+    assert index.version == 105 and len(index) == 2
+
+
+@pytest.mark.asyncio
+async def test_binary_and_legacy_embeddings_are_both_read(memory_context, mock_container):
+    """Records written as base64 float32 and as JSON lists decode to the same vectors."""
+    documents = [
+        {"id": "m-1", "key": "k-1", "text": "binary", "embedding": encode_embedding(np.array([0.0, 1.0]), "float32")},
+        {"id": "m-2", "key": "k-2", "text": "legacy", "embedding": [1.0, 0.0]},
+    ]
+    mock_container.query_items = MagicMock(
+        side_effect=lambda **kwargs: _async_iter([dict(d) for d in documents])
+    )
+
+    matches = await memory_context.get_nearest_matches(
+        "notes", np.array([0.0, 1.0]), limit=2, min_relevance_score=-1, with_embeddings=True
+    )
+    assert [record.text for record, _ in matches] == ["binary", "legacy"]
+    assert matches[0][0].embedding == pytest.approx([0.0, 1.0])
+
+    records = await memory_context.get_memory_records("notes", with_embeddings=True)
+    assert [r.embedding.tolist() for r in records] == [[0.0, 1.0], [1.0, 0.0]]
+
+    record = MemoryRecord(
+        is_reference=False, external_source_name=None, id="m-3", description=None,
+        text="new", additional_metadata=None, embedding=np.array([0.5, 0.5]),
+    )
+    with patch("context.embedding_codec.config.COSMOSDB_EMBEDDING_FORMAT", "float32"):
+        await memory_context.upsert("notes", record)
+    stored = mock_container.upsert_item.call_args.kwargs["body"]["embedding"]
+    assert stored["dtype"] == "<f4" and stored["shape"] == [2]
+
+
+def _memory_record(record_id, key, embedding=(1.0, 0.0)):
+    return MemoryRecord(
+        is_reference=False, external_source_name=None, id=record_id, description=None,
+        text=f"text {key}", additional_metadata=None, embedding=np.array(embedding), key=key,
+    )
+
+
+@pytest.mark.asyncio
+async def test_upsert_batch_uses_concurrent_transactional_batches(memory_context, mock_container):
+    """Records are chunked into transactional batches, sent at most batch_concurrency at a time."""
+    memory_context._batch_concurrency = 2
+    in_flight, peak = 0, 0
+
+    async def execute_item_batch(batch_operations, partition_key):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        return [{"statusCode": 200} for _ in batch_operations]
+
+    mock_container.execute_item_batch = AsyncMock(side_effect=execute_item_batch)
+    records = [_memory_record(f"m-{i}", f"k-{i}") for i in range(250)]
+
+    ids = await memory_context.upsert_batch("notes", records)
+
+    assert ids == [f"m-{i}" for i in range(250)]
+    sizes = [len(c.kwargs["batch_operations"]) for c in mock_container.execute_item_batch.call_args_list]
+    assert sizes == [100, 100, 50]
+    assert peak == 2
+    assert all(c.kwargs["partition_key"] == "session-1" for c in mock_container.execute_item_batch.call_args_list)
+    mock_container.upsert_item.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_batch_uses_one_in_list_query_and_keeps_key_order(memory_context, mock_container):
+    documents = [
+        {"id": "m-2", "key": "k-2", "text": "two", "embedding": [0.0, 1.0]},
+        {"id": "m-1", "key": "k-1", "text": "one", "embedding": [1.0, 0.0]},
+    ]
+    mock_container.query_items = MagicMock(return_value=_async_iter(documents))
+
+    records = await memory_context.get_batch("notes", ["k-1", "missing", "k-2"], with_embeddings=True)
+
+    assert [r.text for r in records] == ["one", "two"]
+    assert records[1].embedding.tolist() == [0.0, 1.0]
+    assert mock_container.query_items.call_count == 1
+    kwargs = mock_container.query_items.call_args.kwargs
+    assert "c.key IN (@key0, @key1, @key2)" in kwargs["query"]
+    assert kwargs["partition_key"] == "session-1"
+
+
+@pytest.mark.asyncio
+async def test_remove_batch_deletes_in_one_batch(memory_context, mock_container):
+    mock_container.query_items = MagicMock(return_value=_async_iter([
+        {"id": "m-1", "key": "k-1"}, {"id": "m-2", "key": "k-2"},
+    ]))
+    mock_container.execute_item_batch = AsyncMock(return_value=[])
+    mock_container.delete_item = AsyncMock()
+
+    await memory_context.remove_batch("notes", ["k-1", "k-2"])
+
+    operations = mock_container.execute_item_batch.call_args.kwargs["batch_operations"]
+    assert operations == [("delete", ("m-1",)), ("delete", ("m-2",))]
+    mock_container.delete_item.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_save_chat_history_writes_one_batch(memory_context, mock_container):
+    history = ChatHistory()
+    history.add_user_message("hello")
+    history.add_assistant_message("hi")
+    mock_container.execute_item_batch = AsyncMock(return_value=[])
+
+    await memory_context.save_chat_history(history)
+
+    operations = mock_container.execute_item_batch.call_args.kwargs["batch_operations"]
+    assert [op[1][0]["content"]["content"] for op in operations] == ["hello", "hi"]
+    assert all(op[0] == "create" for op in operations)
+    mock_container.create_item.assert_not_called()
+    assert len(memory_context.get_chat_history().messages) == 2
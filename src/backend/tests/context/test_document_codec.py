@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.document_codec import DocumentDecoder, encode_document, strip_system_fields
+from models.messages_kernel import AgentType, Step, StepStatus
+
+SYSTEM = {"_rid": "rid", "_self": "self", "_attachments": "attachments/", "_etag": '"e"', "_ts": 1}
+
+
+def _documents():
+    return [
+        {
+            **encode_document(Step(
+                plan_id="plan", session_id="s", user_id="u", action=f"a{i}", agent=AgentType.HR,
+                status=StepStatus.completed,
+            )),
+            **SYSTEM,
+        }
+        for i in range(3)
+    ]
+
+
+def test_decode_matches_model_validate():
+    decoder = DocumentDecoder()
+    documents = _documents()
+
+    steps = decoder.decode_many(documents, Step)
+
+    assert steps == [Step.model_validate(document) for document in documents]
+    assert decoder.decode(documents[0], Step) == steps[0]
+    assert steps[0].status is StepStatus.completed
+    assert steps[0].timestamp.tzinfo is not None
+
+
+def test_invalid_documents_still_fail():
+    decoder = DocumentDecoder()
+    documents = _documents()
+    documents[1]["agent"] = "Unknown_Agent"
+
+    with pytest.raises(ValidationError):
+        decoder.decode_many(documents, Step)
+    with pytest.raises(ValidationError):
+        decoder.decode({"id": "x"}, Step)
+
+
+def test_encode_document_is_json_ready():
+    step = Step(
+        plan_id="plan", session_id="s", user_id="u", action="a", agent=AgentType.HR,
+        status=StepStatus.completed,
+    )
+
+    document = encode_document(step)
+
+    assert document == json.loads(json.dumps(document)) == json.loads(step.model_dump_json())
+    assert document["status"] == "completed"
+    assert DocumentDecoder().decode(document, Step) == step
+
+
+def test_strip_system_fields():
+    document = {"id": "a", "session_id": "s", **SYSTEM}
+
+    assert strip_system_fields(document) == {"id": "a", "session_id": "s", "_etag": '"e"', "_ts": 1}
+    assert "_rid" in document
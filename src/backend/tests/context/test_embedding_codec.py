@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.embedding_codec import decode_embedding, encode_embedding
+
+
+def test_float32_round_trip_is_compact_and_exact():
+    embedding = np.random.default_rng(0).normal(size=1536)
+
+    encoded = encode_embedding(embedding, "float32")
+    decoded = decode_embedding(json.loads(json.dumps(encoded)))
+
+    assert encoded["dtype"] == "<f4"
+    assert encoded["shape"] == [1536]
+    assert decoded.dtype == np.float32
+    assert decoded == pytest.approx(embedding.astype(np.float32))
+    assert len(json.dumps(encoded)) < len(json.dumps(embedding.tolist())) / 3
+
+
+def test_float16_round_trip():
+    embedding = np.array([0.5, -0.25, 1.0])
+
+    decoded = decode_embedding(encode_embedding(embedding, "float16"))
+
+    assert decoded.dtype == np.float16
+    assert decoded.tolist() == [0.5, -0.25, 1.0]
+
+
+def test_legacy_lists_stay_readable():
+    assert encode_embedding(np.array([1.0, 2.0]), "list") == [1.0, 2.0]
+    assert decode_embedding([1.0, 2.0]).tolist() == [1.0, 2.0]
+    assert decode_embedding([]) is None
+    assert decode_embedding(None) is None
+    assert encode_embedding(None, "float32") is None
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        encode_embedding(np.zeros(2), "int8")
+    with pytest.raises(ValueError):
+        decode_embedding({"dtype": "<i4", "shape": [1], "data": "AAAAAA=="})
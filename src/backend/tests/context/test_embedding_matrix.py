@@ -0,0 +1,74 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from context.embedding_matrix import EmbeddingMatrix, EmbeddingMatrixCache
+
+
+def _matrix(vectors):
+    documents = [{"id": f"doc-{i}"} for i in range(len(vectors))]
+    return EmbeddingMatrix(documents, [list(v) for v in vectors])
+
+
+def test_search_matches_exact_cosine_ranking():
+    """Top-k from the matrix equals a brute-force cosine ranking."""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 32))
+    query = rng.normal(size=32)
+    expected = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+
+    matches = _matrix(vectors).search(query, limit=10, min_relevance_score=-1)
+
+    assert [row for row, _ in matches] == list(np.argsort(-expected)[:10])
+    assert [score for _, score in matches] == pytest.approx(
+        sorted(expected, reverse=True)[:10], abs=1e-5
+    )
+
+
+def test_matrix_is_normalized_float32_and_keeps_embeddings():
+    vectors = [[3.0, 4.0], [0.0, 2.0]]
+    matrix = _matrix(vectors)
+
+    assert matrix.vectors.dtype == np.float32
+    assert matrix.vectors.flags["C_CONTIGUOUS"]
+    assert np.linalg.norm(matrix.vectors, axis=1) == pytest.approx([1.0, 1.0])
+    assert matrix.embedding(0) == pytest.approx([3.0, 4.0])
+
+
+def test_search_filters_and_handles_degenerate_input():
+    matrix = _matrix([[1.0, 0.0], [0.0, 1.0], [0.0, 0.0]])
+
+    assert matrix.search(np.array([1.0, 0.0]), limit=5, min_relevance_score=0.5) == [(0, 1.0)]
+    assert matrix.search(np.array([0.0, 0.0]), limit=5) == []
+    assert _matrix([]).search(np.array([1.0]), limit=5) == []
+    with pytest.raises(ValueError):
+        matrix.search(np.array([1.0, 0.0, 0.0]), limit=1)
+
+
+def test_cache_skips_matrix_built_before_a_write():
+    """A matrix built while the collection changed is not cached."""
+    cache = EmbeddingMatrixCache(max_collections=2)
+    version = cache.version("session", "notes")
+    cache.invalidate("session", "notes")
+
+    cache.put("session", "notes", _matrix([[1.0]]), version)
+    assert cache.get("session", "notes") is None
+
+    cache.put("session", "notes", _matrix([[1.0]]), cache.version("session", "notes"))
+    assert cache.get("session", "notes") is not None
+
+
+def test_cache_evicts_least_recently_used():
+    cache = EmbeddingMatrixCache(max_collections=2)
+    for name in ("a", "b"):
+        cache.put("session", name, _matrix([[1.0]]), 0)
+    cache.get("session", "a")
+    cache.put("session", "c", _matrix([[1.0]]), 0)
+
+    assert cache.get("session", "b") is None
+    assert cache.get("session", "a") is not None
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.hedging import HedgePolicy
+from context.plan_cache import PlanCache
+from models.messages_kernel import AgentType, Step
+
+
+def _reads(*delays, error=None):
+    """A read whose successive requests take the given seconds, the first one failing if error is set."""
+    calls = []
+
+    async def request(delay, fail):
+        await asyncio.sleep(delay)
+        if fail:
+            raise error
+        return len(calls)
+
+    def read():
+        calls.append(1)
+        return request(delays[len(calls) - 1], error is not None and len(calls) == 1)
+
+    return read, calls
+
+
+async def _warm_up(policy, name="get_step"):
+    read, _ = _reads(*[0] * 3)
+    for _ in range(3):
+        await policy.run(name, read)
+
+
+@pytest.mark.asyncio
+async def test_slow_read_is_hedged_and_hedge_wins():
+    policy = HedgePolicy(enabled=True, budget=1.0, min_delay_ms=20, min_samples=3)
+    await _warm_up(policy)
+
+    read, calls = _reads(1.0, 0)
+    assert await policy.run("get_step", read) == 2
+
+    metrics = policy.get_metrics()["get_step"]
+    assert len(calls) == 2
+    assert (metrics["hedged"], metrics["hedge_wins"], metrics["hedge_rate"], metrics["win_rate"]) == (1, 1, 0.25, 1.0)
+    assert metrics["delay_ms"] == 20
+
+
+@pytest.mark.asyncio
+async def test_budget_caps_hedges():
+    policy = HedgePolicy(enabled=True, budget=0.0, min_delay_ms=10, min_samples=3)
+    await _warm_up(policy)
+
+    read, calls = _reads(0.05, 0)
+    assert await policy.run("get_step", read) == 1
+
+    assert len(calls) == 1
+    assert policy.get_metrics()["get_step"]["denied"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_request_falls_back_to_the_other():
+    policy = HedgePolicy(enabled=True, budget=1.0, min_delay_ms=10, min_samples=3)
+    await _warm_up(policy)
+
+    read, _ = _reads(0.05, 0.1, error=ConnectionError("reset"))
+    assert await policy.run("get_step", read) == 2
+
+    attempts = []
+
+    async def failing(number):
+        await asyncio.sleep(0.05)
+        raise ConnectionError(f"request {number}")
+
+    def read_failing():
+        attempts.append(1)
+        return failing(len(attempts))
+
+    with pytest.raises(ConnectionError, match="request 1"):
+        await policy.run("get_step", read_failing)
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_get_step_reads_are_hedged():
+    step = Step(plan_id="plan-1", session_id="session-1", user_id="user-1", action="a", agent=AgentType.HR)
+    document = step.model_dump(mode="json")
+    delays = iter([0, 0, 0, 1.0, 0])
+
+    async def read_item(**kwargs):
+        await asyncio.sleep(next(delays))
+        return dict(document)
+
+    container = MagicMock()
+    container.read_item = AsyncMock(side_effect=read_item)
+    context = CosmosMemoryContext("session-1", "user-1", "container", "https://endpoint", "db")
+    context._container = container
+    context._plan_cache = PlanCache(max_sessions=16, ttl_seconds=0)
+    context._hedging = HedgePolicy(enabled=True, budget=1.0, min_delay_ms=20, min_samples=3)
+
+    for _ in range(4):
+        assert (await context.get_step(step.id, "session-1")).id == step.id
+
+    assert container.read_item.await_count == 5
+    assert context._hedging.get_metrics()["get_step"]["hedge_wins"] == 1
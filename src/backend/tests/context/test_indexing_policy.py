@@ -0,0 +1,79 @@
+import copy
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from context.indexing_policy import (
+    MEMORY_INDEXING_POLICY,
+    compare_indexing_policy,
+    migrate_indexing_policy,
+    verify_indexing_policy,
+)
+
+
+def _live_policy():
+    """The expected policy as Cosmos DB returns it, reordered and with its system path."""
+    policy = copy.deepcopy(MEMORY_INDEXING_POLICY)
+    policy["indexingMode"] = "Consistent"
+    policy["excludedPaths"] = list(reversed(policy["excludedPaths"])) + [{"path": '/"_etag"/?'}]
+    policy["compositeIndexes"] = list(reversed(policy["compositeIndexes"]))
+    return policy
+
+
+def test_policy_excludes_large_fields_and_indexes_listings():
+    excluded = {entry["path"] for entry in MEMORY_INDEXING_POLICY["excludedPaths"]}
+    assert {"/content/*", "/agent_reply/*", "/action/*", "/text/*", "/embedding/*"} <= excluded
+    # Every path the queries filter or sort on stays indexed
+    for field in ("user_id", "session_id", "data_type", "plan_id", "collection", "key", "_ts", "id"):
+        assert not any(path.startswith(f"/{field}/") for path in excluded)
+
+    composites = [
+        [(entry["path"], entry["order"]) for entry in index]
+        for index in MEMORY_INDEXING_POLICY["compositeIndexes"]
+    ]
+    assert [("/user_id", "ascending"), ("/data_type", "ascending"), ("/_ts", "descending")] in composites
+    assert [("/session_id", "ascending"), ("/data_type", "ascending"), ("/_ts", "ascending")] in composites
+
+
+def test_compare_ignores_order_and_system_paths():
+    assert compare_indexing_policy(_live_policy()) == []
+
+
+def test_compare_reports_the_default_policy():
+    default = {
+        "indexingMode": "consistent",
+        "automatic": True,
+        "includedPaths": [{"path": "/*"}],
+        "excludedPaths": [{"path": '/"_etag"/?'}],
+    }
+
+    differences = compare_indexing_policy(default)
+
+    assert "excludedPaths is missing /content/*" in differences
+    assert sum(d.startswith("compositeIndexes is missing") for d in differences) == 4
+    assert not any("unexpected" in d for d in differences)
+
+
+@pytest.mark.asyncio
+async def test_verify_and_migrate():
+    container = MagicMock()
+    container.read = AsyncMock(return_value={
+        "indexingPolicy": _live_policy(),
+        "partitionKey": {"paths": ["/session_id"], "kind": "Hash"},
+    })
+    assert await verify_indexing_policy(container) == []
+
+    database = MagicMock()
+    database.get_container_client.return_value = container
+    database.replace_container = AsyncMock(return_value=container)
+
+    await migrate_indexing_policy(database, "memory")
+
+    kwargs = database.replace_container.await_args.kwargs
+    assert kwargs["indexing_policy"] == MEMORY_INDEXING_POLICY
+    assert kwargs["partition_key"]["paths"] == ["/session_id"]
@@ -0,0 +1,168 @@
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.embedding_matrix import EmbeddingMatrixCache
+from context.instrumentation import MemoryInstrumentation
+from context.plan_cache import PlanCache
+from context.throttling import ThrottledContainer, ThrottlingPolicy
+from models.messages_kernel import AgentType, Plan, Step
+
+
+class _Pages:
+    """Async page iterator of an SDK query reporting a request charge per page."""
+
+    def __init__(self, pages, response_hook):
+        self._pages = pages
+        self._hook = response_hook
+        self.continuation_token = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._pages:
+            raise StopAsyncIteration
+        self._hook({"x-ms-request-charge": "3.5"}, None)
+        page = self._pages.pop(0)
+        self.continuation_token = "more" if self._pages else None
+
+        async def items():
+            for item in page:
+                yield item
+
+        return items()
+
+
+@pytest.fixture
+def telemetry():
+    spans = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(spans))
+    metrics = InMemoryMetricReader()
+    instrumentation = MemoryInstrumentation(
+        # Every operation counts as slow
+        slow_threshold_ms=1e-9,
+        tracer_provider=tracer_provider,
+        meter_provider=MeterProvider(metric_readers=[metrics]),
+    )
+    return instrumentation, spans, metrics
+
+
+def _context(proxy, instrumentation):
+    context = CosmosMemoryContext(
+        session_id="session-1",
+        user_id="user-1",
+        cosmos_container="container",
+        cosmos_endpoint="https://endpoint",
+        cosmos_database="db",
+    )
+    context._container = ThrottledContainer(proxy, ThrottlingPolicy(), instrumentation)
+    context._plan_cache = PlanCache(max_sessions=16, ttl_seconds=60)
+    context._embedding_matrices = EmbeddingMatrixCache()
+    return context
+
+
+def _steps():
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    return [
+        Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action=f"a{i}", agent=AgentType.HR)
+        for i in range(3)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_queries_are_tagged_with_the_calling_method(telemetry):
+    instrumentation, spans, metrics = telemetry
+    steps = [{**step.model_dump(mode="json"), "_ts": 1, "_etag": "etag"} for step in _steps()]
+    proxy = MagicMock()
+
+    def query_items(*args, response_hook=None, **kwargs):
+        step_query = "c.plan_id" in kwargs["query"]
+        iterable = MagicMock()
+        iterable.by_page.side_effect = lambda token=None: _Pages(
+            [steps[:2], steps[2:]] if step_query else [[]], response_hook
+        )
+        return iterable
+
+    proxy.query_items = query_items
+    context = _context(proxy, instrumentation)
+
+    assert len(await context.get_steps_by_plan("plan-1", session_id="session-1")) == 3
+    await context.get_all_plans()
+
+    stats = instrumentation.stats()
+    assert stats["get_steps_by_plan"]["query"]["result_count"] == 3
+    assert stats["get_steps_by_plan"]["query"]["request_charge"] == 7.0
+    assert "get_all_plans" in stats
+
+    [steps_span, plans_span] = spans.get_finished_spans()
+    assert steps_span.name == "cosmosdb query"
+    assert steps_span.attributes["code.function"] == "get_steps_by_plan"
+    assert steps_span.attributes["db.cosmosdb.cross_partition"] is False
+    assert steps_span.attributes["db.response.returned_rows"] == 3
+    assert plans_span.attributes["db.cosmosdb.cross_partition"] is True
+
+    names = {
+        metric.name
+        for resource in metrics.get_metrics_data().resource_metrics
+        for scope in resource.scope_metrics
+        for metric in scope.metrics
+    }
+    assert names == {
+        "memory.operation.duration",
+        "memory.operation.request_charge",
+        "memory.operation.result_count",
+    }
+
+
+@pytest.mark.asyncio
+async def test_point_reads_and_slow_log(telemetry):
+    instrumentation, spans, _ = telemetry
+    proxy = MagicMock()
+    proxy.read_item = AsyncMock(side_effect=CosmosResourceNotFoundError(message="missing"))
+    context = _context(proxy, instrumentation)
+
+    assert await context.get_plan_list_view() is None
+
+    [span] = spans.get_finished_spans()
+    assert span.attributes["code.function"] == "get_plan_list_view"
+    # A miss is not an error
+    assert span.status.is_ok
+    [slow] = instrumentation.slow_operations()
+    assert (slow["method"], slow["operation"], slow["result_count"]) == ("get_plan_list_view", "read", 0)
+
+
+@pytest.mark.asyncio
+async def test_fast_operations_stay_out_of_the_slow_log():
+    instrumentation = MemoryInstrumentation(slow_threshold_ms=10_000)
+    proxy = MagicMock()
+    proxy.read_item = AsyncMock(return_value={"id": "a"})
+    container = ThrottledContainer(proxy, ThrottlingPolicy(), instrumentation)
+
+    await container.read_item(item="a", partition_key="s")
+
+    assert instrumentation.slow_operations() == []
+    assert instrumentation.stats()["unknown"]["read"]["operations"] == 1
@@ -0,0 +1,136 @@
+import os
+import sys
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context import large_text
+from context.document_codec import DocumentDecoder, set_operations
+from context.embedding_matrix import EmbeddingMatrixCache
+from context.large_text import FileBlobStore, LargeTextStore, MissingBlobError, compress, decompress
+from context.plan_cache import PlanCache
+from context.sqlite_memory_kernel import SqliteContainer, SqliteMemoryContext
+from models.messages_kernel import AgentMessage, AgentType, Plan, Step, StepStatus
+
+REPLY = "a long agent reply " * 100
+
+
+def _blobs(directory):
+    return [name for _, _, names in os.walk(directory) for name in names]
+
+
+@pytest.mark.asyncio
+async def test_texts_are_stored_once_and_hydrated(tmp_path):
+    store = LargeTextStore(FileBlobStore(str(tmp_path)), threshold=1000)
+    step = await store.offload({"id": "s", "agent_reply": REPLY, "action": "short"})
+    message = await store.offload({"id": "m", "content": REPLY})
+
+    assert step["agent_reply"] == message["content"]
+    assert step["agent_reply"]["length"] == len(REPLY) and step["action"] == "short"
+    assert len(_blobs(tmp_path)) == 1
+    assert (await store.hydrate(step))["agent_reply"] == REPLY
+    assert await store.hydrate(step) is not step
+
+    cold = LargeTextStore(FileBlobStore(str(tmp_path)), threshold=1000)
+    assert (await cold.hydrate(message))["content"] == REPLY
+    assert (await cold.hydrate(message))["content"] == REPLY
+    assert (cold.get_metrics()["misses"], cold.get_metrics()["hits"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_references_are_loaded_when_read(tmp_path):
+    store = LargeTextStore(FileBlobStore(str(tmp_path)), threshold=1000)
+    document = await store.offload(
+        Step(plan_id="p", session_id="s", user_id="u", action="a", agent=AgentType.HR, agent_reply=REPLY)
+        .model_dump(mode="json")
+    )
+
+    cold = LargeTextStore(FileBlobStore(str(tmp_path)), threshold=1000)
+    step = DocumentDecoder(cold).decode(document, Step)
+    assert step.action == "a"
+    assert cold.get_metrics()["misses"] == 0
+    assert step.agent_reply == REPLY
+    assert step.model_dump()["agent_reply"] == REPLY
+    assert cold.get_metrics()["misses"] == 1
+
+    [unread] = DocumentDecoder(cold).decode_many([document], Step)
+    assert unread.model_dump_json() == step.model_dump_json()
+
+    resolved = DocumentDecoder(cold).decode(document, Step)
+    assert list(resolved.deferred_fields()) == ["agent_reply"]
+    await cold.resolve([resolved])
+    assert resolved.deferred_fields() == {} and resolved.agent_reply == REPLY
+
+
+@pytest.mark.asyncio
+async def test_missing_blobs_are_errors(tmp_path):
+    store = LargeTextStore(FileBlobStore(str(tmp_path / "one")), threshold=1000)
+    document = await store.offload({"id": "m", "content": REPLY})
+
+    # A replica that does not share the blob directory
+    other = LargeTextStore(FileBlobStore(str(tmp_path / "other")), threshold=1000)
+    with pytest.raises(MissingBlobError):
+        await other.hydrate(document)
+    message = DocumentDecoder(other).decode(
+        {**document, "session_id": "s", "user_id": "u", "plan_id": "p", "source": "agent"}, AgentMessage
+    )
+    with pytest.raises(MissingBlobError):
+        message.content
+
+
+def test_zstd_blobs_need_zstandard(monkeypatch):
+    assert decompress(compress(b"text")) == b"text"
+
+    monkeypatch.setattr(large_text, "zstandard", None)
+    with pytest.raises(RuntimeError):
+        decompress(large_text.ZSTD_MAGIC + b"frame")
+
+
+@pytest.mark.asyncio
+async def test_memory_context_offloads_long_fields(tmp_path):
+    container = SqliteContainer(str(tmp_path / "memory.db"))
+    store = LargeTextStore(FileBlobStore(str(tmp_path / "blobs")), threshold=1000)
+    context = SqliteMemoryContext("session-1", "user-1", database_path=container.path)
+    context._container = container
+    context._plan_cache = PlanCache(max_sessions=16, ttl_seconds=0)
+    context._embedding_matrices = EmbeddingMatrixCache()
+    context._large_text = store
+    context._decoder = DocumentDecoder(store)
+
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    step = Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action="a", agent=AgentType.HR)
+    plan.set_step_counts([step])
+    await context.add_items_batch([plan, step])
+    await context.patch_step(
+        step.id, "session-1", set_operations(status=StepStatus.completed, agent_reply=REPLY)
+    )
+    await context.add_item(AgentMessage(
+        session_id="session-1", user_id="user-1", plan_id=plan.id, content=REPLY, source="agent",
+    ))
+
+    stored = await container.read_item(step.id, partition_key="session-1")
+    assert stored["agent_reply"]["$blob"]
+    assert len(_blobs(tmp_path / "blobs")) == 1
+
+    # Reads load the texts in worker threads before returning, never on first access
+    cold = LargeTextStore(FileBlobStore(str(tmp_path / "blobs")), threshold=1000)
+    cold.load_blocking = None
+    context._large_text = cold
+    context._decoder = DocumentDecoder(cold)
+    assert (await context.get_step(step.id, "session-1")).agent_reply == REPLY
+    messages = await context.get_agent_messages_by_session("session-1")
+    assert messages[0].content == REPLY
+    assert [d for d in await context.get_all_messages() if d["id"] == step.id][0]["agent_reply"] == REPLY
+    container.close()
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from context.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+    query_scope,
+)
+
+QUERY = "SELECT * FROM c WHERE c.user_id=@user_id"
+PARAMETERS = [{"name": "@user_id", "value": "user-1"}]
+
+
+def test_cursor_round_trip():
+    """A cursor decodes back to the state it was created from."""
+    scope = query_scope(QUERY, PARAMETERS)
+    cursor = encode_cursor({"token": '{"compositeToken":"+RID:~abc=="}'}, scope)
+
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor, scope) == {"token": '{"compositeToken":"+RID:~abc=="}'}
+
+
+def test_no_cursor_means_first_page():
+    assert decode_cursor(None, query_scope(QUERY, PARAMETERS)) is None
+    assert decode_cursor("", query_scope(QUERY, PARAMETERS)) is None
+
+
+def test_cursor_is_bound_to_its_query():
+    """A cursor can not resume a query with different parameters."""
+    cursor = encode_cursor({"token": "t"}, query_scope(QUERY, PARAMETERS))
+    other_scope = query_scope(QUERY, [{"name": "@user_id", "value": "user-2"}])
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, other_scope)
+
+
+def test_cursor_is_bound_to_its_container():
+    """A cursor issued before the memory container was migrated is rejected."""
+    cursor = encode_cursor({"token": "t"}, query_scope(QUERY, PARAMETERS, "memory"))
+
+    assert decode_cursor(cursor, query_scope(QUERY, PARAMETERS, "memory")) == {"token": "t"}
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, query_scope(QUERY, PARAMETERS, "memory-v2"))
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor", query_scope(QUERY, PARAMETERS))
@@ -0,0 +1,139 @@
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.change_feed import FileLeaseStore
+from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.embedding_matrix import EmbeddingMatrixCache
+from context.partitioning import PartitionLayout, copy_documents
+from context.plan_cache import PlanCache
+from context.sqlite_memory_kernel import SqliteContainer, SqliteMemoryContext
+from models.messages_kernel import AgentMessage, AgentType, Plan, Step, StepStatus
+
+HIERARCHICAL = PartitionLayout(PartitionLayout.HIERARCHICAL)
+
+
+@pytest.fixture
+def container(tmp_path):
+    container = SqliteContainer(str(tmp_path / "memory.db"))
+    yield container
+    container.close()
+
+
+def _context(context_class, container, session_id="session-1", user_id="user-1", **kwargs):
+    context = context_class(session_id, user_id, **kwargs)
+    context._container = container
+    context._plan_cache = PlanCache(max_sessions=16, ttl_seconds=60)
+    context._embedding_matrices = EmbeddingMatrixCache()
+    context._partition_layout = HIERARCHICAL
+    return context
+
+
+def test_layouts():
+    session = PartitionLayout()
+    assert session.key("user-1", "session-1") == "session-1"
+    assert session.user_prefix("user-1") is None
+    assert session.partition_key()["paths"] == ["/session_id"]
+
+    assert HIERARCHICAL.key("user-1", "session-1") == ["user-1", "session-1"]
+    assert HIERARCHICAL.document_key({"user_id": "user-1", "session_id": "session-1"}) == ["user-1", "session-1"]
+    assert HIERARCHICAL.user_prefix("user-1") == ["user-1"]
+    definition = HIERARCHICAL.partition_key()
+    assert (definition["paths"], definition["kind"]) == (["/user_id", "/session_id"], "MultiHash")
+
+    with pytest.raises(ValueError):
+        PartitionLayout("user")
+
+
+@pytest.mark.asyncio
+async def test_user_queries_are_routed_to_the_user_prefix():
+    async def no_items():
+        for item in []:
+            yield item
+
+    proxy = MagicMock()
+    proxy.query_items = MagicMock(side_effect=lambda **kwargs: no_items())
+    proxy.read_item = AsyncMock(return_value=Step(
+        plan_id="plan-1", session_id="session-2", user_id="user-1", action="a", agent=AgentType.HR
+    ).model_dump(mode="json"))
+    context = _context(
+        CosmosMemoryContext, proxy, cosmos_container="c", cosmos_endpoint="https://e", cosmos_database="d"
+    )
+
+    await context.get_all_plans()
+    await context.get_all_sessions()
+    await context.get_steps_by_plan("plan-1")
+    await context.get_agent_messages_by_session("session-2")
+    await context.get_step("step-1", "session-2")
+
+    scopes = [call.kwargs["partition_key"] for call in proxy.query_items.call_args_list]
+    assert scopes == [["user-1"], ["user-1"], ["user-1"], ["user-1", "session-2"]]
+    sessions_call = proxy.query_items.call_args_list[1].kwargs
+    assert {"name": "@user_id", "value": "user-1"} in sessions_call["parameters"]
+    assert proxy.read_item.await_args.kwargs["partition_key"] == ["user-1", "session-2"]
+
+
+@pytest.mark.asyncio
+async def test_hierarchical_keys_round_trip(container):
+    context = _context(SqliteMemoryContext, container, database_path=container.path)
+    other = _context(SqliteMemoryContext, container, session_id="session-2", user_id="user-2",
+                     database_path=container.path)
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    steps = [
+        Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action=f"a{i}", agent=AgentType.HR)
+        for i in range(2)
+    ]
+    plan.set_step_counts(steps)
+    await context.add_items_batch([plan, *steps])
+    await other.add_plan(Plan(session_id="session-2", user_id="user-2", initial_goal="other goal"))
+    await context.add_agent_message(AgentMessage(
+        session_id="session-1", user_id="user-1", plan_id=plan.id, content="hello", source="agent",
+    ))
+
+    steps[0].status = StepStatus.completed
+    await context.update_step(steps[0])
+
+    assert [p.initial_goal for p in await context.get_all_plans()] == ["goal"]
+    assert (await context.get_plan_by_session("session-1")).completed == 1
+    assert [m.content for m in await context.get_agent_messages_by_session("session-1")] == ["hello"]
+
+    await context.delete_item(steps[1].id, "session-1")
+    assert await context.get_step(steps[1].id, "session-1") is None
+
+
+@pytest.mark.asyncio
+async def test_copy_documents_catches_up(tmp_path, container):
+    target = SqliteContainer(str(tmp_path / "target.db"))
+    lease_store = FileLeaseStore(str(tmp_path / "leases"))
+    for i in range(3):
+        await container.create_item({"id": f"doc-{i}", "session_id": "session-1", "user_id": "user-1"})
+
+    assert await copy_documents(container, target, lease_store, "migration", "owner-1", page_size=2) == 3
+
+    await container.upsert_item({"id": "doc-0", "session_id": "session-1", "user_id": "user-1", "value": 1})
+    await container.create_item({"id": "doc-3", "session_id": "session-2", "user_id": "user-1"})
+    assert await copy_documents(container, target, lease_store, "migration", "owner-1") == 2
+
+    copied = await target.read_item("doc-0", partition_key=["user-1", "session-1"])
+    assert copied["value"] == 1
+    assert len([d async for d in target.query_items("SELECT * FROM c", partition_key=["user-1"])]) == 4
+
+    lease_store.acquire("migration", "owner-2", 60)
+    with pytest.raises(RuntimeError):
+        await copy_documents(container, target, lease_store, "migration", "owner-1")
+    target.close()
@@ -0,0 +1,138 @@
+import os
+import sys
+from unittest.mock import patch
+
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.plan_cache import PlanCache
+from models.messages_kernel import AgentType, Plan, Step
+
+
+def _plan(session_id):
+    return Plan(session_id=session_id, user_id="user-1", initial_goal="goal")
+
+
+def _step(plan):
+    return Step(
+        plan_id=plan.id,
+        session_id=plan.session_id,
+        user_id="user-1",
+        action="action",
+        agent=AgentType.HR,
+    )
+
+
+def test_returns_copies():
+    """Mutating a returned plan does not change the cached copy."""
+    cache = PlanCache(max_sessions=4, ttl_seconds=60)
+    plan = _plan("s1")
+    cache.put_plan("user-1", plan, "etag")
+
+    cached = cache.get_plan("user-1", "s1")
+    cached.summary = "changed"
+
+    assert cache.get_plan("user-1", "s1").summary is None
+    assert cache.get_plan("user-2", "s1") is None
+
+
+def test_lru_eviction():
+    """The least recently used session is evicted when the cache is full."""
+    cache = PlanCache(max_sessions=2, ttl_seconds=60)
+    plans = [_plan(f"s{i}") for i in range(3)]
+    cache.put_plan("user-1", plans[0], None)
+    cache.put_plan("user-1", plans[1], None)
+    cache.get_plan("user-1", "s0")  # s0 becomes most recently used
+    cache.put_plan("user-1", plans[2], None)
+
+    assert cache.get_plan("user-1", "s1") is None
+    assert cache.get_plan("user-1", "s0") is not None
+    assert cache.evictions == 1
+
+
+def test_ttl_expiry():
+    """Entries expire after the configured TTL."""
+    cache = PlanCache(max_sessions=4, ttl_seconds=10)
+    plan = _plan("s1")
+    with patch("context.plan_cache.time.monotonic", return_value=100.0):
+        cache.put_plan("user-1", plan, None)
+        cache.put_steps("user-1", "s1", plan.id, [(_step(plan), "e1")])
+    with patch("context.plan_cache.time.monotonic", return_value=105.0):
+        assert cache.get_steps("user-1", plan.id) is not None
+    with patch("context.plan_cache.time.monotonic", return_value=111.0):
+        assert cache.get_plan("user-1", "s1") is None
+        assert cache.get_steps("user-1", plan.id) is None
+
+
+def test_put_step_updates_cached_list_and_etag():
+    """Updating a step refreshes both the model and its etag."""
+    cache = PlanCache(max_sessions=4, ttl_seconds=60)
+    plan = _plan("s1")
+    step = _step(plan)
+    cache.put_steps("user-1", "s1", plan.id, [(step, "e1")])
+
+    step.status = "completed"
+    cache.put_step("user-1", step, "e2")
+
+    assert cache.get_steps("user-1", plan.id)[0].status == "completed"
+    assert cache.get_etag("user-1", "s1", step.id) == "e2"
+    cache.invalidate_user("user-1")
+    assert cache.get_step("user-1", "s1", step.id) is None
+
+
+def test_disabled_cache_stores_nothing():
+    """A TTL of zero disables the cache."""
+    cache = PlanCache(max_sessions=4, ttl_seconds=0)
+    cache.put_plan("user-1", _plan("s1"), None)
+
+    assert cache.get_plan("user-1", "s1") is None
+    assert cache.get_metrics()["sessions"] == 0
+
+
+def test_plan_session_index_outlives_entries():
+    """The plan to session index is kept after the session entry is evicted."""
+    cache = PlanCache(max_sessions=1, ttl_seconds=60, max_plan_ids=2)
+    plans = [_plan(f"s{i}") for i in range(3)]
+    for plan in plans:
+        cache.put_plan("user-1", plan, None)
+
+    assert cache.get_plan("user-1", "s1") is None
+    assert cache.get_plan_session("user-1", plans[1].id) == "s1"
+    assert cache.get_plan_session("user-1", plans[0].id) is None  # bounded index
+
+
+def test_counters_are_exported():
+    """Hits, misses and evictions are reported as OpenTelemetry counters."""
+    reader = InMemoryMetricReader()
+    cache = PlanCache(
+        max_sessions=1, ttl_seconds=60, meter_provider=MeterProvider(metric_readers=[reader])
+    )
+    cache.put_plan("user-1", _plan("s1"), None)
+    cache.get_plan("user-1", "s1")
+    cache.put_plan("user-1", _plan("s2"), None)
+    cache.get_plan("user-1", "s1")
+
+    totals = {
+        metric.name: sum(point.value for point in metric.data.data_points)
+        for resource in reader.get_metrics_data().resource_metrics
+        for scope in resource.scope_metrics
+        for metric in scope.metrics
+    }
+    assert totals == {
+        "memory.plan_cache.hits": 1,
+        "memory.plan_cache.misses": 1,
+        "memory.plan_cache.evictions": 1,
+    }
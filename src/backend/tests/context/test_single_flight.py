@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_attempt():
+    calls = []
+
+    async def initialize():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "client"
+
+    flight = SingleFlight("test")
+    results = await asyncio.gather(*[flight.run(initialize) for _ in range(20)])
+
+    assert results == ["client"] * 20
+    assert len(calls) == 1
+    assert flight.done
+    assert await flight.run(initialize) == "client" and len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_are_cached_with_backoff():
+    outcomes = [ConnectionError("down"), ConnectionError("still down"), "client"]
+
+    async def initialize():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    flight = SingleFlight("test", base_delay=0.1, max_delay=1)
+    results = await asyncio.gather(*[flight.run(initialize) for _ in range(10)], return_exceptions=True)
+    assert str(results[0]) == "down"
+    # Callers that waited for the attempt get their own error, chained from its error
+    assert all(isinstance(result, RuntimeError) and result.__cause__ is results[0] for result in results[1:])
+    assert len({id(result) for result in results}) == 10
+    assert flight.attempts == 1
+
+    await asyncio.sleep(0.11)
+    with pytest.raises(ConnectionError, match="still down"):
+        await flight.run(initialize)
+    # The delay doubled after the second consecutive failure
+    await asyncio.sleep(0.12)
+    with pytest.raises(RuntimeError) as error:
+        await flight.run(initialize)
+    assert str(error.value.__cause__) == "still down"
+
+    await asyncio.sleep(0.1)
+    assert await flight.run(initialize) == "client"
+    assert (flight.attempts, flight.failures) == (3, 2)
@@ -0,0 +1,240 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from semantic_kernel.contents import ChatHistory
+from semantic_kernel.memory.memory_record import MemoryRecord
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosResourceNotFoundError,
+)
+from context.document_codec import set_operations
+from context.embedding_matrix import EmbeddingMatrixCache
+from context.plan_cache import PlanCache
+from context.sqlite_memory_kernel import (
+    SqliteContainer,
+    SqliteMemoryContext,
+    translate_query,
+)
+from models.messages_kernel import AgentMessage, AgentType, Plan, Step, StepStatus
+
+
+@pytest.fixture
+def container(tmp_path):
+    container = SqliteContainer(str(tmp_path / "memory.db"))
+    yield container
+    container.close()
+
+
+def _context(container, session_id="session-1", user_id="user-1"):
+    context = SqliteMemoryContext(session_id, user_id, database_path=container.path)
+    context._container = container
+    context._plan_cache = PlanCache(max_sessions=16, ttl_seconds=60)
+    context._embedding_matrices = EmbeddingMatrixCache()
+    return context
+
+
+def test_translate_query_uses_columns_and_partition():
+    sql, parameters, projection, distinct = translate_query(
+        "SELECT c.id, c.session_id FROM c WHERE c.user_id=@user_id "
+        "AND ARRAY_CONTAINS(@types, c.data_type) AND c.plan_id=@plan_id ORDER BY c._ts DESC OFFSET 0 LIMIT @limit",
+        [
+            {"name": "@user_id", "value": "u"},
+            {"name": "@types", "value": ["plan", "step"]},
+            {"name": "@plan_id", "value": "p"},
+            {"name": "@limit", "value": 5},
+        ],
+        "session-1",
+    )
+
+    assert "session_id = :__partition_session_id" in sql
+    assert "user_id=:user_id" in sql
+    assert "data_type IN (SELECT value FROM json_each(:types))" in sql
+    assert "json_extract(body, '$.plan_id')=:plan_id" in sql
+    assert sql.endswith("ORDER BY _ts DESC, rowid DESC LIMIT :limit OFFSET 0")
+    assert parameters["types"] == '["plan", "step"]'
+    assert projection == ["id", "session_id"]
+    assert not distinct
+
+
+@pytest.mark.asyncio
+async def test_container_conditional_writes_and_batches(container):
+    stored = await container.create_item({"id": "a", "session_id": "s", "value": 1})
+
+    with pytest.raises(CosmosAccessConditionFailedError):
+        await container.upsert_item(
+            {"id": "a", "session_id": "s"}, etag='"stale"', match_condition=MatchConditions.IfNotModified
+        )
+
+    results = await container.execute_item_batch(
+        [("upsert", ({"id": "a", "session_id": "s", "value": 2},), {"if_match_etag": stored["_etag"]}),
+         ("patch", ("a", [{"op": "incr", "path": "/value", "value": 3}]))],
+        partition_key="s",
+    )
+    assert results[1]["resourceBody"]["value"] == 5
+
+    with pytest.raises(CosmosBatchOperationError) as error:
+        await container.execute_item_batch(
+            [("create", ({"id": "b", "session_id": "s"},)), ("delete", ("missing",))], partition_key="s"
+        )
+    assert error.value.operation_responses[1]["statusCode"] == 404
+    with pytest.raises(CosmosResourceNotFoundError):
+        await container.read_item("b", partition_key="s")
+
+
+@pytest.mark.asyncio
+async def test_plans_steps_and_counters_round_trip(container):
+    context = _context(container)
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    steps = [
+        Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action=f"a{i}", agent=AgentType.HR)
+        for i in range(3)
+    ]
+    plan.set_step_counts(steps)
+    await context.add_items_batch([plan, *steps])
+
+    steps[0].status = StepStatus.completed
+    await context.update_step(steps[0])
+
+    stored = await _context(container).get_plan_by_session("session-1")
+    assert stored.id == plan.id
+    assert (stored.total_steps, stored.planned, stored.completed) == (3, 2, 1)
+    assert [s.action for s in await context.get_steps_by_plan(plan.id)] == ["a0", "a1", "a2"]
+    assert (await context.get_step(steps[0].id, "session-1")).status == StepStatus.completed
+
+
+@pytest.mark.asyncio
+async def test_update_step_counts_a_step_that_was_not_stored(container):
+    context = _context(container)
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    await context.add_plan(plan)
+
+    step = Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action="a", agent=AgentType.HR,
+                status=StepStatus.completed)
+    await context.update_step(step)
+
+    stored = await _context(container).get_plan_by_session("session-1")
+    assert (stored.total_steps, stored.completed) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_recount_stores_counters_of_plans_stored_before_them(container):
+    context = _context(container)
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    steps = [
+        Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action=f"a{i}", agent=AgentType.HR)
+        for i in range(2)
+    ]
+    # A plan written before the counters existed
+    await context.add_items_batch([plan, *steps])
+
+    [summary], _ = await context.get_plan_summaries()
+    assert summary.counters_version == 0
+    recounted = await context.recount_plan_steps(summary)
+    assert (recounted.total_steps, recounted.planned) == (2, 2)
+
+    [summary], _ = await _context(container).get_plan_summaries()
+    assert summary.counters_version == Plan.COUNTERS_VERSION
+    assert (summary.total_steps, summary.planned) == (2, 2)
+
+
+@pytest.mark.asyncio
+async def test_patches_move_counters_and_keep_other_fields(container):
+    context = _context(container)
+    plan = Plan(session_id="session-1", user_id="user-1", initial_goal="goal")
+    step = Step(plan_id=plan.id, session_id="session-1", user_id="user-1", action="a", agent=AgentType.HR,
+                agent_reply="long reply")
+    plan.set_step_counts([step])
+    await context.add_items_batch([plan, step])
+
+    patched = await context.patch_step(step.id, "session-1", set_operations(status=StepStatus.completed))
+    assert (patched.status, patched.agent_reply) == (StepStatus.completed, "long reply")
+    stored_plan = await _context(container).get_plan_by_session("session-1")
+    assert (stored_plan.planned, stored_plan.completed) == (0, 1)
+
+    # Patching the same status again does not count the step twice
+    await context.patch_step(step.id, "session-1", set_operations(status="completed", human_feedback="ok"))
+    with pytest.raises(CosmosAccessConditionFailedError):
+        await context.patch_step(step.id, "session-1", set_operations(status=StepStatus.failed), etag='"stale"')
+    patched_plan = await context.patch_plan(plan.id, "session-1", set_operations(summary="summary"))
+
+    assert (patched_plan.summary, patched_plan.initial_goal, patched_plan.completed) == ("summary", "goal", 1)
+    stored_step = await _context(container).get_step(step.id, "session-1")
+    assert (stored_step.status, stored_step.human_feedback) == (StepStatus.completed, "ok")
+    assert await context.patch_step("missing", "session-1", set_operations(status="completed")) is None
+
+
+@pytest.mark.asyncio
+async def test_listings_paginate(container):
+    for i in range(5):
+        context = _context(container, session_id=f"session-{i}")
+        await context.add_plan(Plan(session_id=f"session-{i}", user_id="user-1", initial_goal=f"goal {i}"))
+    context = _context(container)
+
+    first, cursor = await context.get_plan_summaries(page_size=2)
+    second, cursor = await context.get_plan_summaries(page_size=2, cursor=cursor)
+    third, cursor = await context.get_plan_summaries(page_size=2, cursor=cursor)
+
+    goals = [p.initial_goal for p in first + second + third]
+    assert sorted(goals) == [f"goal {i}" for i in range(5)]
+    assert len(first) == 2 and len(third) == 1 and cursor is None
+
+
+@pytest.mark.asyncio
+async def test_messages_and_bulk_delete(container):
+    context = _context(container)
+    for i in range(3):
+        await context.add_agent_message(AgentMessage(
+            session_id="session-1", user_id="user-1", plan_id="p", content=f"m{i}", source="agent",
+        ))
+    history = ChatHistory()
+    history.add_user_message("hello")
+    await context.save_chat_history(history)
+
+    assert [m.content for m in await context.get_agent_messages_by_session("session-1")] == ["m0", "m1", "m2"]
+    assert [m.content for m in await context.get_messages()] == ["hello"]
+
+    await context.delete_all_messages("agent_message")
+    assert await context.get_agent_messages_by_session("session-1") == []
+    assert len(await context.get_all_messages()) == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_store_and_nearest_matches(container):
+    context = _context(container)
+    records = [
+        MemoryRecord(
+            is_reference=False, external_source_name=None, id=f"m-{i}", description=None,
+            text=f"t-{i}", additional_metadata=None, embedding=np.array(vector), key=f"k-{i}",
+        )
+        for i, vector in enumerate([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    ]
+    assert await context.upsert_batch("notes", records) == ["m-0", "m-1", "m-2"]
+    assert await context.get_collections() == ["notes"]
+
+    batch = await context.get_batch("notes", ["k-2", "k-0"], with_embeddings=True)
+    assert [r.text for r in batch] == ["t-2", "t-0"]
+
+    record, score = await context.get_nearest_match("notes", np.array([0.1, 1.0]))
+    assert record.text == "t-1"
+
+    await context.remove_batch("notes", ["k-1"])
+    record, _ = await context.get_nearest_match("notes", np.array([0.1, 1.0]))
+    assert record.text == "t-2"
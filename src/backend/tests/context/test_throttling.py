@@ -0,0 +1,180 @@
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from azure.cosmos.exceptions import CosmosHttpResponseError, CosmosResourceNotFoundError
+from context.throttling import RequestUnitBudget, ThrottledContainer, ThrottlingPolicy
+
+
+def _throttled(retry_after_ms=None):
+    error = CosmosHttpResponseError(status_code=429, message="throttled")
+    error.headers = {"x-ms-request-charge": "0.5"}
+    if retry_after_ms is not None:
+        error.headers["x-ms-retry-after-ms"] = str(retry_after_ms)
+    return error
+
+
+def _responding(result, charge):
+    """Build an SDK method mock that reports its charge through the response hook."""
+
+    async def method(*args, response_hook=None, **kwargs):
+        response_hook({"x-ms-request-charge": str(charge)}, result)
+        return result
+
+    return method
+
+
+class _Pages:
+    """Async page iterator of an SDK query, failing once before the page at fail_at."""
+
+    def __init__(self, pages, start, fail_at, response_hook):
+        self._pages = pages
+        self._index = int(start or 0)
+        self._fail_at = fail_at
+        self._hook = response_hook
+        self.continuation_token = start
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._index >= len(self._pages):
+            raise StopAsyncIteration
+        if self._index in self._fail_at:
+            self._fail_at.remove(self._index)
+            raise _throttled(10)
+        self._hook({"x-ms-request-charge": "2"}, None)
+        page = self._pages[self._index]
+        self._index += 1
+        self.continuation_token = str(self._index) if self._index < len(self._pages) else None
+
+        async def items():
+            for item in page:
+                yield item
+
+        return items()
+
+
+@pytest.mark.asyncio
+async def test_throttled_operation_waits_for_jittered_retry_after():
+    policy = ThrottlingPolicy()
+    proxy = MagicMock()
+    calls = []
+
+    async def read_item(*args, response_hook=None, **kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise _throttled(retry_after_ms=200)
+        response_hook({"x-ms-request-charge": "1.25"}, {"id": "a"})
+        return {"id": "a"}
+
+    proxy.read_item = read_item
+    container = ThrottledContainer(proxy, policy)
+
+    with patch("context.throttling.asyncio.sleep", new=AsyncMock()) as sleep:
+        assert await container.read_item(item="a", partition_key="s") == {"id": "a"}
+
+    delay = sleep.await_args.args[0]
+    assert 0.2 <= delay <= 0.2 * (1 + policy.JITTER)
+    assert calls[1]["partition_key"] == "s"
+    stats = policy.stats()["read"]
+    assert (stats["requests"], stats["throttled"], stats["failed"]) == (2, 1, 0)
+    assert stats["request_charge"] == 1.75
+
+
+@pytest.mark.asyncio
+async def test_retries_give_up_and_other_errors_are_not_retried():
+    policy = ThrottlingPolicy(max_retries=2)
+    proxy = MagicMock()
+    proxy.upsert_item = AsyncMock(side_effect=_throttled())
+    proxy.delete_item = AsyncMock(side_effect=CosmosResourceNotFoundError(message="gone"))
+    container = ThrottledContainer(proxy, policy)
+
+    with patch("context.throttling.asyncio.sleep", new=AsyncMock()) as sleep:
+        with pytest.raises(CosmosHttpResponseError):
+            await container.upsert_item({"id": "a"})
+        with pytest.raises(CosmosResourceNotFoundError):
+            await container.delete_item("a", partition_key="s")
+
+    # Without a retry-after header the delay backs off exponentially
+    first, second = (call.args[0] for call in sleep.await_args_list)
+    assert second > first * 2 / (1 + policy.JITTER)
+    assert proxy.upsert_item.await_count == 3
+    assert proxy.delete_item.await_count == 1
+    assert policy.stats()["upsert"]["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queries_resume_throttled_pages_from_their_continuation_token():
+    policy = ThrottlingPolicy()
+    proxy = MagicMock()
+    fail_at = {1}
+
+    def query_items(*args, response_hook=None, **kwargs):
+        iterable = MagicMock()
+        iterable.by_page.side_effect = lambda token=None: _Pages([[1, 2], [3], [4]], token, fail_at, response_hook)
+        return iterable
+
+    proxy.query_items = query_items
+    container = ThrottledContainer(proxy, policy)
+
+    with patch("context.throttling.asyncio.sleep", new=AsyncMock()):
+        items = [item async for item in container.query_items(query="SELECT * FROM c")]
+
+    assert items == [1, 2, 3, 4]
+    stats = policy.stats()["query"]
+    assert (stats["requests"], stats["throttled"]) == (4, 1)
+
+
+@pytest.mark.asyncio
+async def test_operations_queue_while_the_budget_is_overdrawn():
+    policy = ThrottlingPolicy(request_units_per_second=100)
+    proxy = MagicMock()
+    proxy.create_item = _responding({"id": "a"}, 150)
+    container = ThrottledContainer(proxy, policy)
+
+    with patch("context.throttling.asyncio.sleep", new=AsyncMock()) as sleep:
+        await container.create_item({"id": "a"})
+        sleep.assert_not_awaited()
+        await container.create_item({"id": "a"})
+
+    assert sleep.await_args.args[0] == pytest.approx(0.5, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_request_unit_budget_throttles_when_overdrawn():
+    """Spending more than the per-second budget sleeps off the debt."""
+    budget = RequestUnitBudget(request_units_per_second=100)
+
+    with patch("context.throttling.asyncio.sleep", new=AsyncMock()) as sleep:
+        await budget.spend(60)
+        sleep.assert_not_awaited()
+        await budget.spend(90)
+
+    assert sleep.await_args.args[0] == pytest.approx(0.5, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_disabled_budget_never_waits():
+    budget = RequestUnitBudget(request_units_per_second=0)
+
+    with patch("context.throttling.asyncio.sleep", new=AsyncMock()) as sleep:
+        await budget.spend(10_000)
+        await budget.acquire()
+
+    sleep.assert_not_awaited()
@@ -0,0 +1,125 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.vector_index import IVFIndex, VectorIndexRegistry
+
+
+def _clustered(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def _exact(vectors, query, k):
+    scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    return list(np.argsort(-scores)[:k])
+
+
+def test_flat_index_matches_exact_ranking():
+    vectors = _clustered(300)
+    index = IVFIndex(nlist=1)
+    index.add([f"k{i}" for i in range(len(vectors))], vectors)
+
+    query = _clustered(1, seed=1)[0]
+    hits = index.search(query, limit=10, min_relevance_score=-1)
+
+    assert [key for key, _ in hits] == [f"k{i}" for i in _exact(vectors, query, 10)]
+
+
+def test_ivf_index_clusters_and_keeps_recall():
+    vectors = _clustered(4000)
+    index = IVFIndex(min_train_size=1000, nprobe=8)
+    index.add([f"k{i}" for i in range(len(vectors))], vectors)
+    assert index.nlist > 1
+
+    queries = _clustered(50, seed=2)
+    found = 0
+    for query in queries:
+        hits = {key for key, _ in index.search(query, limit=10, min_relevance_score=-1)}
+        found += len(hits & {f"k{i}" for i in _exact(vectors, query, 10)})
+    assert found / (10 * len(queries)) >= 0.9
+
+
+def test_quantized_scores_are_close():
+    vectors = _clustered(200)
+    index = IVFIndex(nlist=1, quantize=True)
+    index.add([f"k{i}" for i in range(len(vectors))], vectors)
+
+    query = vectors[7]
+    key, score = index.search(query, limit=1, min_relevance_score=-1)[0]
+    assert key == "k7"
+    assert score == pytest.approx(1.0, abs=0.01)
+
+
+def test_index_persists_and_updates_incrementally(tmp_path):
+    vectors = _clustered(100)
+    index = IVFIndex(str(tmp_path), nlist=1)
+    index.add([f"k{i}" for i in range(100)], vectors)
+    index.close()
+
+    reopened = IVFIndex(str(tmp_path), nlist=1)
+    assert len(reopened) == 100
+    assert reopened.search(vectors[3], limit=1)[0][0] == "k3"
+
+    reopened.remove(["k3"])
+    reopened.add(["new"], vectors[3:4])
+    assert reopened.search(vectors[3], limit=1)[0][0] == "new"
+
+    again = IVFIndex(str(tmp_path), nlist=1)
+    assert len(again) == 100
+    assert again.search(vectors[3], limit=1)[0][0] == "new"
+
+
+def test_replacing_a_key_keeps_one_row():
+    index = IVFIndex(nlist=1)
+    index.add(["a", "b"], np.array([[1.0, 0.0], [0.0, 1.0]]))
+    index.add(["a"], np.array([[0.0, 1.0]]))
+
+    assert len(index) == 2
+    assert {key for key, _ in index.search(np.array([0.0, 1.0]), limit=5)} == {"a", "b"}
+
+
+def test_removals_compact_the_index():
+    index = IVFIndex(nlist=1)
+    index.add([f"k{i}" for i in range(200)], _clustered(200))
+    index.remove([f"k{i}" for i in range(150)])
+
+    assert len(index) == 50
+    assert index._count == 50
+
+
+def test_dimension_mismatch_raises():
+    index = IVFIndex()
+    index.add(["a"], np.array([[1.0, 0.0]]))
+    with pytest.raises(ValueError):
+        index.search(np.array([1.0, 0.0, 0.0]), limit=1)
+
+
+def test_registry_loads_and_drops_indexes(tmp_path):
+    registry = VectorIndexRegistry("ivf", str(tmp_path))
+    assert registry.get("session-1", "notes") is None
+
+    registry.create("session-1", "notes").add(["a"], np.array([[1.0, 0.0]]))
+    registry.close()
+    assert len(registry.get("session-1", "notes")) == 1
+
+    registry.drop("session-1", "notes")
+    assert registry.get("session-1", "notes") is None
+    with pytest.raises(ValueError):
+        VectorIndexRegistry("hnsw", str(tmp_path))
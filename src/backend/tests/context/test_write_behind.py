@@ -0,0 +1,153 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# Ensure src/backend is on the Python path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# AppConfig requires these settings at import time
+for _name in (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_AI_SUBSCRIPTION_ID",
+    "AZURE_AI_RESOURCE_GROUP",
+    "AZURE_AI_PROJECT_NAME",
+    "AZURE_AI_AGENT_ENDPOINT",
+):
+    os.environ.setdefault(_name, "mock-value")
+
+from context.write_behind import WriteBehindQueue
+
+
+def _document(index, session_id="session-1"):
+    return {"id": f"doc-{index}", "session_id": session_id, "data_type": "agent_message"}
+
+
+@pytest.fixture
+def mock_container():
+    container = MagicMock()
+    container.execute_item_batch = AsyncMock()
+    container.upsert_item = AsyncMock()
+    return container
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_batch_is_full(mock_container):
+    """A full batch is written without waiting for the flush interval."""
+    queue = WriteBehindQueue(max_size=100, batch_size=5, flush_interval=60)
+
+    for i in range(5):
+        await queue.enqueue(mock_container, "session-1", _document(i))
+    await asyncio.wait_for(queue.flush(), timeout=1)
+
+    mock_container.execute_item_batch.assert_awaited_once()
+    operations = mock_container.execute_item_batch.call_args.kwargs["batch_operations"]
+    assert len(operations) == 5
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_flushes_after_interval_grouped_by_partition(mock_container):
+    """Partial batches are flushed on time, one transactional batch per partition."""
+    queue = WriteBehindQueue(max_size=100, batch_size=50, flush_interval=0.05)
+
+    await queue.enqueue(mock_container, "session-1", _document(1))
+    await queue.enqueue(mock_container, "session-2", _document(2, "session-2"))
+    await queue.enqueue(mock_container, "session-1", _document(3))
+    await asyncio.wait_for(queue.flush(), timeout=1)
+
+    partitions = sorted(
+        (c.kwargs["partition_key"], len(c.kwargs["batch_operations"]))
+        for c in mock_container.execute_item_batch.call_args_list
+    )
+    assert partitions == [("session-1", 2), ("session-2", 1)]
+    metrics = queue.get_metrics()
+    assert metrics["flushed_items"] == 3
+    assert metrics["queue_depth"] == 0
+    assert metrics["flush_count"] == 1
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_pending_documents_visible_until_written(mock_container):
+    """Queued documents can be read back until the flush completes."""
+    release = asyncio.Event()
+
+    async def slow_batch(**kwargs):
+        await release.wait()
+
+    mock_container.execute_item_batch.side_effect = slow_batch
+    queue = WriteBehindQueue(max_size=100, batch_size=1, flush_interval=60)
+
+    await queue.enqueue(mock_container, "session-1", _document(1))
+    assert [d["id"] for d in queue.get_pending("session-1")] == ["doc-1"]
+
+    release.set()
+    await asyncio.wait_for(queue.flush(), timeout=1)
+    assert queue.get_pending("session-1") == []
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_enqueue_waits_when_queue_is_full(mock_container):
+    """Producers are held back while the queue is full."""
+    release = asyncio.Event()
+
+    async def slow_batch(**kwargs):
+        await release.wait()
+
+    mock_container.execute_item_batch.side_effect = slow_batch
+    queue = WriteBehindQueue(max_size=1, batch_size=1, flush_interval=60)
+
+    await queue.enqueue(mock_container, "session-1", _document(1))
+    await asyncio.sleep(0)  # let the flusher take the first document
+    await queue.enqueue(mock_container, "session-1", _document(2))
+    blocked = asyncio.create_task(queue.enqueue(mock_container, "session-1", _document(3)))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+
+    release.set()
+    await asyncio.wait_for(blocked, timeout=1)
+    await queue.close()
+    assert queue.flushed_items == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_counted(mock_container):
+    """Write failures are recorded and do not stop the flusher."""
+    mock_container.execute_item_batch.side_effect = RuntimeError("boom")
+    mock_container.upsert_item.side_effect = RuntimeError("boom")
+    queue = WriteBehindQueue(max_size=10, batch_size=1, flush_interval=60)
+
+    await queue.enqueue(mock_container, "session-1", _document(1))
+    await queue.enqueue(mock_container, "session-1", _document(2))
+    await queue.close()
+
+    assert queue.failed_items == 2
+    assert queue.get_pending("session-1") == []
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_per_document(mock_container):
+    """A failed batch only loses the documents that also fail on their own."""
+    mock_container.execute_item_batch.side_effect = RuntimeError("conflict")
+
+    async def upsert(body):
+        if body["id"] == "doc-2":
+            raise RuntimeError("bad document")
+        return body
+
+    mock_container.upsert_item.side_effect = upsert
+    queue = WriteBehindQueue(max_size=10, batch_size=3, flush_interval=60)
+
+    for i in range(3):
+        await queue.enqueue(mock_container, "session-1", _document(i + 1))
+    await queue.close()
+
+    upserted = sorted(c.kwargs["body"]["id"] for c in mock_container.upsert_item.call_args_list)
+    assert upserted == ["doc-1", "doc-2", "doc-3"]
+    assert queue.flushed_items == 2
+    assert queue.failed_items == 1
+    assert queue.get_pending("session-1") == []
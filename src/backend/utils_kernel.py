@@ -12,6 +12,7 @@ import semantic_kernel as sk
 # Import AppConfig from app_config
 from app_config import config
 from context.cosmos_memory_kernel import CosmosMemoryContext
+from context.memory_backend import create_memory_context
 
 # Import the credential utility
 from helpers.azure_credential_utils import get_azure_credential
@@ -59,7 +60,7 @@ async def initialize_runtime_and_context(
 
     # Create a kernel and memory store using the AppConfig instance
     kernel = config.create_kernel()
-    memory_store = CosmosMemoryContext(session_id, user_id)
+    memory_store = create_memory_context(session_id, user_id)
 
     return kernel, memory_store
 
@@ -440,6 +440,10 @@ export class APIService {
      * @returns Boolean indicating if plan is complete
      */
     isPlanComplete(plan: PlanWithSteps): boolean {
+        // The plans listing only returns step counters, not the steps themselves
+        if (!plan.steps?.length) {
+            return plan.completed + plan.failed === plan.total_steps;
+        }
         return plan.steps.every(step =>
             [StepStatus.COMPLETED, StepStatus.FAILED].includes(step.status)
         );